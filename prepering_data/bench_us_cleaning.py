@@ -0,0 +1,88 @@
+"""
+bench_us_cleaning.py
+====================
+
+Throughput (MB/s) of the US Congressional Record cleaners:
+
+    clean_text       – stage1cleaning.clean_text (one re.sub pass per rule)
+    clean_text_fast  – us_record_cleaner, same text in memory
+    clean_file       – us_record_cleaner, streamed file -> file
+
+and a byte-for-byte check of the new output against clean_text on every file.
+
+Usage (from the project root):
+    python prepering_data/bench_us_cleaning.py --input US_congressional_speeches_Text_Files
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from stage1cleaning import clean_text
+from us_record_cleaner import clean_file, clean_text_fast
+
+
+def run_benchmark(input_folder, n_files=None, repeat=3):
+    filenames = sorted(f for f in os.listdir(input_folder) if f.lower().endswith((".txt", ".md")))[:n_files]
+    paths = [os.path.join(input_folder, f) for f in filenames]
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            texts.append(f.read())
+    mb = sum(os.path.getsize(p) for p in paths) / 1e6
+    print(f"\n📂 {len(paths)} files, {mb:.1f} MB")
+
+    # ---------------- identical output ----------------
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "out.txt")
+        for filename, path, text in zip(filenames, paths, texts):
+            expected = clean_text(text)
+            clean_file(path, out_path)
+            with open(out_path, "r", encoding="utf8") as f:
+                streamed = f.read()
+            if clean_text_fast(text) != expected or streamed != expected:
+                mismatches.append(filename)
+
+    print(f"🔍 Byte-identical: {len(paths) - len(mismatches)}/{len(paths)}")
+    for filename in mismatches[:10]:
+        print(f"   ⚠️ differs: {filename}")
+
+    # ---------------- throughput ----------------
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "out.txt")
+        timings = {
+            "clean_text": best_of(lambda: [clean_text(t) for t in texts]),
+            "clean_text_fast": best_of(lambda: [clean_text_fast(t) for t in texts]),
+            "clean_file (read+write)": best_of(lambda: [clean_file(p, out_path) for p in paths]),
+        }
+
+    print(f"\n📊 Throughput (best of {repeat})")
+    base = timings["clean_text"]
+    for name, seconds in timings.items():
+        print(f"   • {name:24s} {seconds:7.2f}s  {mb / seconds:7.2f} MB/s  ({base / seconds:.1f}x)")
+
+    return timings, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="US cleaning throughput + identical output check")
+    parser.add_argument("--input", default="US_congressional_speeches_Text_Files")
+    parser.add_argument("--files", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.input, args.files, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import os
-import shutil
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 import re
 import html
 
+# zero-copy merge (scripts/merged_view.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from merged_view import MERGE_MODES, list_input_files, merge_sources, read_span
+from metadata_store import METADATA_FORMATS, write_table
+
 # -------------------------------------------------------------
 # PATH SETUP
 # -------------------------------------------------------------
@@ -18,7 +24,6 @@ us_folder = os.path.join(ROOT_DIR, "allData_cleaned")
 
 # Unified folder (output)
 output_folder = os.path.join(ROOT_DIR, "allData")
-os.makedirs(output_folder, exist_ok=True)
 
 
 # -------------------------------------------------------------
@@ -33,98 +38,101 @@ def clean_congressional_text(raw_text):
 
 
 # -------------------------------------------------------------
-# COPY & RENAME FILES INTO allData/
+# MERGE UK + US INTO allData/ (copy / hard links / view manifest)
 # -------------------------------------------------------------
-def copy_and_rename(src_folder, prefix):
-    print(f"Scanning folder: {src_folder}")
-
-    for filename in os.listdir(src_folder):
-        src_path = os.path.join(src_folder, filename)
-
-        if not os.path.isfile(src_path):
-            continue  # skip subfolders
-
-        # New filename with prefix
-        if filename.startswith(prefix + "_"):
-            new_name = filename  # do NOT prefix twice
-        else:
-            new_name = f"{prefix}_{filename}"
-
-        dst_path = os.path.join(output_folder, new_name)
-
-        shutil.copy(src_path, dst_path)
-        print("Copied:", new_name)
-
-
-print("\n=== COPYING FILES TO allData/ ===")
-copy_and_rename(uk_folder, "UK")
-copy_and_rename(us_folder, "US")
-print("✓ Merge complete!\n")
+def merge(mode="link"):
+    print(f"\n=== MERGING FILES INTO allData/ ({mode}) ===")
+    merge_sources([(uk_folder, "UK"), (us_folder, "US")], output_folder, mode)
+    print("✓ Merge complete!\n")
 
 
 # -------------------------------------------------------------
 # CREATE DATASET (metadata + labels)
 # -------------------------------------------------------------
-print("=== BUILDING DATASET (metadata + labels) ===")
+def build_dataset():
+    """
+    One row per document: where its text is (path relative to ROOT_DIR,
+    byte offset, byte length) instead of the text itself, so the table stays
+    small. load_text(row) / merged_view.read_span give the text back.
+    """
+    print("=== BUILDING DATASET (metadata + labels) ===")
 
-rows = []
+    rows = []
 
-for filename in sorted(os.listdir(output_folder)):
-    file_path = os.path.join(output_folder, filename)
+    for filename, file_path in list_input_files(output_folder, extensions=("",)):
 
-    if not os.path.isfile(file_path):
-        continue
+        # Determine label from filename prefix
+        if filename.startswith("UK_"):
+            country = "UK"
+        elif filename.startswith("US_"):
+            country = "US"
+        else:
+            print("Skipping unknown file:", filename)
+            continue
 
-    # Determine label from filename prefix
-    if filename.startswith("UK_"):
-        country = "UK"
-    elif filename.startswith("US_"):
-        country = "US"
-    else:
-        print("Skipping unknown file:", filename)
-        continue
+        # NO cleaning is applied now: the raw file is the document
+        rows.append({
+            "country": country,
+            "filename": filename,
+            "path": os.path.relpath(os.path.realpath(file_path), ROOT_DIR),
+            "offset": 0,
+            "length": os.path.getsize(file_path),
+        })
 
-    # Load raw text
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        raw_text = f.read()
+    # Build DataFrame
+    df = pd.DataFrame(rows)
+    df["row_index"] = df.index
 
-    # NO cleaning is applied now
-    text = raw_text
+    print("\nDataset created:")
+    print(df.head())
+    print(df.country.value_counts())
+    print(f"Total documents: {len(df)}")
 
-    rows.append({
-        "text": text,
-        "country": country,
-        "filename": filename,
-    })
+    return df
 
-# Build DataFrame
-df = pd.DataFrame(rows)
-df["row_index"] = df.index
 
-print("\nDataset created:")
-print(df.head())
-print(df.country.value_counts())
-print(f"Total documents: {len(df)}")
+def load_text(row, root_dir=ROOT_DIR):
+    """Raw text of one documents_metadata row."""
+    return read_span(os.path.join(root_dir, row["path"]), int(row["offset"]), int(row["length"]))
 
 
 # -------------------------------------------------------------
 # SAVE METADATA + LABEL FILES
 # -------------------------------------------------------------
-print("\n=== SAVING OUTPUT FILES ===")
+def save_outputs(df, metadata_format="auto"):
+    print("\n=== SAVING OUTPUT FILES ===")
+
+    # documents_metadata.arrow (country dictionary-encoded) or .csv without pyarrow
+    metadata_paths = write_table(ROOT_DIR, "documents_metadata", df, metadata_format=metadata_format,
+                                 categorical=["country"])
+
+    label_map = {"UK": 0, "US": 1}
+    y_num = df["country"].map(label_map).to_numpy()
+    y_str = df["country"].to_numpy()
+
+    np.save(os.path.join(ROOT_DIR, "y_labels_num.npy"), y_num)
+    np.save(os.path.join(ROOT_DIR, "y_labels_str.npy"), y_str)
+
+    print("Saved:")
+    for path in metadata_paths:
+        print(f" - {os.path.basename(path)}")
+    print(" - y_labels_num.npy")
+    print(" - y_labels_str.npy")
+
 
-metadata_path = os.path.join(ROOT_DIR, "documents_metadata.csv")
-df.to_csv(metadata_path, index=False)
+def main():
+    parser = argparse.ArgumentParser(description="Stage 1: merge UK + US and build documents_metadata")
+    parser.add_argument("--mode", choices=MERGE_MODES, default="link",
+                        help="copy the files, hard-link them (default) or only write a view manifest")
+    parser.add_argument("--metadata-format", choices=METADATA_FORMATS, default="auto",
+                        help="documents_metadata as Arrow (default when pyarrow is installed) or CSV")
+    args = parser.parse_args()
 
-label_map = {"UK": 0, "US": 1}
-y_num = df["country"].map(label_map).to_numpy()
-y_str = df["country"].to_numpy()
+    merge(args.mode)
+    save_outputs(build_dataset(), args.metadata_format)
 
-np.save(os.path.join(ROOT_DIR, "y_labels_num.npy"), y_num)
-np.save(os.path.join(ROOT_DIR, "y_labels_str.npy"), y_str)
+    print("\n✓ STAGE 1 COMPLETE.\n")
 
-print("Saved:")
-print(" - documents_metadata.csv")
-print(" - y_labels_num.npy")
-print(" - y_labels_str.npy")
 
-print("\n✓ STAGE 1 COMPLETE.\n")
+if __name__ == "__main__":
+    main()
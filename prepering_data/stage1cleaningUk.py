@@ -1,7 +1,13 @@
+import os
 import re
+import sys
 from pathlib import Path
 from tqdm import tqdm
 
+# incremental builds (scripts/build_manifest.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "scripts"))
+from build_manifest import BuildManifest
+
 # --- CONSTANTS ---
 
 HIERARCHICAL_SEPARATOR = "\n\n"
@@ -45,18 +51,24 @@ def extract_hierarchical_text(txt_file_path: Path) -> str:
         return ""
 
 
-def save_text_to_file(folder_path: Path, filename: str, content: str) -> None:
+def save_text_to_file(folder_path: Path, filename: str, content: str) -> bool:
     """
     Saves cleaned text to a specified output file.
+    Returns True on success.
     """
     folder_path.mkdir(parents=True, exist_ok=True)
     output_file = folder_path / filename
+    tmp_file = folder_path / (filename + ".tmp")
 
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
+        # write + rename: a crash never leaves a half-written output
+        with open(tmp_file, "w", encoding="utf-8") as f:
             f.write(content)
+        os.replace(tmp_file, output_file)
+        return True
     except Exception as e:
         print(f"❌ Error saving file {filename}: {e}")
+        return False
 
 
 # --- MAIN PROCESSING FUNCTION ---
@@ -71,6 +83,8 @@ def process_all_files(
     - reads them
     - cleans text
     - saves output into a dedicated cleanedData_uk folder
+    - skips files whose content (and this script) did not change since the
+      last run, using the build manifest in the output folder
     """
 
     input_path = BASE_DIR / input_folder_name
@@ -95,21 +109,33 @@ def process_all_files(
     print(f"File prefix  : '{file_prefix}'")
     print(f"{'=' * 70}")
 
+    manifest = BuildManifest(
+        output_path, "stage1cleaningUk", params={"file_prefix": file_prefix}, code_files=[__file__]
+    )
+    skipped = 0
+
     for file_path in tqdm(txt_files, desc="Processing UK text files"):
-        text_content = extract_hierarchical_text(file_path)
+        original_stem = file_path.stem  # e.g., debates2023-06-28
 
-        if text_content:
-            original_stem = file_path.stem  # e.g., debates2023-06-28
+        # Avoid double-UK prefix
+        if original_stem.startswith(file_prefix + "_"):
+            output_filename = f"{original_stem}.txt"
+        else:
+            output_filename = f"{file_prefix}_{original_stem}.txt"
+
+        if manifest.is_fresh(file_path.name, [file_path], [output_path / output_filename]):
+            skipped += 1
+            continue
+
+        text_content = extract_hierarchical_text(file_path)
 
-            # Avoid double-UK prefix
-            if original_stem.startswith(file_prefix + "_"):
-                output_filename = f"{original_stem}.txt"
-            else:
-                output_filename = f"{file_prefix}_{original_stem}.txt"
+        if text_content and save_text_to_file(output_path, output_filename, text_content):
+            manifest.record(file_path.name, [file_path], [output_path / output_filename])
 
-            save_text_to_file(output_path, output_filename, text_content)
+    manifest.prune(f.name for f in txt_files)
+    manifest.save()
 
-    print(f"\n✅ DONE! Total processed files: {len(txt_files)}")
+    print(f"\n✅ DONE! Total processed files: {len(txt_files)} ({skipped} unchanged, skipped)")
     print(f"Cleaned files saved to: {output_folder_name}")
     print("\n--- Ready for next stage: BM25 + Embeddings ---")
 
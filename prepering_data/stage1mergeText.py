@@ -1,10 +1,15 @@
 import os
-import shutil
+import sys
+import argparse
 
 import re
 
 import html
 
+# zero-copy merge (scripts/merged_view.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from merged_view import MERGE_MODES, merge_sources
+
 
 # תיקיית הסקריפט (scripts/)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,9 +24,6 @@ us_folder = os.path.join(ROOT_DIR, "US_congressional_speeches_Text_Files")
 # תיקיית output (allData) גם ברמת ROOT
 output_folder = os.path.join(ROOT_DIR, "allData")
 
-# יצירת התיקייה המאוחדת
-os.makedirs(output_folder, exist_ok=True)
-
 def clean_congressional_text(raw_text):
 
     """
@@ -82,23 +84,17 @@ def clean_congressional_text(raw_text):
 
     return text
 
-def copy_and_rename(src_folder, prefix):
-    print(f"Scanning: {src_folder}")
-    for filename in os.listdir(src_folder):
-        src_path = os.path.join(src_folder, filename)
-
-        if not os.path.isfile(src_path):
-            continue
-
-        new_name = f"{prefix}_{filename}"
-        dst_path = os.path.join(output_folder, new_name)
-
-        shutil.copy(src_path, dst_path)
-        print("Copied:", new_name)
+def main():
+    parser = argparse.ArgumentParser(description="Merge the UK + US files into allData")
+    parser.add_argument("--mode", choices=MERGE_MODES, default="link",
+                        help="copy the files, hard-link them (default) or only write a view manifest")
+    parser.add_argument("--output", default=output_folder)
+    args = parser.parse_args()
 
-copy_and_rename(uk_folder, "UK")
-copy_and_rename(us_folder, "US")
+    merge_sources([(uk_folder, "UK"), (us_folder, "US")], args.output, args.mode)
 
-print("✓ המיזוג הסתיים! כל הקבצים נמצאים בתיקיית allData.")
+    print("✓ המיזוג הסתיים! כל הקבצים נמצאים בתיקיית allData.")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+us_record_cleaner.py
+====================
+
+Single-pass, line-by-line version of stage1cleaning.clean_text for the
+US Congressional Record files. The output is byte-identical to clean_text.
+
+All rules are compiled ONCE into two combined alternations:
+
+    META_LINE_RE   metadata lines (Title: / Volume: / ... / =====)
+    HEADER_LINE_RE page headers, boilerplate and underscore lines
+                   (matched after <pre> tags are removed, like in clean_text)
+
+and every line is classified with one fullmatch. The input is read and the
+output written one line at a time, so a file is never held twice in memory.
+
+Why a line engine needs more than "drop matching lines": clean_text runs
+the rules one after another as MULTILINE re.sub passes, and
+
+    ^\\s*RULE.*$        also eats the whitespace-only lines right above the
+                        line (\\s* runs over newlines)
+    ^\\s*RULE\\s*$       eats the whitespace-only lines above AND below it
+
+Lines removed by an earlier pass are empty, so a later pass eats them too.
+Every removed line therefore becomes one empty "group" line that remembers
+the pass that removed it (RULE_ORDER); a later rule merges every group and
+blank line next to it that was already blank at the time of its own pass.
+"""
+
+import html
+import io
+import re
+
+
+# pass order of clean_text; META rules run before the <pre> removal,
+# HEADER rules after it
+RULE_ORDER = {
+    "title": 1,
+    "volume": 2,
+    "issue": 3,
+    "pages": 4,
+    "section": 5,
+    "date": 6,
+    "rule": 7,          # =====
+    "page": 8,          # [Page E635]
+    "page2": 9,         # [[Page E635]]
+    "pages2": 10,       # [Pages E635-E636]
+    "extensions": 11,   # [Extensions of Remarks]
+    "boilerplate": 12,  # From the Congressional Record Online ...
+    "underscores": 13,  # ______
+}
+PRE_PASS = 7.5   # </?pre> removal runs between the META and HEADER rules
+NEVER = float("inf")
+
+# rules with a trailing \s*$ also eat the blank lines below them
+EATS_BELOW = {"rule", "page", "page2", "pages2", "extensions", "underscores"}
+
+META_LINE_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<title>Title:.*)"
+    r"|(?P<volume>Volume:.*)"
+    r"|(?P<issue>Issue:.*)"
+    r"|(?P<pages>Pages?:.*)"
+    r"|(?P<section>Section:.*)"
+    r"|(?P<date>Date:.*)"
+    r"|(?P<rule>={5,}\s*)"
+    r")"
+)
+HEADER_LINE_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<page>\[Page [A-Z0-9\-\s]+\]\s*)"
+    r"|(?P<page2>\[\[Page [A-Z0-9\-\s]+\]\]\s*)"
+    r"|(?P<pages2>\[Pages? [A-Z0-9\-\s]+\]\s*)"
+    r"|(?P<extensions>\[Extensions of Remarks\]\s*)"
+    r"|(?P<boilerplate>From the Congressional Record Online.*)"
+    r"|(?P<underscores>_{3,}\s*)"
+    r")"
+)
+# first non-blank character of the lines each alternation can match
+META_FIRST = frozenset("TVIPSD=")
+HEADER_FIRST = frozenset("[F_")
+
+PRE_TAG_RE = re.compile(r"</?pre>")
+LINK_RE = re.compile(r"\[<.*?>\]")
+SPACES_RE = re.compile(r"[ \t]+")
+
+
+def _classify(line):
+    """
+    (text, blank_from, rule) of one input line:
+        blank_from – first pass at which the line is blank (NEVER for content)
+        rule       – name of the rule that removes it, or None
+    """
+    stripped = line.lstrip()
+    if not stripped:
+        return line, 0, None
+
+    if stripped[0] in META_FIRST:
+        m = META_LINE_RE.fullmatch(line)
+        if m:
+            return "", RULE_ORDER[m.lastgroup], m.lastgroup
+
+    if "<" in line:
+        line = PRE_TAG_RE.sub("", line)
+        stripped = line.lstrip()
+        if not stripped:
+            return line, PRE_PASS, None
+
+    if stripped[0] in HEADER_FIRST:
+        m = HEADER_LINE_RE.fullmatch(line)
+        if m:
+            return "", RULE_ORDER[m.lastgroup], m.lastgroup
+
+    return line, NEVER, None
+
+
+def _removal_pass(lines):
+    """
+    Applies all line-removal rules. Yields the surviving lines in order.
+
+    stack entries: [text, blank_from, eats_below_until]; only the entries
+    after the last content line can still change, everything below it is
+    yielded right away.
+    """
+    stack = []
+
+    for line in lines:
+        text, blank_from, rule = _classify(line)
+
+        if rule is not None:
+            p = RULE_ORDER[rule]
+            # ^\s* : eat the lines above that are already blank at pass p
+            while stack and stack[-1][1] < p:
+                stack.pop()
+            entry = ["", p, p if rule in EATS_BELOW else None]
+        else:
+            entry = [text, blank_from, None]
+
+        # \s*$ of a rule above: eat this line if it is blank at that rule's pass
+        if stack and stack[-1][2] is not None:
+            if entry[1] < stack[-1][2]:
+                continue
+            stack[-1][2] = None
+
+        if entry[1] == NEVER:
+            for done in stack:
+                yield done[0]
+            stack = []
+        stack.append(entry)
+
+    for done in stack:
+        yield done[0]
+
+
+def _input_lines(raw_lines):
+    """
+    html.unescape + newline normalization + BOM strip, then the lines of the
+    text exactly as str.split("\\n") would give them. Entities never span a
+    newline, so unescaping line by line is the same as for the whole text.
+    """
+    carry = ""
+    at_start = True
+    for raw in raw_lines:
+        if "&" in raw:
+            raw = html.unescape(raw)
+        if "\r" in raw:
+            raw = raw.replace("\r\n", "\n").replace("\r", "\n")
+        if at_start:
+            raw = raw.lstrip("\ufeff")
+            at_start = not raw
+
+        if not carry and raw and raw.find("\n") == len(raw) - 1:
+            # the usual case: exactly one line
+            yield raw[:-1]
+            continue
+        if "\n" not in raw:
+            carry += raw
+            continue
+
+        parts = raw.split("\n")
+        parts[0] = carry + parts[0]
+        carry = parts.pop()
+        yield from parts
+
+    yield carry
+
+
+def clean_lines(raw_lines):
+    """
+    raw_lines: the file as lines WITH their "\\n" (e.g. an open text file).
+    Yields the cleaned text in pieces; "".join(...) == clean_text(file text).
+    """
+    started = False
+    previous = None   # last content line (its trailing spaces depend on what follows)
+    pending = []      # blank lines after it
+
+    for line in _removal_pass(_input_lines(raw_lines)):
+        if "[<" in line:
+            line = LINK_RE.sub("", line)
+
+        if not line.strip():
+            if started:
+                pending.append(line)
+            continue
+
+        if previous is not None:
+            yield previous + "\n"
+            # \n{3,} -> \n\n : runs of empty lines collapse to one
+            last_empty = False
+            for blank in pending:
+                if blank == "":
+                    if last_empty:
+                        continue
+                    last_empty = True
+                else:
+                    last_empty = False
+                yield SPACES_RE.sub(" ", blank) + "\n"
+        pending = []
+
+        if "  " in line or "\t" in line:
+            line = SPACES_RE.sub(" ", line)
+        if not started:
+            line = line.lstrip()
+            started = True
+        previous = line
+
+    if previous is not None:
+        yield previous.rstrip()
+
+
+def clean_text_fast(text):
+    """clean_text for a text already in memory."""
+    # StringIO splits on "\n" only (no newline translation)
+    return "".join(clean_lines(io.StringIO(text)))
+
+
+def clean_file(input_path, output_path):
+    """Streams one file through the cleaner; returns the number of characters written."""
+    written = 0
+    with open(input_path, "r", encoding="utf8") as src, open(output_path, "w", encoding="utf8") as dst:
+        for piece in clean_lines(src):
+            dst.write(piece)
+            written += len(piece)
+    return written
@@ -0,0 +1,138 @@
+"""
+build_manifest.py
+=================
+
+Incremental builds: every pipeline stage keeps a small JSON manifest in its
+output folder (_build_manifest.json) with
+
+    - the stage parameters + a hash of the stage's own source code
+      (any change there -> full rebuild of the stage)
+    - per input file (or per corpus): content hashes of the inputs and the
+      sizes of the outputs that were written from them
+
+Re-running a stage then only redoes the entries whose inputs changed, whose
+outputs are missing / have a different size (half-written), or that are new.
+
+    manifest = BuildManifest(OUTPUT_FOLDER, "stage1cleaning", params={...}, code_files=[__file__])
+    for input_path in inputs:
+        if manifest.is_fresh(name, [input_path], [output_path]):
+            continue
+        ... build output_path ...
+        manifest.record(name, [input_path], [output_path])
+    manifest.save()
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+MANIFEST_NAME = "_build_manifest.json"
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """Per-stage manifest of input hashes, parameters and outputs."""
+
+    def __init__(self, output_folder, stage: str, params: dict | None = None, code_files=()):
+        self.path = Path(output_folder) / MANIFEST_NAME
+        self.stage = stage
+
+        code_hash = hashlib.sha256()
+        for code_file in code_files:
+            code_hash.update(sha256_file(code_file).encode())
+        self.params = {**(params or {}), "code": code_hash.hexdigest()}
+
+        self.entries = {}
+        self._hash_cache = {}  # path -> [size, mtime_ns, sha256]
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            self._hash_cache = stored.get("hash_cache", {})
+            if stored.get("stage") == stage and stored.get("params") == self.params:
+                self.entries = stored.get("entries", {})
+            elif stored.get("entries"):
+                print(f"♻️  {stage}: parameters or code changed → full rebuild")
+
+    # ----------------------------------------------------
+    # Hashing (cached by size + mtime)
+    # ----------------------------------------------------
+    def digest(self, path) -> str:
+        path = str(path)
+        st = os.stat(path)
+        cached = self._hash_cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        digest = sha256_file(path)
+        self._hash_cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    # ----------------------------------------------------
+    # Entries
+    # ----------------------------------------------------
+    def is_fresh(self, key: str, inputs, outputs) -> bool:
+        """True if `key` was built from exactly these inputs and all its outputs are intact."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+
+        inputs = [str(p) for p in inputs]
+        if sorted(entry["inputs"]) != sorted(inputs):
+            return False
+        for p in inputs:
+            if not os.path.exists(p) or self.digest(p) != entry["inputs"][p]:
+                return False
+
+        outputs = [str(p) for p in outputs]
+        if sorted(entry["outputs"]) != sorted(outputs):
+            return False
+        for p in outputs:
+            if not os.path.exists(p) or os.path.getsize(p) != entry["outputs"][p]:
+                return False
+
+        return True
+
+    def record(self, key: str, inputs, outputs):
+        self.entries[key] = {
+            "inputs": {str(p): self.digest(p) for p in inputs},
+            "outputs": {str(p): os.path.getsize(p) for p in outputs},
+        }
+
+    def outputs(self, key: str):
+        entry = self.entries.get(key)
+        return list(entry["outputs"]) if entry else []
+
+    def prune(self, keep_keys):
+        """Drops entries whose input no longer exists; returns the dropped keys."""
+        keep_keys = set(keep_keys)
+        dropped = [k for k in self.entries if k not in keep_keys]
+        for k in dropped:
+            del self.entries[k]
+        return dropped
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # only keep hashes of files that are still referenced
+        referenced = {p for e in self.entries.values() for p in e["inputs"]}
+        data = {
+            "stage": self.stage,
+            "params": self.params,
+            "entries": self.entries,
+            "hash_cache": {p: v for p, v in self._hash_cache.items() if p in referenced},
+        }
+
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
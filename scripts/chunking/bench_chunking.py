@@ -0,0 +1,166 @@
+"""
+bench_chunking.py
+=================
+
+Micro-benchmark of the fixed-size + overlap chunking (chuncking_660.py) on
+the largest files of a folder (by default the UK debates, the longest texts
+we have): sentence splitting is done once, only the chunking is timed.
+
+    list      the old loop: count_words per sentence, again per candidate and
+              per overlap window, chunks kept as copied sentence lists
+    prefix    sentence_word_counts once + prefix sums (iter_chunk_spans)
+
+Both are checked to give the same chunks; files where the old loop does not
+finish (see iter_chunk_spans) are reported and not timed. On every file the
+chunks must cover every sentence ("covered"), and a few known inputs with
+sentences longer than the limit are checked first (KNOWN_CASES).
+
+Usage (from the project root):
+    python scripts/chunking/bench_chunking.py --input cleanedData_uk --files 10
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from chuncking_660 import count_words, iter_chunk_spans, iter_chunks, split_to_sentences
+
+
+# word counts per sentence -> expected spans (max 660 words, overlap 3)
+KNOWN_CASES = {
+    (700, 5, 5): [(0, 1), (1, 3)],
+    (5, 5, 700, 5, 5, 5): [(0, 2), (2, 3), (3, 6)],
+    (5, 700, 700, 5): [(0, 1), (1, 2), (2, 3), (3, 4)],
+}
+
+
+def chunk_sentences_list(sentences, max_words_per_chunk=660, overlap_sentences=3, max_steps=None):
+    """The old list-based chunker; gives up (returns None) after max_steps chunks."""
+    max_steps = max_steps or 2 * len(sentences) + 2
+    chunks = []
+    i = 0
+
+    current_chunk = []
+    current_word_count = 0
+    while i < len(sentences):
+        s = sentences[i]
+        w = count_words(s)
+        if current_word_count + w <= max_words_per_chunk:
+            current_chunk.append(s)
+            current_word_count += w
+            i += 1
+        else:
+            if current_word_count == 0:
+                current_chunk = [s]
+                i += 1
+            break
+    chunks.append(current_chunk)
+
+    while i < len(sentences):
+        if len(chunks) > max_steps:
+            return None
+        prev_chunk = chunks[-1]
+        overlap = prev_chunk[-overlap_sentences:] if len(prev_chunk) >= overlap_sentences else prev_chunk
+
+        current_chunk = overlap.copy()
+        current_word_count = sum(count_words(s) for s in current_chunk)
+        while i < len(sentences):
+            s = sentences[i]
+            w = count_words(s)
+            if current_word_count + w <= max_words_per_chunk:
+                current_chunk.append(s)
+                current_word_count += w
+                i += 1
+            else:
+                if current_word_count == 0:
+                    current_chunk = [s]
+                    i += 1
+                break
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def covers_all(spans, n_sentences):
+    """True if every sentence index lands in some chunk span."""
+    covered = [False] * n_sentences
+    for start, end in spans:
+        covered[start:end] = [True] * (end - start)
+    return all(covered)
+
+
+def check_known_cases(max_words=660, overlap=3):
+    """[(counts, got), ...] of the KNOWN_CASES that do not give the expected spans."""
+    failures = []
+    for counts, expected in KNOWN_CASES.items():
+        got = list(iter_chunk_spans(iter(counts), max_words, overlap))
+        if got != expected or not covers_all(got, len(counts)):
+            failures.append((counts, got))
+    return failures
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def run_benchmark(input_folder="cleanedData_uk", n_files=10, repeat=5, max_words=660, overlap=3):
+    paths = sorted(
+        (os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith(".txt")),
+        key=os.path.getsize,
+        reverse=True,
+    )[:n_files]
+
+    rows = []
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            sentences = split_to_sentences(f.read())
+
+        t_new, new = best_of(lambda: list(iter_chunks(sentences, max_words, overlap)), repeat)
+        old = chunk_sentences_list(sentences, max_words, overlap)
+        row = {
+            "file": os.path.basename(path),
+            "sentences": len(sentences),
+            "chunks": len(new),
+            "prefix_ms": t_new * 1000,
+            "covered": covers_all([span for _, span in new], len(sentences)),
+        }
+        if old is None:
+            row["identical"] = "old loop does not finish"
+        else:
+            t_old, old = best_of(lambda: ["\n".join(c) for c in chunk_sentences_list(sentences, max_words, overlap)],
+                                 repeat)
+            row["list_ms"] = t_old * 1000
+            row["speedup"] = t_old / max(t_new, 1e-9)
+            row["identical"] = old == [text for text, _ in new]
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-size + overlap chunking: list loop vs prefix sums")
+    parser.add_argument("--input", default="cleanedData_uk")
+    parser.add_argument("--files", type=int, default=10, help="largest N files")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = check_known_cases()
+    for counts, got in failures:
+        print(f"❌ word counts {counts}: got spans {got}, expected {KNOWN_CASES[counts]}")
+    if not failures:
+        print(f"✅ {len(KNOWN_CASES)} known oversized-sentence cases chunked as expected")
+
+    df = run_benchmark(args.input, args.files, args.repeat)
+    print(f"\n📊 Fixed-size chunking, {len(df)} largest files of {args.input}")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
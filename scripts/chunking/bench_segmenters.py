@@ -0,0 +1,112 @@
+"""
+bench_segmenters.py
+===================
+
+Sentences per second of every sentence segmenter (segmenters.py) and how
+well its sentence boundaries agree with the current hierarchical output
+(the full en_core_web_sm pipeline, "parser").
+
+Texts are split into paragraphs the same way hierarchical_chunking does it,
+so the comparison is on exactly the inputs the chunker feeds to spaCy.
+
+Usage (from the project root):
+    python scripts/chunking/bench_segmenters.py --input cleanedData_us --files 30
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from hierarchical_chunking import split_paragraphs
+from segmenters import SEGMENTERS, load_segmenter
+
+
+def load_units(input_folder, n_files, unit):
+    filenames = sorted(f for f in os.listdir(input_folder) if f.endswith(".txt"))[:n_files]
+    units = []
+    for filename in filenames:
+        with open(os.path.join(input_folder, filename), "r", encoding="utf8") as f:
+            text = f.read()
+        units.extend(split_paragraphs(text) if unit == "paragraph" else [text])
+    return filenames, units
+
+
+def boundaries(all_spans):
+    """Internal sentence boundaries as (unit, end_char); the end of a unit is not counted."""
+    out = set()
+    for u, spans in enumerate(all_spans):
+        for _, end in spans[:-1]:
+            out.add((u, end))
+    return out
+
+
+def run_benchmark(input_folder="cleanedData_us", n_files=30, unit="paragraph", reference="parser",
+                  segmenters=SEGMENTERS, batch_size=256):
+    filenames, units = load_units(input_folder, n_files, unit)
+    n_chars = sum(len(u) for u in units)
+    print(f"\n📂 {len(filenames)} files, {len(units)} {unit}s, {n_chars / 1e6:.2f}M chars")
+
+    outputs, rows = {}, []
+    for name in segmenters:
+        try:
+            t_load = time.perf_counter()
+            seg = load_segmenter(name)
+            t_load = time.perf_counter() - t_load
+        except (OSError, ImportError) as e:
+            print(f"⚠️ Skipping '{name}': {e}")
+            continue
+
+        t0 = time.perf_counter()
+        outputs[name] = list(seg.pipe_spans(units, batch_size=batch_size))
+        elapsed = time.perf_counter() - t0
+
+        n_sents = sum(len(s) for s in outputs[name])
+        rows.append({
+            "segmenter": name,
+            "load_s": t_load,
+            "seconds": elapsed,
+            "sentences": n_sents,
+            "sents_per_s": n_sents / max(elapsed, 1e-9),
+            "mb_per_s": n_chars / 1e6 / max(elapsed, 1e-9),
+        })
+
+    df = pd.DataFrame(rows)
+    if reference not in outputs:
+        print(f"⚠️ Reference segmenter '{reference}' not available – no agreement scores")
+        return df
+
+    ref = boundaries(outputs[reference])
+    for i, row in df.iterrows():
+        pred = boundaries(outputs[row["segmenter"]])
+        tp = len(pred & ref)
+        precision = tp / len(pred) if pred else 1.0
+        recall = tp / len(ref) if ref else 1.0
+        df.loc[i, "precision"] = precision
+        df.loc[i, "recall"] = recall
+        df.loc[i, "f1"] = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        # same sentence list for the whole unit -> identical chunk text
+        df.loc[i, "identical_units"] = sum(
+            a == b for a, b in zip(outputs[row["segmenter"]], outputs[reference])
+        ) / max(len(units), 1)
+
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentence segmenter speed + boundary agreement")
+    parser.add_argument("--input", default="cleanedData_us")
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--unit", choices=["paragraph", "file"], default="paragraph")
+    parser.add_argument("--reference", choices=SEGMENTERS, default="parser")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    df = run_benchmark(args.input, args.files, args.unit, args.reference, batch_size=args.batch_size)
+    print(f"\n📊 Sentence segmenters (reference: {args.reference})")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,28 @@
 import os
-import spacy
+import sys
+import glob
+import argparse
+import bisect
+from contextlib import ExitStack
+
+from chunk_store import (
+    ChunkStore, ChunkStoreWriter, char_to_byte_offsets, copy_file_chunks, read_source_text, store_exists,
+)
+from parallel_chunking import run_sharded
+from segmenters import SEGMENTERS, get_segmenter
+import segmenters
+
+# incremental builds + merged views (scripts/build_manifest.py, scripts/merged_view.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from build_manifest import BuildManifest
+from merged_view import list_input_files
 
 ###############################################
-# Load optimized spaCy model
+# Sentence segmenter (see segmenters.py)
 ###############################################
 
-nlp = spacy.load(
-    "en_core_web_sm",
-    disable=["ner", "parser", "tagger", "lemmatizer"]
-)
-
-# Add sentence splitter
-nlp.add_pipe("sentencizer")
-
-# Allow large files
-nlp.max_length = 3_000_000
+# en_core_web_sm with everything disabled + sentencizer
+DEFAULT_SEGMENTER = "sentencizer"
 
 
 
@@ -22,9 +30,18 @@ nlp.max_length = 3_000_000
 # Utility functions
 ###############################################
 
-def split_to_sentences(text):
-    doc = nlp(text)
-    return [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+def split_to_sentences(text, segmenter=DEFAULT_SEGMENTER):
+    return get_segmenter(segmenter).split(text)
+
+
+def iter_sentences(text, segmenter=DEFAULT_SEGMENTER):
+    """
+    split_to_sentences, lazily: the text goes through the segmenter in
+    paragraph-aligned windows (segmenters.iter_spans), so memory is bounded
+    by the window size instead of one Doc for the whole file.
+    """
+    for start, end in get_segmenter(segmenter).iter_spans(text):
+        yield text[start:end]
 
 
 def count_words(sentence):
@@ -35,98 +52,318 @@ def count_words(sentence):
 # Chunking Method 1 (fixed size + overlap)
 ###############################################
 
-def chunk_fixed_overlap(text, max_words_per_chunk=660, overlap_sentences=3):
-    sentences = split_to_sentences(text)
-    chunks = []
-    i = 0
+def iter_chunk_spans(word_counts, max_words_per_chunk=660, overlap_sentences=3):
+    """
+    (start_sentence, end_sentence) of every chunk (end exclusive), lazily.
+    word_counts may be any iterable (e.g. fed by a streaming segmenter):
+    it is only read as far as the current chunk needs.
+
+    Greedy: a chunk takes sentences while the total stays <= max_words_per_chunk;
+    every chunk after the first starts with the last `overlap_sentences`
+    sentences of the previous one. With prefix sums P (P[j] = words in
+    sentences[:j]) the end of a chunk starting at `start` is the last j with
+    P[j] - P[start] <= max_words_per_chunk – one bisect per chunk.
+
+    A sentence longer than the limit becomes a chunk of its own. If not even
+    one new sentence fits after the overlap, the overlap is cut from the front
+    until it does (the old list-based loop never advanced there).
+    """
+    counts = iter(word_counts)
+    prefix = [0]
+
+    def chunk_end(start):
+        limit = prefix[start] + max_words_per_chunk
+        # read until one sentence past the limit is known (or the input ends)
+        while prefix[-1] <= limit:
+            w = next(counts, None)
+            if w is None:
+                break
+            prefix.append(prefix[-1] + w)
+        return bisect.bisect_right(prefix, limit) - 1
+
+    def has_sentence(i):
+        # the input may not have been read that far yet (e.g. after an oversized sentence)
+        while len(prefix) <= i + 1:
+            w = next(counts, None)
+            if w is None:
+                return False
+            prefix.append(prefix[-1] + w)
+        return True
 
     # ----- FIRST CHUNK -----
-    current_chunk = []
-    current_word_count = 0
+    start, end = 0, chunk_end(0)
+    if prefix[end] == 0 and has_sentence(end):
+        # nothing with words fits: the oversized sentence alone
+        start, end = end, end + 1
+    yield start, end
 
-    while i < len(sentences):
-        s = sentences[i]
-        w = count_words(s)
+    # ----- NEXT CHUNKS -----
+    while has_sentence(end):
+        overlap = min(overlap_sentences, end - start)
+        start = end - overlap
+        new_end = chunk_end(start)
+
+        if prefix[new_end] == prefix[start] and end <= new_end < len(prefix) - 1:
+            start, new_end = new_end, new_end + 1
+        elif new_end <= end:
+            start = min(bisect.bisect_left(prefix, prefix[end + 1] - max_words_per_chunk), end)
+            new_end = max(chunk_end(start), end + 1)
+
+        end = new_end
+        yield start, end
+
+
+def iter_chunks(sentences, max_words_per_chunk=660, overlap_sentences=3):
+    """
+    Yields (chunk_text, (start_sentence, end_sentence)); chunk text = sentences
+    joined by newlines. sentences may be a lazy iterator (iter_sentences).
+    """
+    seen = []
+
+    def word_counts():
+        for sentence in sentences:
+            seen.append(sentence)
+            yield count_words(sentence)
+
+    for start, end in iter_chunk_spans(word_counts(), max_words_per_chunk, overlap_sentences):
+        yield "\n".join(seen[start:end]), (start, end)
+
+
+def chunk_fixed_overlap(text, max_words_per_chunk=660, overlap_sentences=3, segmenter=DEFAULT_SEGMENTER):
+    """Generator of (chunk_text, sentence_span) – see iter_chunks; segmentation is streamed too."""
+    return iter_chunks(iter_sentences(text, segmenter), max_words_per_chunk, overlap_sentences)
+
+
+def chunk_sentences(sentences, max_words_per_chunk=660, overlap_sentences=3):
+    """The chunks of an already split list of sentences, as lists of sentences."""
+    word_counts = (count_words(s) for s in sentences)
+    return [sentences[start:end] for start, end in iter_chunk_spans(word_counts, max_words_per_chunk, overlap_sentences)]
+
+
+def chunk_source_spans(text, sentence_spans, max_words_per_chunk=660, overlap_sentences=3):
+    """
+    --format spans: the chunks as byte ranges of the source file instead of texts.
+    sentence_spans may be lazy (segmenter.iter_spans).
+    Returns ([(byte_start, byte_end), ...], [(start_sentence, end_sentence), ...]);
+    a chunk runs from its first sentence to its last with the whitespace in
+    between as it is in the source.
+    """
+    seen = []
+
+    def word_counts():
+        for s, e in sentence_spans:
+            seen.append((s, e))
+            yield count_words(text[s:e])
+
+    sent_spans = [
+        (start, end)
+        for start, end in iter_chunk_spans(word_counts(), max_words_per_chunk, overlap_sentences)
+        if end > start
+    ]
+    chars = [pos for start, end in sent_spans for pos in (seen[start][0], seen[end - 1][1])]
+    offsets = char_to_byte_offsets(text, chars)
+    return list(zip(offsets[0::2], offsets[1::2])), sent_spans
+
+
+def chunk_files_batch(paths, batch_size=4, segmenter=DEFAULT_SEGMENTER):
+    """
+    Worker for --workers: chunks a shard of files, pushing the texts through
+    the segmenter (nlp.pipe) in batches – files longer than one segmenter
+    window are streamed window by window. Returns {path: (chunk_texts, spans)}.
+    """
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            texts.append(f.read())
+
+    seg = get_segmenter(segmenter)
+    results = {}
+    for path, text, spans in zip(paths, texts, seg.pipe_file_spans(texts, batch_size=batch_size)):
+        chunks = list(iter_chunks(text[s:e] for s, e in spans))
+        results[path] = ([chunk_text for chunk_text, _ in chunks], [span for _, span in chunks])
+    return results
+
+
+def chunk_spans_batch(paths, batch_size=4, segmenter=DEFAULT_SEGMENTER):
+    """chunk_files_batch for --format spans. Returns {path: (byte_spans, sentence_spans)}."""
+    texts = [read_source_text(path) for path in paths]
+
+    seg = get_segmenter(segmenter)
+    results = {}
+    for path, text, spans in zip(paths, texts, seg.pipe_file_spans(texts, batch_size=batch_size)):
+        results[path] = chunk_source_spans(text, spans)
+    return results
 
-        if current_word_count + w <= max_words_per_chunk:
-            current_chunk.append(s)
-            current_word_count += w
-            i += 1
-        else:
-            if current_word_count == 0:
-                current_chunk = [s]
-                i += 1
-            break
 
-    chunks.append(current_chunk)
+###############################################
+# Output writers
+###############################################
 
-    # ----- NEXT CHUNKS -----
-    while i < len(sentences):
-        prev_chunk = chunks[-1]
-        overlap = prev_chunk[-overlap_sentences:] if len(prev_chunk) >= overlap_sentences else prev_chunk
+def write_chunk_files(chunks, file_output_dir):
+    """
+    Old layout: one chunk_N.txt per chunk, written as the (chunk_text, span)
+    pairs arrive. Returns the written paths.
+    """
+    os.makedirs(file_output_dir, exist_ok=True)
 
-        current_chunk = overlap.copy()
-        current_word_count = sum(count_words(s) for s in current_chunk)
+    # stale chunks of an older (longer) version of the file
+    for old in glob.glob(os.path.join(file_output_dir, "chunk_*.txt")):
+        os.remove(old)
 
-        while i < len(sentences):
-            s = sentences[i]
-            w = count_words(s)
+    paths = []
+    for idx, (chunk_text, _) in enumerate(chunks):
+        chunk_filename = f"chunk_{idx+1}.txt"
+        chunk_path = os.path.join(file_output_dir, chunk_filename)
+
+        with open(chunk_path, "w", encoding="utf8") as out:
+            out.write(chunk_text)
+        paths.append(chunk_path)
+
+    return paths
 
-            if current_word_count + w <= max_words_per_chunk:
-                current_chunk.append(s)
-                current_word_count += w
-                i += 1
-            else:
-                if current_word_count == 0:
-                    current_chunk = [s]
-                    i += 1
-                break
 
-        chunks.append(current_chunk)
+def write_chunks_to_store(store, filename, chunks):
+    """Packed layout: append the (chunk_text, span) pairs of one file to a ChunkStoreWriter. Returns the chunk count."""
+    file_id = store.add_file(filename)
+    n = 0
+    for n, (chunk_text, span) in enumerate(chunks, start=1):
+        if chunk_text.strip():
+            store.add_chunk(file_id, n, chunk_text, span)
+    return n
 
-    return chunks
+
+def write_spans_to_store(store, filename, source, byte_spans, sent_spans):
+    """Span layout: the chunks of one file as byte ranges of its source. Returns the chunk count."""
+    file_id = store.add_file(filename, source=source)
+    for idx, ((start, end), span) in enumerate(zip(byte_spans, sent_spans), start=1):
+        store.add_span(file_id, idx, start, end, span)
+    return len(byte_spans)
 
 
 ###############################################
 # Main processing loop
 ###############################################
 
-if __name__ == "__main__":
-    input_folder = "allData"
-    output_folder = "chunks_output"
-
+def run_chunker(input_folder="allData", output_folder="chunks_output", output_format="store",
+                workers=1, batch_size=4, segmenter=DEFAULT_SEGMENTER):
+    """
+    output_format:
+        "store" – one packed chunk store in output_folder (chunk_store.py)
+        "files" – output_folder/<file>_chunks/chunk_N.txt
+        "spans" – a chunk store whose chunks are byte ranges of the input
+                  files (no text is copied; the inputs must stay in place)
+    workers: > 1 shards the files across a process pool (parallel_chunking.py);
+             the output is identical to the serial run
+    segmenter: one of segmenters.SEGMENTERS
+
+    Incremental: files whose content, parameters and code did not change
+    since the last run (build manifest in output_folder) are not re-chunked;
+    in store mode their chunks are copied over from the previous store.
+    """
     os.makedirs(output_folder, exist_ok=True)
 
-    for filename in os.listdir(input_folder):
-        if not filename.lower().endswith((".txt", ".md")):
-            continue
-
-        file_output_dir = os.path.join(output_folder, filename + "_chunks")
+    # real files or a merged view of them (merged_view.py)
+    input_paths = dict(list_input_files(input_folder, extensions=(".txt", ".md")))
+    filenames = sorted(input_paths)
+
+    manifest = BuildManifest(
+        output_folder,
+        "chunking_660",
+        params={"format": output_format, "segmenter": segmenter, "max_words": 660, "overlap": 3},
+        code_files=[__file__, segmenters.__file__],
+    )
+    use_store = output_format in ("store", "spans")
+    with ExitStack() as stack:
+        # exited in reverse order: the old store (still mmapped) is closed before
+        # the writer renames the new files over it; on an error the writer drops
+        # its temporary files and the old store stays as it was
+        store = stack.enter_context(ChunkStoreWriter(output_folder)) if use_store else None
+        old_store = stack.enter_context(ChunkStore(output_folder)) if use_store and store_exists(output_folder) else None
 
         # ------------------------------------------
-        # SKIP IF ALREADY PROCESSED
+        # SKIP IF UNCHANGED (content hash + params)
         # ------------------------------------------
-        if os.path.exists(file_output_dir) and len(os.listdir(file_output_dir)) > 0:
-            print(f"Skipping (already done): {filename}")
-            continue
+        todo = []
+        for filename in filenames:
+            input_path = input_paths[filename]
+            if store is not None:
+                fresh = (
+                    old_store is not None
+                    and old_store.has_file(filename)
+                    and manifest.is_fresh(filename, [input_path], [])
+                )
+            else:
+                fresh = manifest.is_fresh(filename, [input_path], manifest.outputs(filename))
+
+            if fresh:
+                print(f"Skipping (unchanged): {filename}")
+            else:
+                todo.append(filename)
+
+        parallel_results = None
+        if workers > 1 and todo:
+            paths = [input_paths[f] for f in todo]
+            process_shard = chunk_spans_batch if output_format == "spans" else chunk_files_batch
+            parallel_results = run_sharded(paths, process_shard, workers, batch_size, (segmenter,))
+
+        todo = set(todo)
+        for filename in filenames:
+            file_path = input_paths[filename]
+            file_output_dir = os.path.join(output_folder, filename + "_chunks")
+
+            if filename not in todo:
+                if store is not None:
+                    copy_file_chunks(old_store, store, filename)
+                continue
+
+            if parallel_results is None:
+                print("Processing:", filename)
+
+            if output_format == "spans":
+                if parallel_results is not None:
+                    byte_spans, sent_spans = parallel_results.pop(file_path)
+                else:
+                    text = read_source_text(file_path)
+                    byte_spans, sent_spans = chunk_source_spans(text, get_segmenter(segmenter).iter_spans(text))
+                n_chunks = write_spans_to_store(store, filename, file_path, byte_spans, sent_spans)
+                manifest.record(filename, [file_path], [])
+            else:
+                if parallel_results is not None:
+                    chunks = zip(*parallel_results.pop(file_path))
+                else:
+                    with open(file_path, "r", encoding="utf8") as f:
+                        text = f.read()
 
-        print("Processing:", filename)
+                    # streamed: every chunk is written as soon as it is cut
+                    chunks = chunk_fixed_overlap(text, segmenter=segmenter)
 
-        file_path = os.path.join(input_folder, filename)
-        with open(file_path, "r", encoding="utf8") as f:
-            text = f.read()
+                if store is not None:
+                    n_chunks = write_chunks_to_store(store, filename, chunks)
+                    manifest.record(filename, [file_path], [])
+                else:
+                    written = write_chunk_files(chunks, file_output_dir)
+                    n_chunks = len(written)
+                    manifest.record(filename, [file_path], written)
 
-        chunks = chunk_fixed_overlap(text)
-        print(f"  → {len(chunks)} chunks created")
+            if parallel_results is None:
+                print(f"  → {n_chunks} chunks created")
 
-        os.makedirs(file_output_dir, exist_ok=True)
+    manifest.prune(filenames)
+    manifest.save()
 
-        for idx, chunk in enumerate(chunks):
-            chunk_text = "\n".join(chunk)
-            chunk_filename = f"chunk_{idx+1}.txt"
-            chunk_path = os.path.join(file_output_dir, chunk_filename)
+    print(f"\nAll done. ({len(todo)} chunked, {len(filenames) - len(todo)} unchanged)")
 
-            with open(chunk_path, "w", encoding="utf8") as out:
-                out.write(chunk_text)
 
-    print("\nAll done.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixed-size (660 words) + overlap chunking")
+    parser.add_argument("--input", default="allData")
+    parser.add_argument("--output", default="chunks_output")
+    parser.add_argument("--format", choices=["store", "files", "spans"], default="store",
+                        help="packed chunk store (default), one file per chunk, or a store of source byte spans")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=4, help="files per nlp.pipe batch")
+    parser.add_argument("--segmenter", choices=SEGMENTERS, default=DEFAULT_SEGMENTER,
+                        help="sentence segmenter backend (segmenters.py)")
+    args = parser.parse_args()
+
+    run_chunker(args.input, args.output, args.format, args.workers, args.batch_size, args.segmenter)
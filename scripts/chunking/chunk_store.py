@@ -0,0 +1,274 @@
+"""
+chunk_store.py
+==============
+
+Packed chunk store: all chunks of a corpus in ONE contiguous UTF-8 blob plus
+a small offsets / metadata array, instead of one chunk_N.txt file per chunk.
+
+    <store_folder>/
+        chunk_store.bin          all chunk texts, back to back (UTF-8)
+        chunk_store_index.npy    one record per chunk (see INDEX_DTYPE)
+        chunk_store_files.json   file_id -> {"orig_file", "country"} (+ "source", "sections")
+
+Reading goes through mmap, so loading a full corpus is a few large reads
+instead of tens of thousands of open() calls.
+
+Span files (--format spans in the chunkers): instead of copying the text,
+the chunks of a file can reference byte ranges of the cleaned source file
+itself – chunk_store_files.json then holds the "source" path (relative to
+the store folder) and its size, and the offset / length of its chunks are
+into that file. Overlapping chunks cost no extra bytes, and re-chunking
+rewrites only the small index. The source is mmapped on first access; if its
+size changed since chunking, reading raises instead of returning shifted text.
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+BLOB_NAME = "chunk_store.bin"
+INDEX_NAME = "chunk_store_index.npy"
+FILES_NAME = "chunk_store_files.json"
+
+INDEX_DTYPE = np.dtype([
+    ("offset", np.int64),       # byte offset of the chunk inside chunk_store.bin (or its source file)
+    ("length", np.int64),       # byte length of the chunk
+    ("file_id", np.int32),      # index into chunk_store_files.json
+    ("chunk_index", np.int32),  # 1-based chunk number inside its original file
+    ("sent_start", np.int32),   # first sentence of the chunk (inclusive)
+    ("sent_end", np.int32),     # last sentence of the chunk (exclusive)
+])
+
+
+def infer_country(orig_filename: str) -> str:
+    """UK / US from the original filename prefix."""
+    if orig_filename.startswith("UK_"):
+        return "UK"
+    if orig_filename.startswith("US_"):
+        return "US"
+    return "UNKNOWN"
+
+
+def char_to_byte_offsets(text: str, positions):
+    """UTF-8 byte offsets of character positions of text (positions in any order)."""
+    order = sorted(range(len(positions)), key=lambda i: positions[i])
+    out = [0] * len(positions)
+    char_pos = byte_pos = 0
+    for i in order:
+        pos = positions[i]
+        byte_pos += len(text[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        out[i] = byte_pos
+    return out
+
+
+def read_source_text(path: str | Path) -> str:
+    """A source file as text with its newlines untranslated, so char offsets map onto its bytes."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def store_exists(folder: str | Path) -> bool:
+    folder = Path(folder)
+    return (folder / BLOB_NAME).exists() and (folder / INDEX_NAME).exists()
+
+
+class ChunkStoreWriter:
+    """
+    Appends chunks to a new store. Everything is written to temporary files
+    and renamed on close(), so a crashed run never leaves a half-written store.
+
+        with ChunkStoreWriter("chunks_output") as store:
+            fid = store.add_file("UK_debates2023-06-28.txt")
+            store.add_chunk(fid, 1, "first chunk text", (0, 12))
+
+            fid = store.add_file("UK_debates2023-07-05.txt", source="cleanedData_uk/UK_debates2023-07-05.txt")
+            store.add_span(fid, 1, 0, 5120, (0, 40))     # bytes [0, 5120) of the source
+    """
+
+    def __init__(self, folder: str | Path):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        self._blob_tmp = self.folder / (BLOB_NAME + ".tmp")
+        self._blob = open(self._blob_tmp, "wb")
+        self._offset = 0
+        self._records = []
+        self._files = []
+
+    def add_file(self, orig_file: str, source: str | Path | None = None, sections=None) -> int:
+        """
+        source: the chunks of this file are byte spans of that file (add_span)
+        sections: the file's section tree (hierarchical_chunking.section_tree)
+        """
+        info = {"orig_file": orig_file, "country": infer_country(orig_file)}
+        if source is not None:
+            info["source"] = os.path.relpath(source, self.folder)
+            info["source_size"] = os.path.getsize(source)
+        if sections is not None:
+            info["sections"] = sections
+        self._files.append(info)
+        return len(self._files) - 1
+
+    def add_chunk(self, file_id: int, chunk_index: int, text: str, sent_span=(-1, -1)):
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self._records.append((self._offset, len(data), file_id, chunk_index, sent_span[0], sent_span[1]))
+        self._offset += len(data)
+
+    def add_span(self, file_id: int, chunk_index: int, start: int, end: int, sent_span=(-1, -1)):
+        """A chunk = bytes [start, end) of the source of file_id."""
+        self._records.append((start, end - start, file_id, chunk_index, sent_span[0], sent_span[1]))
+
+    def close(self):
+        if self._blob.closed:
+            return
+        self._blob.close()
+
+        index = np.array(self._records, dtype=INDEX_DTYPE)
+        index_tmp = self.folder / (INDEX_NAME + ".tmp")
+        with open(index_tmp, "wb") as f:
+            np.save(f, index)
+
+        files_tmp = self.folder / (FILES_NAME + ".tmp")
+        with open(files_tmp, "w", encoding="utf-8") as f:
+            json.dump(self._files, f, ensure_ascii=False)
+
+        os.replace(self._blob_tmp, self.folder / BLOB_NAME)
+        os.replace(index_tmp, self.folder / INDEX_NAME)
+        os.replace(files_tmp, self.folder / FILES_NAME)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._blob.close()
+            self._blob_tmp.unlink(missing_ok=True)
+
+
+def copy_file_chunks(old_store, writer, orig_file: str):
+    """Copies all chunks of one original file from an existing store into a writer."""
+    old_id = old_store._file_ids[orig_file]
+    source = old_store.source_path(old_id)
+    file_id = writer.add_file(orig_file, source, old_store.files[old_id].get("sections"))
+
+    if source is None:
+        for chunk_index, text, span in old_store.file_chunks(orig_file):
+            writer.add_chunk(file_id, chunk_index, text, span)
+        return
+
+    for rec in old_store.index[old_store.index["file_id"] == old_id]:
+        start = int(rec["offset"])
+        writer.add_span(file_id, int(rec["chunk_index"]), start, start + int(rec["length"]),
+                        (int(rec["sent_start"]), int(rec["sent_end"])))
+
+
+class ChunkStore:
+    """Read-only, mmap-backed view of a packed chunk store."""
+
+    def __init__(self, folder: str | Path):
+        self.folder = Path(folder)
+        if not store_exists(self.folder):
+            raise FileNotFoundError(f"No chunk store found in: {self.folder}")
+
+        self.index = np.load(self.folder / INDEX_NAME)
+        with open(self.folder / FILES_NAME, "r", encoding="utf-8") as f:
+            self.files = json.load(f)
+        self._file_ids = {f["orig_file"]: i for i, f in enumerate(self.files)}
+
+        self._fh = open(self.folder / BLOB_NAME, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        # mmap of an empty file is not allowed
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        # file_id -> mmap of its source (span files), opened on first access
+        self._has_sources = any("source" in f for f in self.files)
+        self._sources = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def source_path(self, file_id: int) -> Path | None:
+        source = self.files[file_id].get("source")
+        return self.folder / source if source is not None else None
+
+    def source_paths(self) -> list[Path]:
+        """Source files referenced by span files."""
+        return [self.source_path(i) for i, f in enumerate(self.files) if "source" in f]
+
+    def _source(self, file_id: int):
+        mm = self._sources.get(file_id)
+        if mm is None:
+            path = self.source_path(file_id)
+            with open(path, "rb") as fh:
+                size = os.fstat(fh.fileno()).st_size
+                if size != self.files[file_id]["source_size"]:
+                    raise RuntimeError(f"{path} changed since it was chunked – re-run the chunker")
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            self._sources[file_id] = mm
+        return mm
+
+    def text(self, i: int) -> str:
+        rec = self.index[i]
+        start = int(rec["offset"])
+        file_id = int(rec["file_id"])
+        mm = self._source(file_id) if self._has_sources and "source" in self.files[file_id] else self._mm
+        return mm[start:start + int(rec["length"])].decode("utf-8")
+
+    def iter_texts(self):
+        for i in range(len(self.index)):
+            yield self.text(i)
+
+    def has_file(self, orig_file: str) -> bool:
+        return orig_file in self._file_ids
+
+    def file_chunks(self, orig_file: str):
+        """[(chunk_index, text, (sent_start, sent_end)), ...] of one original file."""
+        file_id = self._file_ids.get(orig_file)
+        if file_id is None:
+            return []
+        rows = np.where(self.index["file_id"] == file_id)[0]
+        return [
+            (int(self.index["chunk_index"][i]), self.text(i),
+             (int(self.index["sent_start"][i]), int(self.index["sent_end"][i])))
+            for i in rows
+        ]
+
+    def sections(self, orig_file: str):
+        """
+        Section tree of one original file (hierarchical chunker):
+        [[title, first_paragraph, end_paragraph, first_chunk, end_chunk], ...],
+        chunk numbers are chunk_index values (end exclusive); None if not stored.
+        """
+        file_id = self._file_ids.get(orig_file)
+        return None if file_id is None else self.files[file_id].get("sections")
+
+    def orig_files(self):
+        """orig_file per chunk."""
+        names = np.array([f["orig_file"] for f in self.files], dtype=object)
+        return names[self.index["file_id"]] if len(self.files) else np.array([], dtype=object)
+
+    def countries(self):
+        """country per chunk."""
+        countries = np.array([f["country"] for f in self.files], dtype=object)
+        return countries[self.index["file_id"]] if len(self.files) else np.array([], dtype=object)
+
+    def close(self):
+        for mm in [self._mm, *self._sources.values()]:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+        self._sources = {}
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
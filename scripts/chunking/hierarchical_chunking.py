@@ -1,58 +1,230 @@
 import os
 import re
-import spacy
+import sys
+import json
+import glob
+import bisect
+import argparse
+import itertools
+from contextlib import ExitStack
 
-nlp = spacy.load("en_core_web_sm")
+from chunk_store import (
+    ChunkStore, ChunkStoreWriter, char_to_byte_offsets, copy_file_chunks, read_source_text, store_exists,
+)
+from parallel_chunking import run_sharded
+from segmenters import SEGMENTERS, get_segmenter
+import segmenters
+
+# incremental builds + merged views (scripts/build_manifest.py, scripts/merged_view.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from build_manifest import BuildManifest
+from merged_view import list_input_files
+
+# Only doc.sents is needed: the rule-based sentencizer is enough.
+# Use --segmenter parser for the old full-pipeline (dependency parse) sentences.
+DEFAULT_SEGMENTER = "sentencizer"
 
 
 # --------------------------------------------------
 # Split text into sentences
 # --------------------------------------------------
 
-def split_sentences(text):
-    doc = nlp(text)
-    return [s.text.strip() for s in doc.sents if s.text.strip()]
+def split_sentences(text, segmenter=DEFAULT_SEGMENTER):
+    return get_segmenter(segmenter).split(text)
 
 
 # --------------------------------------------------
 # Hierarchical chunking
 # --------------------------------------------------
 
-def hierarchical_chunk(text):
+# ALL-CAPS heading at the start of a line (the heading stays in its section)
+HEADING_PATTERN = r"(?m)^(?=[A-Z][A-Z0-9 ,.'’\-]{8,})"
+# every section and paragraph boundary in one scan: heading (empty match) or "\n\n"
+BOUNDARY_RE = re.compile(HEADING_PATTERN + r"|\n\n")
+
+
+def index_paragraphs(text):
     """
-    Correct hierarchical chunking for Congressional Record:
+    One compiled scan over the text:
     1. Detect ALL-CAPS headings → split into sections
     2. Split each section into paragraphs
-    3. Split each paragraph into sentences
+
+    Returns (paragraph_spans, sections):
+        paragraph_spans  (start_char, end_char) per paragraph; text[start:end]
+                         is the stripped paragraph
+        sections         (title, first_paragraph, end_paragraph) per section;
+                         title = the heading line ("" before the first heading)
     """
+    spans = []
+    sections = []
+    title, first = "", 0
+
+    def add_paragraph(start, end):
+        piece = text[start:end]
+        paragraph = piece.strip()
+        if paragraph:
+            start += len(piece) - len(piece.lstrip())
+            spans.append((start, start + len(paragraph)))
+
+    pos = 0
+    for m in BOUNDARY_RE.finditer(text):
+        add_paragraph(pos, m.start())
+        if m.start() == m.end():
+            # heading: a new section starts here
+            if len(spans) > first:
+                sections.append((title, first, len(spans)))
+            line_end = text.find("\n", m.start())
+            title, first = text[m.start():line_end if line_end != -1 else len(text)].strip(), len(spans)
+        pos = m.end()
+
+    add_paragraph(pos, len(text))
+    if len(spans) > first:
+        sections.append((title, first, len(spans)))
+
+    return spans, sections
 
-    # 1. Detect ALL-CAPS HEADINGS
-    heading_re = r"(?m)^(?=[A-Z][A-Z0-9 ,.'’\-]{8,})"
 
-    # Split but KEEP each heading
-    parts = re.split(heading_re, text)
-    parts = [p.strip() for p in parts if p.strip()]
+def split_paragraph_spans(text):
+    """(start_char, end_char) of every paragraph – see index_paragraphs."""
+    return index_paragraphs(text)[0]
 
+
+def split_paragraphs(text):
+    return [text[start:end] for start, end in split_paragraph_spans(text)]
+
+
+def chunks_from_paragraph_sentences(paragraph_sentences):
+    """
+    3. One chunk per paragraph (its sentences joined by newlines).
+    Returns (chunks, spans) with spans counted over all sentences of the file.
+    """
     chunks = []
+    spans = []
+    n_sentences = 0
 
-    for section in parts:
-        # 2. Split paragraphs
-        paragraphs = [p.strip() for p in section.split("\n\n") if p.strip()]
+    for sentences in paragraph_sentences:
+        if not sentences:
+            continue
 
-        for para in paragraphs:
-            sentences = split_sentences(para)
-            if not sentences:
-                continue
+        start = n_sentences
+        n_sentences += len(sentences)
+        chunk_text = "\n".join(sentences)
 
-            chunk_text = "\n".join(sentences)
+        # Skip useless chunks: dates, "of california", "in the house..."
+        if len(chunk_text.split()) < 6:  # too small = metadata
+            continue
 
-            # Skip useless chunks: dates, "of california", "in the house..."
-            if len(chunk_text.split()) < 6:  # too small = metadata
-                continue
+        chunks.append(chunk_text)
+        spans.append((start, n_sentences))
+
+    return chunks, spans
+
+
+def source_spans_from_paragraphs(text, paragraph_spans, paragraph_sentence_spans):
+    """
+    --format spans: chunks_from_paragraph_sentences as byte ranges of the source
+    (sentence spans are relative to their paragraph). Returns (byte_spans, spans).
+    """
+    chars = []
+    spans = []
+    n_sentences = 0
+
+    for (p_start, _), sentences in zip(paragraph_spans, paragraph_sentence_spans):
+        if not sentences:
+            continue
+
+        start = n_sentences
+        n_sentences += len(sentences)
+
+        if sum(len(text[p_start + s:p_start + e].split()) for s, e in sentences) < 6:
+            continue
+
+        chars += [p_start + sentences[0][0], p_start + sentences[-1][1]]
+        spans.append((start, n_sentences))
+
+    offsets = char_to_byte_offsets(text, chars)
+    return list(zip(offsets[0::2], offsets[1::2])), spans
+
+
+def section_tree(sections, paragraph_sentence_counts, spans):
+    """
+    The section tree of one file, persisted with its chunks (chunk_store.py):
+    [[title, first_paragraph, end_paragraph, first_chunk, end_chunk], ...]
+    with chunk numbers = chunk_index (1-based, end exclusive). Paragraphs that
+    were too small to become a chunk are in the paragraph range only.
+    """
+    sentence_starts = list(itertools.accumulate(paragraph_sentence_counts, initial=0))
+    # paragraph of every chunk: the last paragraph starting at the chunk's first sentence
+    chunk_paragraphs = [bisect.bisect_right(sentence_starts, start) - 1 for start, _ in spans]
+
+    return [
+        [title, first, end,
+         bisect.bisect_left(chunk_paragraphs, first) + 1, bisect.bisect_left(chunk_paragraphs, end) + 1]
+        for title, first, end in sections
+    ]
+
+
+def iter_file_chunks(texts, segmenter=DEFAULT_SEGMENTER, batch_size=256, source_spans=False):
+    """
+    (chunks, spans, sections) per text. The paragraphs of ALL texts go
+    through the segmenter (nlp.pipe) in batches of batch_size.
+    source_spans: chunks are byte ranges of the text (--format spans)
+    """
+    texts = list(texts)
+    indexes = [index_paragraphs(text) for text in texts]
 
-            chunks.append(chunk_text)
+    all_paragraphs = (text[s:e] for text, (paragraphs, _) in zip(texts, indexes) for s, e in paragraphs)
+    all_spans = get_segmenter(segmenter).pipe_spans(all_paragraphs, batch_size=batch_size)
 
-    return chunks
+    for text, (paragraphs, sections) in zip(texts, indexes):
+        sentence_spans = [next(all_spans) for _ in paragraphs]
+        if source_spans:
+            chunks, spans = source_spans_from_paragraphs(text, paragraphs, sentence_spans)
+        else:
+            chunks, spans = chunks_from_paragraph_sentences(
+                [text[p + s:p + e] for s, e in sents] for (p, _), sents in zip(paragraphs, sentence_spans)
+            )
+        yield chunks, spans, section_tree(sections, [len(s) for s in sentence_spans], spans)
+
+
+def hierarchical_chunk(text, return_spans=False, segmenter=DEFAULT_SEGMENTER, return_sections=False):
+    """
+    Correct hierarchical chunking for Congressional Record:
+    1. Detect ALL-CAPS headings → split into sections
+    2. Split each section into paragraphs
+    3. Split each paragraph into sentences
+
+    return_spans: also return the (start_sentence, end_sentence) of every
+                  chunk, counted over all sentences of the file (end exclusive)
+    return_sections: also return the section tree (see section_tree)
+    """
+    chunks, spans, sections = next(iter_file_chunks([text], segmenter))
+
+    result = (chunks,)
+    if return_spans:
+        result += (spans,)
+    if return_sections:
+        result += (sections,)
+    return result if len(result) > 1 else chunks
+
+
+def chunk_files_batch(paths, batch_size=256, segmenter=DEFAULT_SEGMENTER):
+    """
+    Worker for --workers: all paragraphs of a shard of files go through
+    the segmenter (nlp.pipe) in batches. Returns {path: (chunks, spans, sections)}.
+    """
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            texts.append(f.read())
+
+    return dict(zip(paths, iter_file_chunks(texts, segmenter, batch_size)))
+
+
+def chunk_spans_batch(paths, batch_size=256, segmenter=DEFAULT_SEGMENTER):
+    """chunk_files_batch for --format spans. Returns {path: (byte_spans, spans, sections)}."""
+    texts = [read_source_text(path) for path in paths]
+    return dict(zip(paths, iter_file_chunks(texts, segmenter, batch_size, source_spans=True)))
 
 
 # --------------------------------------------------
@@ -60,41 +232,162 @@ def hierarchical_chunk(text):
 # --------------------------------------------------
 
 def save_chunks(chunks, output_dir, base_filename):
+    """Returns the written paths."""
     os.makedirs(output_dir, exist_ok=True)
 
+    # stale chunks of an older (longer) version of the file
+    for old in glob.glob(os.path.join(output_dir, f"{glob.escape(base_filename)}_chunk_*.txt")):
+        os.remove(old)
+
+    paths = []
     for idx, chunk in enumerate(chunks, start=1):
         out_path = os.path.join(output_dir, f"{base_filename}_chunk_{idx}.txt")
         with open(out_path, "w", encoding="utf8") as f:
             f.write(chunk)
+        paths.append(out_path)
+
+    return paths
+
+
+def save_sections(sections, output_dir, base_filename):
+    """Section tree next to the chunk files (files layout). Returns the path."""
+    out_path = os.path.join(output_dir, f"{base_filename}_sections.json")
+    with open(out_path, "w", encoding="utf8") as f:
+        json.dump(sections, f, ensure_ascii=False)
+    return out_path
+
+
+def save_chunks_to_store(store, chunks, spans, orig_filename, sections=None):
+    file_id = store.add_file(orig_filename, sections=sections)
+    for idx, (chunk, span) in enumerate(zip(chunks, spans), start=1):
+        store.add_chunk(file_id, idx, chunk, span)
+
+
+def save_spans_to_store(store, byte_spans, spans, orig_filename, source, sections=None):
+    file_id = store.add_file(orig_filename, source=source, sections=sections)
+    for idx, ((start, end), span) in enumerate(zip(byte_spans, spans), start=1):
+        store.add_span(file_id, idx, start, end, span)
 
 
 # --------------------------------------------------
 # Runner
 # --------------------------------------------------
 
-def run_chunker(input_folder="cleanedData_us", output_folder="hierarchical_chunks"):
+def run_chunker(input_folder="cleanedData_us", output_folder="hierarchical_chunks", output_format="store",
+                workers=1, batch_size=256, segmenter=DEFAULT_SEGMENTER):
+    """
+    output_format:
+        "store" – one packed chunk store in output_folder (chunk_store.py)
+        "files" – output_folder/<file>_chunks/<file>_chunk_N.txt
+        "spans" – a chunk store whose chunks are byte ranges of the input
+                  files (no text is copied; the inputs must stay in place)
+    workers: > 1 shards the files across a process pool (parallel_chunking.py);
+             the output is identical to the serial run
+    segmenter: one of segmenters.SEGMENTERS
+
+    Incremental: files whose content, parameters and code did not change
+    since the last run (build manifest in output_folder) are not re-chunked;
+    in store mode their chunks are copied over from the previous store.
+    """
 
     os.makedirs(output_folder, exist_ok=True)
 
-    for filename in os.listdir(input_folder):
-        if not filename.endswith(".txt"):
-            continue
+    # real files or a merged view of them (merged_view.py)
+    input_paths = dict(list_input_files(input_folder, extensions=(".txt",)))
+    filenames = sorted(input_paths)
 
-        print(f"Processing: {filename}")
-        path = os.path.join(input_folder, filename)
+    manifest = BuildManifest(
+        output_folder,
+        "hierarchical_chunking",
+        params={"format": output_format, "segmenter": segmenter},
+        code_files=[__file__, segmenters.__file__],
+    )
+    use_store = output_format in ("store", "spans")
+    with ExitStack() as stack:
+        # exited in reverse order: the old store (still mmapped) is closed before
+        # the writer renames the new files over it; on an error the writer drops
+        # its temporary files and the old store stays as it was
+        store = stack.enter_context(ChunkStoreWriter(output_folder)) if use_store else None
+        old_store = stack.enter_context(ChunkStore(output_folder)) if use_store and store_exists(output_folder) else None
 
-        with open(path, "r", encoding="utf8") as f:
-            text = f.read()
+        # --------------------------------------------------
+        # Skip files that did not change since the last run
+        # --------------------------------------------------
+        todo = []
+        for filename in filenames:
+            path = input_paths[filename]
+            if store is not None:
+                fresh = (
+                    old_store is not None
+                    and old_store.has_file(filename)
+                    and manifest.is_fresh(filename, [path], [])
+                )
+            else:
+                fresh = manifest.is_fresh(filename, [path], manifest.outputs(filename))
+
+            if fresh:
+                print(f"Skipping (unchanged): {filename}")
+            else:
+                todo.append(filename)
+
+        parallel_results = None
+        if workers > 1 and todo:
+            paths = [input_paths[f] for f in todo]
+            process_shard = chunk_spans_batch if output_format == "spans" else chunk_files_batch
+            parallel_results = run_sharded(paths, process_shard, workers, batch_size, (segmenter,))
+
+        todo = set(todo)
+        for filename in filenames:
+            path = input_paths[filename]
+
+            if filename not in todo:
+                if store is not None:
+                    copy_file_chunks(old_store, store, filename)
+                continue
+
+            if parallel_results is not None:
+                chunks, spans, sections = parallel_results.pop(path)
+            else:
+                print(f"Processing: {filename}")
+
+                if output_format == "spans":
+                    text = read_source_text(path)
+                else:
+                    with open(path, "r", encoding="utf8") as f:
+                        text = f.read()
 
-        chunks = hierarchical_chunk(text)
-        print(f"  → {len(chunks)} chunks created")
+                chunks, spans, sections = next(
+                    iter_file_chunks([text], segmenter, batch_size, source_spans=output_format == "spans")
+                )
+                print(f"  → {len(chunks)} chunks created")
 
-        save_chunks(
-            chunks,
-            output_dir=os.path.join(output_folder, filename + "_chunks"),
-            base_filename=filename.replace(".txt", "")
-        )
+            if output_format == "spans":
+                save_spans_to_store(store, chunks, spans, orig_filename=filename, source=path, sections=sections)
+                manifest.record(filename, [path], [])
+            elif store is not None:
+                save_chunks_to_store(store, chunks, spans, orig_filename=filename, sections=sections)
+                manifest.record(filename, [path], [])
+            else:
+                output_dir = os.path.join(output_folder, filename + "_chunks")
+                base_filename = filename.replace(".txt", "")
+                written = save_chunks(chunks, output_dir=output_dir, base_filename=base_filename)
+                written.append(save_sections(sections, output_dir, base_filename))
+                manifest.record(filename, [path], written)
+
+    manifest.prune(filenames)
+    manifest.save()
 
 
 if __name__ == "__main__":
-    run_chunker()
+    parser = argparse.ArgumentParser(description="Hierarchical (heading → paragraph) chunking")
+    parser.add_argument("--input", default="cleanedData_us")
+    parser.add_argument("--output", default="hierarchical_chunks")
+    parser.add_argument("--format", choices=["store", "files", "spans"], default="store",
+                        help="packed chunk store (default), one file per chunk, or a store of source byte spans")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="paragraphs per nlp.pipe batch")
+    parser.add_argument("--segmenter", choices=SEGMENTERS, default=DEFAULT_SEGMENTER,
+                        help="sentence segmenter backend (segmenters.py)")
+    args = parser.parse_args()
+
+    run_chunker(args.input, args.output, args.format, args.workers, args.batch_size, args.segmenter)
@@ -0,0 +1,74 @@
+"""
+parallel_chunking.py
+====================
+
+Shared process-pool driver for the chunkers (--workers N).
+
+Input files are sharded across N worker processes (balanced by file size).
+Every worker loads its sentence segmenter once (segmenters.get_segmenter)
+and pushes its texts through nlp.pipe in batches. Results come back as
+{path: (chunks, spans, ...)} and the caller writes them in sorted filename
+order, so the output is identical to a serial run.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def shard_by_size(paths, n_shards):
+    """Greedy size balancing: largest file goes to the currently lightest shard."""
+    shards = [[] for _ in range(n_shards)]
+    loads = [0] * n_shards
+
+    for path in sorted(paths, key=lambda p: (-os.path.getsize(p), p)):
+        i = loads.index(min(loads))
+        shards[i].append(path)
+        loads[i] += os.path.getsize(path)
+
+    return [sorted(shard) for shard in shards]
+
+
+def _run_shard(process_shard, worker_id, paths, batch_size, shard_args):
+    t0 = time.perf_counter()
+    results = process_shard(paths, batch_size, *shard_args)
+    elapsed = time.perf_counter() - t0
+
+    stats = {
+        "worker": worker_id,
+        "pid": os.getpid(),
+        "files": len(paths),
+        "mb": sum(os.path.getsize(p) for p in paths) / 1e6,
+        "chunks": sum(len(result[0]) for result in results.values()),
+        "seconds": elapsed,
+    }
+    return results, stats
+
+
+def run_sharded(paths, process_shard, workers, batch_size, shard_args=()):
+    """
+    paths: input files
+    process_shard: module-level function (paths, batch_size, *shard_args) -> {path: (chunks, spans, ...)}
+    Returns the merged results dict and prints per-worker throughput.
+    """
+    shards = [s for s in shard_by_size(paths, workers) if s]
+    print(f"⚙️  {len(paths)} files → {len(shards)} workers (batch_size={batch_size})")
+
+    results = {}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [
+            pool.submit(_run_shard, process_shard, i, shard, batch_size, shard_args)
+            for i, shard in enumerate(shards)
+        ]
+        for future in futures:
+            shard_results, stats = future.result()
+            results.update(shard_results)
+            print(
+                f"   • worker {stats['worker']} (pid {stats['pid']}): "
+                f"{stats['files']} files, {stats['mb']:.1f} MB, {stats['chunks']} chunks "
+                f"in {stats['seconds']:.1f}s → {stats['mb'] / max(stats['seconds'], 1e-9):.2f} MB/s"
+            )
+
+    print(f"⏱️  Parallel chunking wall time: {time.perf_counter() - t0:.1f}s")
+    return results
@@ -0,0 +1,218 @@
+"""
+segmenters.py
+=============
+
+Pluggable sentence segmenters for the chunkers (--segmenter NAME):
+
+    "parser"      – en_core_web_sm with the full pipeline; sentences come from
+                    the dependency parse (the old hierarchical_chunking behaviour)
+    "sentencizer" – en_core_web_sm with tagger / parser / NER / lemmatizer
+                    disabled + the rule-based sentencizer (chuncking_660)
+    "blank"       – spacy.blank("en") + sentencizer, no model to load
+    "regex"       – compiled regex splitter, no spaCy at all
+
+Every segmenter returns sentences as (start_char, end_char) spans into the
+text, already stripped of surrounding whitespace, so text[start:end] is the
+sentence exactly as the chunkers used it (sent.text.strip()).
+
+iter_spans(text) is the streaming variant for whole files: the text goes
+through nlp.pipe in paragraph-aligned windows of ~WINDOW_CHARS, so only one
+window-sized Doc is alive at a time instead of a Doc for the whole sitting.
+The last sentence of a window may be cut by the window end; it is not
+yielded but carried over – the next window starts at its first character,
+so it is segmented again with its real continuation.
+"""
+
+import re
+
+
+SEGMENTERS = ("parser", "sentencizer", "blank", "regex")
+
+# Allow large files
+MAX_LENGTH = 3_000_000
+
+# characters per window in iter_spans
+WINDOW_CHARS = 100_000
+
+
+def _stripped_span(text, start, end):
+    """Shrink [start, end) so that text[start:end] == text[start:end].strip()."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _window_end(text, start, window_chars):
+    """End of the window starting at start: after the last paragraph break (else line break, else space) inside it."""
+    end = start + window_chars
+    if end >= len(text):
+        return len(text)
+    for sep in ("\n\n", "\n", " "):
+        cut = text.rfind(sep, start + 1, end)
+        if cut != -1:
+            return cut + len(sep)
+    return end
+
+
+def iter_window_spans(segment_windows, text, window_chars=WINDOW_CHARS):
+    """
+    Drives iter_spans: segment_windows(windows) turns an iterator of window
+    texts into an iterator of their sentence spans and must consume it lazily
+    (one window at a time), since every window starts where the previous
+    one's carried-over last sentence starts.
+    """
+    state = {"start": 0, "end": 0}
+
+    def windows():
+        while state["start"] < len(text):
+            end = _window_end(text, state["start"], window_chars)
+            # a carried sentence longer than a window: widen until it ends
+            while end <= state["end"] and end < len(text):
+                end = _window_end(text, end, window_chars)
+            state["end"] = end
+            yield text[state["start"]:end]
+
+    for spans in segment_windows(windows()):
+        offset, end = state["start"], state["end"]
+        if end == len(text):
+            for s, e in spans:
+                yield offset + s, offset + e
+            return
+
+        for s, e in spans[:-1]:
+            yield offset + s, offset + e
+        # next window starts with the (possibly cut) last sentence
+        state["start"] = offset + spans[-1][0] if spans else end
+
+
+class SpacySegmenter:
+    """Sentence spans from a spaCy pipeline (doc.sents)."""
+
+    def __init__(self, nlp, name):
+        self.nlp = nlp
+        self.name = name
+
+    def _spans_from_doc(self, doc):
+        text = doc.text
+        spans = []
+        for sent in doc.sents:
+            start, end = _stripped_span(text, sent.start_char, sent.end_char)
+            if start < end:
+                spans.append((start, end))
+        return spans
+
+    def spans(self, text):
+        return self._spans_from_doc(self.nlp(text))
+
+    def pipe_spans(self, texts, batch_size=64):
+        for doc in self.nlp.pipe(texts, batch_size=batch_size):
+            yield self._spans_from_doc(doc)
+
+    def iter_spans(self, text, window_chars=WINDOW_CHARS):
+        """spans(text), lazily, one window-sized Doc at a time (see module docstring)."""
+        if len(text) <= window_chars:
+            yield from self.spans(text)
+            return
+        # batch_size=1: nlp.pipe must not read ahead of the carried-over sentence
+        docs = lambda windows: (self._spans_from_doc(doc) for doc in self.nlp.pipe(windows, batch_size=1))
+        yield from iter_window_spans(docs, text, window_chars)
+
+    def pipe_file_spans(self, texts, batch_size=64, window_chars=WINDOW_CHARS):
+        """
+        pipe_spans for whole files: files up to window_chars go through
+        nlp.pipe in batches, longer ones are streamed with iter_spans.
+        Yields one list of spans per text, in order.
+        """
+        texts = list(texts)
+        small = [i for i, text in enumerate(texts) if len(text) <= window_chars]
+        small_spans = dict(zip(small, self.pipe_spans((texts[i] for i in small), batch_size=batch_size)))
+        for i, text in enumerate(texts):
+            yield small_spans.pop(i) if i in small_spans else list(self.iter_spans(text, window_chars))
+
+    def split(self, text):
+        return [text[s:e] for s, e in self.spans(text)]
+
+
+class RegexSegmenter:
+    """
+    Splits after . ! ? (plus closing quotes / brackets) followed by whitespace,
+    except after common titles / abbreviations ("Mr.", "Hon.", "No.") and
+    single-letter initials ("J. Smith", "U.S.").
+    """
+
+    name = "regex"
+
+    _BOUNDARY_RE = re.compile(r"[.!?]+[\"'’”)\]]*(?=\s|$)")
+    _LAST_WORD_RE = re.compile(r"(\w+)[.]$")
+    ABBREVIATIONS = frozenset({
+        "mr", "mrs", "ms", "dr", "hon", "st", "no", "nos", "vol", "sec", "gen",
+        "rep", "sen", "gov", "lt", "col", "sgt", "capt", "jr", "sr", "co", "inc",
+        "ltd", "vs", "etc", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+        "sep", "sept", "oct", "nov", "dec",
+    })
+
+    def spans(self, text):
+        spans = []
+        start = 0
+        for m in self._BOUNDARY_RE.finditer(text):
+            end = m.end()
+            last = self._LAST_WORD_RE.search(text, max(start, end - 12), end)
+            if last and (len(last.group(1)) == 1 or last.group(1).lower() in self.ABBREVIATIONS):
+                continue
+            s, e = _stripped_span(text, start, end)
+            if s < e:
+                spans.append((s, e))
+            start = end
+
+        s, e = _stripped_span(text, start, len(text))
+        if s < e:
+            spans.append((s, e))
+        return spans
+
+    def pipe_spans(self, texts, batch_size=64):
+        for text in texts:
+            yield self.spans(text)
+
+    def iter_spans(self, text, window_chars=WINDOW_CHARS):
+        # no Doc to bound: the regex already walks the text lazily
+        yield from self.spans(text)
+
+    def pipe_file_spans(self, texts, batch_size=64, window_chars=WINDOW_CHARS):
+        return self.pipe_spans(texts, batch_size)
+
+    def split(self, text):
+        return [text[s:e] for s, e in self.spans(text)]
+
+
+def load_segmenter(name="sentencizer"):
+    """Builds one of SEGMENTERS."""
+    if name == "regex":
+        return RegexSegmenter()
+
+    import spacy
+
+    if name == "parser":
+        nlp = spacy.load("en_core_web_sm")
+    elif name == "sentencizer":
+        nlp = spacy.load("en_core_web_sm", disable=["ner", "parser", "tagger", "lemmatizer"])
+        nlp.add_pipe("sentencizer")
+    elif name == "blank":
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+    else:
+        raise ValueError(f"Unknown segmenter '{name}', expected one of {SEGMENTERS}")
+
+    nlp.max_length = MAX_LENGTH
+    return SpacySegmenter(nlp, name)
+
+
+_cache = {}
+
+
+def get_segmenter(name="sentencizer"):
+    """One segmenter per process and name (loaded on first use)."""
+    if name not in _cache:
+        _cache[name] = load_segmenter(name)
+    return _cache[name]
@@ -1,122 +1,224 @@
+"""
+cleaning.py
+===========
+
+ניקוי סמנטי של allData -> allData_punc_cleaned: אותיות קטנות, הפרדת פיסוק,
+הסרת stopwords ומילים "חושפות" (uk / us / congress ...), שמירה על הפיסוק.
+
+Importable (perform_enhanced_cleanup_preserve_punc, clean_file, run_cleaning)
+and a CLI that cleans the files in a process pool:
+
+    python scripts/cleaning.py                      # all cores
+    python scripts/cleaning.py --workers 1          # serial
+    python scripts/cleaning.py --input allData --output allData_punc_cleaned
+
+Outputs are written atomically (.tmp + rename) and unchanged files are
+skipped through the build manifest (build_manifest.py).
+"""
+
 import os
 import re
+import string
+import hashlib
+import argparse
 from pathlib import Path
-from nltk.corpus import stopwords
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import nltk
-import shutil 
-import string 
+from nltk.corpus import stopwords
+from tqdm import tqdm
+
+from build_manifest import BuildManifest
+from merged_view import list_input_files
 
 # -------------------------------------------------------------
 # PATH SETUP
 # -------------------------------------------------------------
-BASE_DIR = Path(__file__).resolve().parent 
-ROOT_DIR = BASE_DIR.parent 
+BASE_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BASE_DIR.parent
 
-INPUT_FOLDER = ROOT_DIR / "allData" 
-OUTPUT_FOLDER = ROOT_DIR / "allData_punc_cleaned" 
-
-OUTPUT_FOLDER.mkdir(exist_ok=True)
+INPUT_FOLDER = ROOT_DIR / "allData"
+OUTPUT_FOLDER = ROOT_DIR / "allData_punc_cleaned"
 
 
 # -------------------------------------------------------------
 # PRE-REQUISITES (הורדת משאבי NLTK)
 # -------------------------------------------------------------
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError: 
-    print("Downloading nltk stopwords resource...")
-    nltk.download('stopwords', quiet=True)
-except Exception as e:
-    print(f"Warning: Failed to download nltk stopwords, may affect cleanup quality: {e}")
+def download_nltk_stopwords():
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        print("Downloading nltk stopwords resource...")
+        nltk.download('stopwords', quiet=True)
+    except Exception as e:
+        print(f"Warning: Failed to download nltk stopwords, may affect cleanup quality: {e}")
 
 
 # -------------------------------------------------------------
 # רשימות מילים להסרה
 # -------------------------------------------------------------
-ENGLISH_STOPWORDS = set(stopwords.words('english'))
-
 REVEALING_WORDS = {
-    'uk', 'us', 'usa', 'united', 'kingdom', 'states', 'britain', 
-    'america', 'congress', 'parliament', 'uks', 'uss', 
-    'mr', 'ms', 'mrs', 'speaker', 'hon', 'honorable', 'sir', 
+    'uk', 'us', 'usa', 'united', 'kingdom', 'states', 'britain',
+    'america', 'congress', 'parliament', 'uks', 'uss',
+    'mr', 'ms', 'mrs', 'speaker', 'hon', 'honorable', 'sir',
     'doctor', 'deputy', 'superintendent', 'charles'
 }
 
-ALL_WORDS_TO_REMOVE = ENGLISH_STOPWORDS.union(REVEALING_WORDS)
-print(f"Loaded {len(ALL_WORDS_TO_REMOVE)} total words for semantic removal.")
+_words_to_remove = None
+
+
+def get_words_to_remove() -> frozenset:
+    """NLTK English stopwords + REVEALING_WORDS (loaded once per process)."""
+    global _words_to_remove
+    if _words_to_remove is None:
+        _words_to_remove = frozenset(stopwords.words('english')).union(REVEALING_WORDS)
+    return _words_to_remove
 
 
 # -------------------------------------------------------------
-# פונקציית הניקוי החדשה (שומרת פיסוק + מטפלת בגרש קניין)
+# Compiled rules (built once at import, not on every call)
 # -------------------------------------------------------------
-def perform_enhanced_cleanup_preserve_punc(text):
+PUNCTUATION = frozenset(string.punctuation)
+
+# 's / s' -> separate tokens (straight and curly apostrophes)
+POSSESSIVE_S_RE = re.compile(r"([a-z]+)['’]s")
+POSSESSIVE_PLURAL_RE = re.compile(r"([a-z]+)s['’]")
+
+# space around punctuation (a callable replacement is faster than r' \1 ')
+PUNCT_RE = re.compile(r'([%s])' % re.escape(string.punctuation))
+
+# dotted abbreviations that reveal the class (m.p.s, u.s.a)
+DOTTED_ABBREV_RE = re.compile(r'\s*([a-z]\s*\.\s*){2,}')
+
+# space before punctuation
+SPACE_BEFORE_PUNCT_RE = re.compile(r'\s([%s])' % re.escape(string.punctuation))
+
+
+# -------------------------------------------------------------
+# פונקציית הניקוי (שומרת פיסוק + מטפלת בגרש קניין)
+# -------------------------------------------------------------
+def perform_enhanced_cleanup_preserve_punc(text, words_to_remove=None):
     """
     מבצע ניקוי חזק, מטפל בגרש קניין (כולל מעוקל), ושומר על כל סימני הפיסוק.
     """
-    
+    if words_to_remove is None:
+        words_to_remove = get_words_to_remove()
+
     # 1. המרה לאותיות קטנות
     text = text.lower()
-    
-    # 2. **תיקון קריטי: טיפול בגרש קניין (כולל מעוקל)**
-    # מפריד את 's או s' (כמו uk's, uk’s) מהמילה, והופך אותם ל-tokens נפרדים.
-    # המטרה היא להשאיר את 'uk' לבד כדי שיסונן על ידי ALL_WORDS_TO_REMOVE.
-    
-    # מפריד גרשים מעוקלים וישרים לפני s: 's
-    text = re.sub(r"([a-z]+)['’]s", r"\1 's", text) 
-    # מפריד גרשים ישרים ומעוקלים אחרונים
-    text = re.sub(r"([a-z]+)s['’]", r"\1s '", text)
-    
+
+    # 2. טיפול בגרש קניין (כולל מעוקל): uk's / uk’s -> uk 's
+    text = POSSESSIVE_S_RE.sub(r"\1 's", text)
+    text = POSSESSIVE_PLURAL_RE.sub(r"\1s '", text)
+
     # 3. הפרדת סימני פיסוק מהמילים
-    # מוסיף רווח לפני ואחרי כל סימן פיסוק (כולל נקודות, פסיקים וכו')
-    # נשתמש ב-string.punctuation כדי לתפוס את הגרש הישר והמעוקל (אם שרדו)
-    text = re.sub(r'([%s])' % re.escape(string.punctuation), r' \1 ', text)
-    
+    text = PUNCT_RE.sub(lambda m: " " + m.group(1) + " ", text)
+
     # 4. הסרת נקודות שעדיין חושפות קלאס (כמו m.p.s) - הופך אותן לרווחים
-    text = re.sub(r'\s*([a-z]\s*\.\s*){2,}', ' ', text)
-    
-    # 5. פיצול לטוקנים, סינון מילים (השארת פיסוק)
-    tokens = text.split()
-    
-    filtered_tokens = []
-    
-    for word in tokens:
-        # סינון: שמור רק מילים שאינן ברשימת ההסרה ושאינן קצרות מדי
-        if word in string.punctuation or word == "'s" or (word not in ALL_WORDS_TO_REMOVE and len(word) > 1):
-            filtered_tokens.append(word)
-
-    # 6. חיבור מחדש
-    cleaned_text = ' '.join(filtered_tokens)
-    
-    # 7. ניקוי רווחים מיותרים (הסרת רווח לפני סימני פיסוק ושורות ריקות מרובות)
-    cleaned_text = re.sub(r'\s([%s])' % re.escape(string.punctuation), r'\1', cleaned_text)
-    cleaned_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', cleaned_text)
-    
+    text = DOTTED_ABBREV_RE.sub(' ', text)
+
+    # 5. פיצול לטוקנים, סינון מילים (השארת פיסוק) + 6. חיבור מחדש
+    # after step 3 every ASCII punctuation mark is a token of its own, so the
+    # old `w in string.punctuation` (a substring test) is a set lookup on
+    # one-character tokens, and "'s" cannot survive the split
+    cleaned_text = ' '.join([
+        w for w in text.split()
+        if (w in PUNCTUATION if len(w) == 1 else w not in words_to_remove)
+    ])
+
+    # 7. הסרת רווח לפני סימני פיסוק
+    # (after the join there are no newlines left, so the old blank-line
+    #  collapse never matched and is not needed)
+    cleaned_text = SPACE_BEFORE_PUNCT_RE.sub(r'\1', cleaned_text)
+
     return cleaned_text.strip()
 
 
 # -------------------------------------------------------------
 # עיבוד הקבצים
 # -------------------------------------------------------------
-print(f"\n=== Starting Enhanced Cleanup from {INPUT_FOLDER.name} to {OUTPUT_FOLDER.name} ===")
-processed_count = 0
-
-for filename in os.listdir(INPUT_FOLDER):
-    if filename.endswith('.txt'):
-        input_path = INPUT_FOLDER / filename
-        output_path = OUTPUT_FOLDER / filename
-        
-        try:
-            with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                raw_text = f.read()
-            
-            cleaned_text = perform_enhanced_cleanup_preserve_punc(raw_text)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(cleaned_text)
-            
-            processed_count += 1
-            
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-            
-print(f"\n✅ Enhanced cleanup complete. {processed_count} files processed and saved to {OUTPUT_FOLDER.name}.")
\ No newline at end of file
+def clean_file(input_path, output_path):
+    """Cleans one file; the output appears only when it is complete (.tmp + rename)."""
+    with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
+        raw_text = f.read()
+
+    cleaned_text = perform_enhanced_cleanup_preserve_punc(raw_text)
+
+    tmp_path = Path(str(output_path) + ".tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(cleaned_text)
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return os.path.getsize(input_path)
+
+
+def run_cleaning(input_folder=INPUT_FOLDER, output_folder=OUTPUT_FOLDER, workers=None):
+    input_folder = Path(input_folder)
+    output_folder = Path(output_folder)
+    output_folder.mkdir(exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    print(f"\n=== Starting Enhanced Cleanup from {input_folder.name} to {output_folder.name} ===")
+    print(f"Loaded {len(get_words_to_remove())} total words for semantic removal.")
+
+    # קבצים שלא השתנו (וגם רשימת המילים / הקוד לא השתנו) מדולגים
+    words_hash = hashlib.sha256(" ".join(sorted(get_words_to_remove())).encode("utf-8")).hexdigest()
+    manifest = BuildManifest(output_folder, "cleaning", params={"words_to_remove": words_hash}, code_files=[__file__])
+    # real files or a merged view of them (merged_view.py)
+    input_paths = dict(list_input_files(input_folder, extensions=('.txt',)))
+    filenames = sorted(input_paths)
+
+    todo = [f for f in filenames if not manifest.is_fresh(f, [input_paths[f]], [output_folder / f])]
+    skipped_count = len(filenames) - len(todo)
+    processed_count = 0
+
+    def done(filename):
+        manifest.record(filename, [input_paths[filename]], [output_folder / filename])
+
+    if workers == 1 or len(todo) <= 1:
+        for filename in tqdm(todo, desc="Cleaning", unit="file"):
+            try:
+                clean_file(input_paths[filename], output_folder / filename)
+                done(filename)
+                processed_count += 1
+            except Exception as e:
+                print(f"Error processing {filename}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(clean_file, input_paths[f], output_folder / f): f
+                for f in todo
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Cleaning ({workers} workers)", unit="file"):
+                filename = futures[future]
+                try:
+                    future.result()
+                    done(filename)
+                    processed_count += 1
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
+
+    manifest.prune(filenames)
+    manifest.save()
+
+    print(f"\n✅ Enhanced cleanup complete. {processed_count} files processed ({skipped_count} unchanged) and saved to {output_folder.name}.")
+    return processed_count, skipped_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cleanup (stopwords + revealing words, punctuation kept)")
+    parser.add_argument("--input", default=str(INPUT_FOLDER))
+    parser.add_argument("--output", default=str(OUTPUT_FOLDER))
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    download_nltk_stopwords()
+    run_cleaning(args.input, args.output, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+merged_view.py
+==============
+
+The unified folder (allData) without duplicate copies of the UK / US files.
+
+Merge modes (stage1mergeText.py / stage1_build_dataset.py --mode):
+
+    copy      shutil.copy of every file, like before
+    link      hard link <prefix>_<file> -> source file (no extra bytes on
+              disk); falls back to a copy when the file system refuses the
+              link (other device, no hard link support)
+    manifest  nothing is copied: output_folder/_merged_view.json maps every
+              prefixed name to its source file
+
+With link (the default) the allData/* entries are hard links to the cleaned
+source files: editing one in place edits the source corpus too. Use copy
+when allData has to be edited independently.
+
+Readers list the folder through list_input_files(), which understands all
+three layouts, so downstream stages run unchanged on any of them:
+
+    for name, path in list_input_files("allData"):
+        ...
+"""
+
+import json
+import os
+import shutil
+
+
+VIEW_NAME = "_merged_view.json"
+MERGE_MODES = ("copy", "link", "manifest")
+
+
+def prefixed_name(filename, prefix):
+    """UK_x.txt stays UK_x.txt (never prefixed twice)."""
+    if filename.startswith(prefix + "_"):
+        return filename
+    return f"{prefix}_{filename}"
+
+
+def _copy(src_path, dst_path):
+    """shutil.copy that also replaces a hard link to the source (left by a link run)."""
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        os.remove(dst_path)
+    shutil.copy(src_path, dst_path)
+    return "copied"
+
+
+def _link_or_copy(src_path, dst_path):
+    """Returns "linked" / "unchanged" / "copied"."""
+    if os.path.exists(dst_path):
+        if os.path.samefile(src_path, dst_path):
+            return "unchanged"
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+        return "linked"
+    except OSError:
+        shutil.copy2(src_path, dst_path)
+        return "copied"
+
+
+def merge_sources(sources, output_folder, mode="link"):
+    """
+    sources: [(src_folder, prefix), ...]
+    Returns {prefixed_name: source_path} of every merged file.
+    """
+    if mode not in MERGE_MODES:
+        raise ValueError(f"Unknown merge mode: {mode} (expected one of {MERGE_MODES})")
+
+    os.makedirs(output_folder, exist_ok=True)
+    entries = {}
+    counts = {}
+
+    for src_folder, prefix in sources:
+        print(f"Scanning: {src_folder}")
+        for filename in sorted(os.listdir(src_folder)):
+            src_path = os.path.join(src_folder, filename)
+            if not os.path.isfile(src_path):
+                continue  # skip subfolders
+
+            new_name = prefixed_name(filename, prefix)
+            entries[new_name] = src_path
+
+            if mode == "manifest":
+                continue
+            dst_path = os.path.join(output_folder, new_name)
+            if mode == "copy":
+                action = _copy(src_path, dst_path)
+            else:
+                action = _link_or_copy(src_path, dst_path)
+            counts[action] = counts.get(action, 0) + 1
+
+    view_path = os.path.join(output_folder, VIEW_NAME)
+    if mode == "manifest":
+        # paths relative to the view, so the project folder can be moved
+        view = {name: os.path.relpath(path, output_folder) for name, path in entries.items()}
+        tmp_path = view_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(view, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, view_path)
+        counts["in view"] = len(entries)
+    elif os.path.exists(view_path):
+        # real files now; an old view would shadow them
+        os.remove(view_path)
+
+    print(f"✓ {len(entries)} files merged into {output_folder} ({mode}: "
+          + ", ".join(f"{n} {action}" for action, n in sorted(counts.items())) + ")")
+    return entries
+
+
+def list_input_files(folder, extensions=(".txt", ".md")):
+    """
+    Sorted [(name, path), ...] of the files in folder, including the entries
+    of a _merged_view.json (which win over real files of the same name).
+    """
+    files = {}
+    for name in os.listdir(folder):
+        if name == VIEW_NAME:
+            continue
+        path = os.path.join(folder, name)
+        if name.lower().endswith(extensions) and os.path.isfile(path):
+            files[name] = path
+
+    view_path = os.path.join(folder, VIEW_NAME)
+    if os.path.exists(view_path):
+        with open(view_path, "r", encoding="utf-8") as f:
+            view = json.load(f)
+        for name, rel_path in view.items():
+            if name.lower().endswith(extensions):
+                files[name] = os.path.normpath(os.path.join(folder, rel_path))
+
+    return sorted(files.items())
+
+
+def read_span(path, offset=0, length=None, encoding="utf-8", errors="ignore"):
+    """Text of length bytes at byte offset of path (the whole file by default)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read() if length is None else f.read(length)
+    return data.decode(encoding, errors=errors)
@@ -0,0 +1,196 @@
+"""
+metadata_store.py
+=================
+
+Columnar metadata tables (chunks_metadata, documents_metadata) in Arrow IPC
+(Feather v2) files, with the old CSV as fallback when pyarrow is missing.
+
+Layout of a table <name> in a folder:
+
+    <name>.arrow        the metadata columns; pandas categoricals (country,
+                        orig_file, ...) are stored dictionary-encoded. The
+                        file is uncompressed, so it is memory-mapped and only
+                        the requested columns are touched.
+    <name>_text.arrow   one large_string column "text" in the same row order,
+                        written in record batches (never a full text column
+                        in memory). Only written when there are texts.
+
+    <name>.csv          fallback (metadata_format="csv" or no pyarrow): one
+                        CSV with the text as its first column, like before.
+
+    write_table(folder, "chunks_metadata", df_chunks, texts=stream)
+    ids = read_table(folder, "chunks_metadata", columns=["chunk_id", "country"])
+    texts = read_texts(folder, "chunks_metadata", rows=[3, 17])
+"""
+
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+
+METADATA_FORMATS = ("auto", "arrow", "csv")
+TEXT_SUFFIX = "_text"
+
+
+def have_arrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_format(metadata_format="auto"):
+    """"auto" -> "arrow" if pyarrow is installed, else "csv"."""
+    if metadata_format not in METADATA_FORMATS:
+        raise ValueError(f"Unknown metadata format: {metadata_format} (expected one of {METADATA_FORMATS})")
+    if metadata_format == "auto":
+        return "arrow" if have_arrow() else "csv"
+    if metadata_format == "arrow" and not have_arrow():
+        raise ImportError("metadata_format='arrow' needs pyarrow (pip install pyarrow)")
+    return metadata_format
+
+
+def table_files(folder, name, metadata_format="auto", with_texts=True):
+    """Paths that write_table writes for this format."""
+    folder = Path(folder)
+    if resolve_format(metadata_format) == "csv":
+        return [folder / f"{name}.csv"]
+    files = [folder / f"{name}.arrow"]
+    if with_texts:
+        files.append(folder / f"{name}{TEXT_SUFFIX}.arrow")
+    return files
+
+
+def table_exists(folder, name) -> bool:
+    folder = Path(folder)
+    return (folder / f"{name}.arrow").exists() or (folder / f"{name}.csv").exists()
+
+
+# ----------------------------------------------------
+# Writers
+# ----------------------------------------------------
+def write_csv_with_texts(path, df: pd.DataFrame, texts, batch_size: int = 10000):
+    """CSV with the text as first column, without a full text column in memory."""
+    texts = iter(texts)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, max(len(df), 1), batch_size):
+            part = df.iloc[start:start + batch_size].copy()
+            part.insert(0, "text", list(islice(texts, len(part))))
+            part.to_csv(f, header=start == 0, index=False)
+
+
+def _write_arrow_texts(path, texts, n_rows, batch_size):
+    import pyarrow as pa
+
+    schema = pa.schema([("text", pa.large_string())])
+    written = 0
+    texts = iter(texts)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                break
+            writer.write_batch(pa.record_batch([pa.array(batch, type=pa.large_string())], schema=schema))
+            written += len(batch)
+
+    if written != n_rows:
+        raise ValueError(f"{path.name}: {written} texts for {n_rows} metadata rows")
+
+
+def write_table(folder, name, df: pd.DataFrame, texts=None, batch_size: int = 10000,
+                metadata_format="auto", categorical=()):
+    """
+    df: metadata, optionally with a "text" column
+    texts: iterable with the texts in row order when df has no "text" column
+    categorical: extra columns to store dictionary-encoded (pandas
+                 categoricals always are)
+    Returns the written paths. Files of the other format are removed, so a
+    reader never picks up a stale table.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    metadata_format = resolve_format(metadata_format)
+
+    if "text" in df.columns:
+        texts = df["text"]
+        df = df.drop(columns="text")
+
+    if metadata_format == "csv":
+        path = folder / f"{name}.csv"
+        if texts is None:
+            df.to_csv(path, index=False)
+        else:
+            write_csv_with_texts(path, df, texts, batch_size)
+        written = [path]
+    else:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        df = df.copy()
+        for col in categorical:
+            df[col] = df[col].astype("category")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        path = folder / f"{name}.arrow"
+        feather.write_feather(table, path, compression="uncompressed")
+        written = [path]
+
+        if texts is not None:
+            text_path = folder / f"{name}{TEXT_SUFFIX}.arrow"
+            _write_arrow_texts(text_path, texts, len(df), batch_size)
+            written.append(text_path)
+
+    for stale in (folder / f"{name}.csv", folder / f"{name}.arrow", folder / f"{name}{TEXT_SUFFIX}.arrow"):
+        if stale not in written and stale.exists():
+            stale.unlink()
+
+    return written
+
+
+# ----------------------------------------------------
+# Readers
+# ----------------------------------------------------
+def open_table(folder, name, columns=None):
+    """
+    The metadata as a memory-mapped pyarrow.Table (zero-copy, only the given
+    columns). Arrow layout only.
+    """
+    import pyarrow.feather as feather
+
+    return feather.read_table(Path(folder) / f"{name}.arrow", columns=columns, memory_map=True)
+
+
+def read_table(folder, name, columns=None) -> pd.DataFrame:
+    """Metadata columns (never the text) as a DataFrame; categoricals come back as categoricals."""
+    folder = Path(folder)
+    if (folder / f"{name}.arrow").exists():
+        return open_table(folder, name, columns).to_pandas()
+
+    path = folder / f"{name}.csv"
+    if not path.exists():
+        raise FileNotFoundError(f"No metadata table {name} in {folder}")
+    wanted = (lambda c: c != "text") if columns is None else (lambda c: c in columns)
+    return pd.read_csv(path, usecols=wanted)
+
+
+def read_texts(folder, name, rows=None) -> list:
+    """Texts of the given rows (all rows by default), in that order."""
+    folder = Path(folder)
+    text_path = folder / f"{name}{TEXT_SUFFIX}.arrow"
+    if text_path.exists():
+        import pyarrow.feather as feather
+
+        column = feather.read_table(text_path, memory_map=True).column("text")
+        if rows is not None:
+            column = column.take(list(rows))
+        return column.to_pylist()
+
+    path = folder / f"{name}.csv"
+    if not path.exists():
+        raise FileNotFoundError(f"No texts for metadata table {name} in {folder}")
+    texts = pd.read_csv(path, usecols=["text"], keep_default_na=False)["text"]
+    if rows is not None:
+        texts = texts.iloc[list(rows)]
+    return texts.tolist()
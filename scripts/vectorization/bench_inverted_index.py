@@ -0,0 +1,108 @@
+"""
+bench_inverted_index.py
+=======================
+
+משווה WAND / block-max MaxScore מול ניקוד מלא (exhaustive):
+latency לשאילתה ומספר המסמכים שנוקדו בפועל.
+
+Queries are sampled from the chunk texts themselves (a few random in-vocabulary
+terms from a random chunk), so every query has real matches.
+
+Usage (from the project root):
+    python scripts/vectorization/bench_inverted_index.py bm25_chunks_outputs/fixed --queries 200 -k 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bm25_search import BM25Searcher
+from bm25_inverted_index import InvertedIndex, build_and_save_inverted_index
+
+
+METHODS = ("exhaustive", "wand", "maxscore")
+
+
+def sample_queries(searcher: BM25Searcher, n_queries: int, min_terms=2, max_terms=5, seed=0):
+    """Random (term_ids, q_tf) queries built from the terms of random chunks."""
+    rng = np.random.default_rng(seed)
+    X = searcher.X_csr
+    queries = []
+    while len(queries) < n_queries:
+        row = rng.integers(X.shape[0])
+        terms = X.indices[X.indptr[row]:X.indptr[row + 1]]
+        if len(terms) < min_terms:
+            continue
+        n = rng.integers(min_terms, max_terms + 1)
+        picked = np.unique(rng.choice(terms, size=min(n, len(terms)), replace=False))
+        queries.append((picked, np.ones(len(picked))))
+    return queries
+
+
+def run_benchmark(index_folder, n_queries=200, k=10, block_size=64, seed=0):
+    searcher = BM25Searcher(index_folder, load_metadata=False)
+
+    try:
+        index = InvertedIndex.load(index_folder)
+        if index.block_size != block_size:
+            raise FileNotFoundError
+    except FileNotFoundError:
+        index = build_and_save_inverted_index(index_folder, block_size=block_size)
+        index = InvertedIndex.load(index_folder)
+
+    queries = sample_queries(searcher, n_queries, seed=seed)
+
+    rows = []
+    reference = {}
+    for method in METHODS:
+        latencies, scored, mismatches = [], [], 0
+        for qi, (term_ids, q_tf) in enumerate(queries):
+            t0 = time.perf_counter()
+            results, n_scored = index.search(term_ids, q_tf, k=k, method=method)
+            latencies.append(time.perf_counter() - t0)
+            scored.append(n_scored)
+
+            # pruning must not change the top-k scores
+            top_scores = np.array([s for _, s in results])
+            if method == "exhaustive":
+                reference[qi] = top_scores
+            elif not np.allclose(top_scores, reference[qi], rtol=1e-5, atol=1e-6):
+                mismatches += 1
+
+        lat_ms = np.array(latencies) * 1000
+        rows.append({
+            "method": method,
+            "queries": len(queries),
+            "k": k,
+            "mean_ms": lat_ms.mean(),
+            "p50_ms": np.percentile(lat_ms, 50),
+            "p95_ms": np.percentile(lat_ms, 95),
+            "mean_docs_scored": np.mean(scored),
+            "topk_mismatches": mismatches,
+        })
+
+    df = pd.DataFrame(rows)
+    base = df.loc[df["method"] == "exhaustive"].iloc[0]
+    df["docs_scored_ratio"] = df["mean_docs_scored"] / base["mean_docs_scored"]
+    df["speedup"] = base["mean_ms"] / df["mean_ms"]
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAND / MaxScore vs exhaustive BM25 scoring")
+    parser.add_argument("index_folder", nargs="?", default="bm25_chunks_outputs/fixed")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--block-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = run_benchmark(args.index_folder, args.queries, args.k, args.block_size, args.seed)
+    print(f"\n📊 Inverted index benchmark – {args.index_folder}")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+bench_retrieval.py
+==================
+
+השוואת איכות ומהירות בין האינדקסים ב-bm25_chunks_outputs/ (fixed מול
+hierarchical, ועוד כל וריאנט אחר):
+
+    latency     p50 / p95 / p99 / mean per query (one client)
+    throughput  QPS with N concurrent clients (threads sharing one searcher)
+    size        bytes on disk of the index folder (+ the mmap/ layout)
+    build       wall time of the last build (bm25_build_times.json)
+    quality     recall@k / MRR@k / nDCG@k, only when qrels are given
+
+Queries: --queries FILE (one query per line, or "qid<TAB>query"); without it,
+queries are sampled from the chunk texts of the first index (a few random
+in-vocabulary terms of a random chunk).
+
+Qrels (TREC format "qid 0 doc_id relevance"): with --qrels-level file (the
+default) doc_id is the original file (orig_file), so the same qrels grade
+both chunkings – a ranked chunk list becomes a ranked file list (first
+occurrence of each file). With --qrels-level chunk, doc_id is the chunk_id.
+
+--json writes every number; --baseline compares with an older --json run
+and exits with status 1 when a latency percentile grew by more than
+--tolerance or a quality metric dropped, so a bm25_core change can be
+checked in one command.
+
+Usage (from the project root):
+    python scripts/vectorization/bench_retrieval.py --root bm25_chunks_outputs --clients 1 4 --json bench.json
+    python scripts/vectorization/bench_retrieval.py --queries q.tsv --qrels qrels.txt --baseline bench.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from bm25_search import BM25Searcher
+from build_bm25_for_chunks import BUILD_TIMES_NAME
+
+
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+QUALITY_METRICS = ("recall", "mrr", "ndcg")
+
+
+# ----------------------------------------------------
+# Inputs
+# ----------------------------------------------------
+def find_indexes(root):
+    """Sub-folders of root that hold a BM25 index (npz or mmap layout)."""
+    root = Path(root)
+    return sorted(
+        p for p in root.iterdir()
+        if p.is_dir() and ((p / "X_bm25_chunks.npz").exists() or (p / "mmap").exists())
+    )
+
+
+def load_queries(path):
+    """[(qid, query), ...] from "query" or "qid<TAB>query" lines."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            qid, sep, text = line.partition("\t")
+            queries.append((qid, text) if sep else (str(i), line))
+    return queries
+
+
+def sample_queries(searcher: BM25Searcher, n_queries: int, min_terms=2, max_terms=4, seed=0):
+    """Text queries made of random in-vocabulary terms of random chunks."""
+    rng = np.random.default_rng(seed)
+    X = searcher.X_csr
+    queries = []
+    while len(queries) < n_queries:
+        row = rng.integers(X.shape[0])
+        terms = X.indices[X.indptr[row]:X.indptr[row + 1]]
+        if len(terms) < min_terms:
+            continue
+        n = rng.integers(min_terms, max_terms + 1)
+        picked = rng.choice(terms, size=min(n, len(terms)), replace=False)
+        queries.append((f"s{len(queries)}", " ".join(searcher.feature_names[t] for t in picked)))
+    return queries
+
+
+def load_qrels(path):
+    """{qid: {doc_id: relevance}} from TREC qrels lines."""
+    qrels = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            qid, _, doc_id, rel = parts[:4]
+            qrels.setdefault(qid, {})[doc_id] = float(rel)
+    return qrels
+
+
+# ----------------------------------------------------
+# Metrics
+# ----------------------------------------------------
+def quality_metrics(ranked, relevant, k):
+    """recall@k, reciprocal rank@k and nDCG@k of one ranked id list."""
+    ranked = ranked[:k]
+    hits = [relevant.get(doc_id, 0.0) for doc_id in ranked]
+    n_relevant = sum(1 for rel in relevant.values() if rel > 0)
+
+    recall = sum(1 for rel in hits if rel > 0) / n_relevant if n_relevant else 0.0
+    rr = next((1.0 / rank for rank, rel in enumerate(hits, start=1) if rel > 0), 0.0)
+
+    dcg = sum((2 ** rel - 1) / math.log2(rank + 1) for rank, rel in enumerate(hits, start=1))
+    ideal = sorted((rel for rel in relevant.values() if rel > 0), reverse=True)[:k]
+    idcg = sum((2 ** rel - 1) / math.log2(rank + 1) for rank, rel in enumerate(ideal, start=1))
+    return recall, rr, dcg / idcg if idcg else 0.0
+
+
+def ranked_ids(results, searcher, level):
+    """Chunk results -> ranked chunk ids or ranked original files (deduplicated)."""
+    if level == "chunk":
+        return [str(chunk_id) for chunk_id, _ in results]
+
+    files = searcher.orig_file_by_chunk
+    seen = []
+    for chunk_id, _ in results:
+        orig_file = files.get(chunk_id)
+        if orig_file is not None and orig_file not in seen:
+            seen.append(orig_file)
+    return seen
+
+
+def folder_size(folder):
+    return sum(p.stat().st_size for p in Path(folder).rglob("*") if p.is_file())
+
+
+# ----------------------------------------------------
+# Benchmark
+# ----------------------------------------------------
+def measure_qps(searcher, queries, k, clients, rounds=1):
+    """Queries per second with `clients` threads issuing queries back to back."""
+    texts = [q for _, q in queries] * rounds
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in pool.map(lambda q: searcher.search(q, k=k), texts):
+            pass
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def bench_index(index_folder, queries, k=10, clients=(1, 4), qrels=None, qrels_level="file", warmup=5):
+    index_folder = Path(index_folder)
+
+    t0 = time.perf_counter()
+    searcher = BM25Searcher(index_folder)
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    if qrels and qrels_level == "file":
+        meta = searcher.metadata
+        if meta is None or "orig_file" not in meta.columns:
+            raise ValueError(f"{index_folder}: file-level qrels need chunks_metadata with orig_file")
+        searcher.orig_file_by_chunk = dict(zip(meta["chunk_id"].to_numpy(), meta["orig_file"].astype(str)))
+
+    for _, query in queries[:warmup]:
+        searcher.search(query, k=k)
+
+    latencies = []
+    quality = []
+    for qid, query in queries:
+        t = time.perf_counter()
+        results = searcher.search(query, k=k)
+        latencies.append(time.perf_counter() - t)
+
+        if qrels and qid in qrels:
+            quality.append(quality_metrics(ranked_ids(results, searcher, qrels_level), qrels[qid], k))
+
+    lat_ms = np.array(latencies) * 1000
+    build = {}
+    build_path = index_folder / BUILD_TIMES_NAME
+    if build_path.exists():
+        with open(build_path, "r", encoding="utf-8") as f:
+            build = json.load(f)
+
+    row = {
+        "index": index_folder.name,
+        "chunks": searcher.n_docs,
+        "terms": searcher.n_terms,
+        "queries": len(queries),
+        "k": k,
+        "mean_ms": float(lat_ms.mean()),
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p95_ms": float(np.percentile(lat_ms, 95)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "load_ms": load_ms,
+        "mapped": bool(getattr(searcher, "mapped", False)),
+        "size_mb": folder_size(index_folder) / 1e6,
+        "build_s": float(sum(v for key, v in build.items() if key != "fit_jobs")) if build else None,
+    }
+    for n_clients in clients:
+        row[f"qps_{n_clients}c"] = measure_qps(searcher, queries, k, n_clients)
+
+    if quality:
+        recall, mrr, ndcg = np.mean(quality, axis=0)
+        row.update({"judged_queries": len(quality), "recall": recall, "mrr": mrr, "ndcg": ndcg})
+
+    return row
+
+
+def run_benchmark(index_folders, queries=None, n_queries=200, k=10, clients=(1, 4), qrels=None,
+                  qrels_level="file", seed=0):
+    index_folders = [Path(p) for p in index_folders]
+    if not index_folders:
+        raise ValueError("No BM25 indexes to benchmark")
+
+    if queries is None:
+        queries = sample_queries(BM25Searcher(index_folders[0], load_metadata=False), n_queries, seed=seed)
+
+    rows = [bench_index(folder, queries, k, clients, qrels, qrels_level) for folder in index_folders]
+    return pd.DataFrame(rows)
+
+
+def compare_with_baseline(df, baseline_path, tolerance=0.10):
+    """Regressions vs an older --json run: slower p50/p95/p99, or lower quality."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["index"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for row in df.to_dict("records"):
+        old = baseline.get(row["index"])
+        if old is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if old.get(metric) and row[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{row['index']}: {metric} {old[metric]:.3f} -> {row[metric]:.3f}")
+        for metric in QUALITY_METRICS:
+            if old.get(metric) is not None and row.get(metric) is not None and row[metric] < old[metric] - 1e-9:
+                regressions.append(f"{row['index']}: {metric} {old[metric]:.4f} -> {row[metric]:.4f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality + latency benchmark over the BM25 indexes")
+    parser.add_argument("indexes", nargs="*", help="index folders (default: every index under --root)")
+    parser.add_argument("--root", default="bm25_chunks_outputs")
+    parser.add_argument("--queries", help="query file (one per line or qid<TAB>query)")
+    parser.add_argument("--n-queries", type=int, default=200, help="sampled queries when --queries is not given")
+    parser.add_argument("--qrels", help="TREC qrels: qid 0 doc_id relevance")
+    parser.add_argument("--qrels-level", choices=["file", "chunk"], default="file")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4], help="concurrent clients for QPS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write machine-readable results here")
+    parser.add_argument("--baseline", help="older --json output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative latency increase")
+    args = parser.parse_args()
+
+    index_folders = args.indexes or find_indexes(args.root)
+    queries = load_queries(args.queries) if args.queries else None
+    qrels = load_qrels(args.qrels) if args.qrels else None
+
+    df = run_benchmark(index_folders, queries, args.n_queries, args.k, args.clients, qrels, args.qrels_level, args.seed)
+
+    print(f"\n📊 Retrieval benchmark (k={args.k}, {int(df['queries'].iloc[0])} queries)")
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+    if args.json:
+        report = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "scipy": scipy.__version__,
+                "platform": platform.platform(),
+            },
+            "args": {key: value for key, value in vars(args).items() if key != "indexes"},
+            "results": json.loads(df.to_json(orient="records")),
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results: {args.json}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(df, args.baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Regressions vs baseline:")
+            for line in regressions:
+                print(f"   • {line}")
+            sys.exit(1)
+        print("\n✅ No regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
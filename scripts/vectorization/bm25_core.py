@@ -7,6 +7,12 @@ bm25_core.py
 """
 
 import os
+import sys
+import json
+import numbers
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 import numpy as np
 import pandas as pd
@@ -15,13 +21,21 @@ import warnings
 
 warnings.filterwarnings("ignore")
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from scipy.sparse import save_npz
+from sklearn.feature_extraction.text import CountVectorizer
+from scipy.sparse import save_npz, csr_matrix, issparse, vstack
 
 # NLTK stopwords
 import nltk
 from nltk.corpus import stopwords
 
+# packed chunk store lives next to the chunkers
+sys.path.append(str(Path(__file__).resolve().parent.parent / "chunking"))
+from chunk_store import BLOB_NAME, INDEX_NAME, FILES_NAME, ChunkStore, infer_country, store_exists
+
+# columnar chunks_metadata (scripts/metadata_store.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from metadata_store import write_table
+
 
 # ----------------------------------------------------
 # BM25 Transformer
@@ -35,33 +49,286 @@ class BM25Transformer:
         self.k1 = k1
         self.b = b
 
-    def fit_transform(self, tf_matrix, doc_lengths, avg_doc_length, idf_vector):
+    def fit_transform(self, tf_matrix, doc_lengths, avg_doc_length, idf_vector, copy=True):
         """
-        tf_matrix: sparse matrix (n_docs x n_terms) from TfidfVectorizer
+        tf_matrix: sparse matrix (n_docs x n_terms) of raw term counts, as
+                   produced by the CountVectorizer inside BM25Vectorizer
         doc_lengths: array of length n_docs – document lengths
         avg_doc_length: average document length
-        idf_vector: vectorizer.idf_
+        idf_vector: BM25 IDF per term (BM25Vectorizer.idf_, see bm25_idf)
+        copy: if False, tf_matrix.data is overwritten in place (tf_matrix must be CSR)
+
+        Fully vectorized: the per-row length norm is expanded to one value per
+        stored element with np.repeat over the indptr diffs, so the saturation
+        and the IDF are applied in a single pass over .data.
         """
-        bm25_matrix = tf_matrix.copy()
+        if copy or not (issparse(tf_matrix) and tf_matrix.format == "csr"):
+            bm25_matrix = csr_matrix(tf_matrix, copy=True)
+        else:
+            bm25_matrix = tf_matrix
+
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        length_norm = 1 - self.b + self.b * (doc_lengths / avg_doc_length)
+
+        # one length norm per non-zero element (row i repeated nnz(i) times)
+        row_nnz = np.diff(bm25_matrix.indptr)
+        element_norm = np.repeat(length_norm, row_nnz)
+
+        # BM25 core formula + IDF, all rows at once
+        data = bm25_matrix.data
+        saturated = data * (self.k1 + 1) / (data + self.k1 * element_norm)
+        data[:] = saturated * np.asarray(idf_vector)[bm25_matrix.indices]
+
+        return bm25_matrix
 
-        for i in range(bm25_matrix.shape[0]):
-            doc_len = doc_lengths[i]
-            length_norm = 1 - self.b + self.b * (doc_len / avg_doc_length)
 
-            row = bm25_matrix.getrow(i)
-            row_data = row.data  # term frequencies (after tf-idf)
+# ----------------------------------------------------
+# BM25 Vectorizer (raw TF -> token-length norm -> BM25 IDF)
+# ----------------------------------------------------
+BM25_IDF_VARIANTS = ("okapi", "lucene")
 
-            # BM25 core formula (per term in this row)
-            row_data = row_data * (self.k1 + 1) / (row_data + self.k1 * length_norm)
 
-            col_indices = row.indices
-            row_data = row_data * idf_vector[col_indices]
+def bm25_idf(df, n_docs, variant="okapi"):
+    """
+    BM25 IDF from document frequencies.
+
+    okapi  : log((N - df + 0.5) / (df + 0.5)), clipped at 0 so very common
+             terms never get a negative weight
+    lucene : log(1 + (N - df + 0.5) / (df + 0.5)), always positive
+    """
+    df = np.asarray(df, dtype=np.float64)
+    ratio = (n_docs - df + 0.5) / (df + 0.5)
 
-            # write back transformed row data
-            bm25_matrix.data[bm25_matrix.indptr[i]:bm25_matrix.indptr[i + 1]] = row_data
+    if variant == "okapi":
+        return np.maximum(np.log(ratio), 0.0)
+    if variant == "lucene":
+        return np.log1p(ratio)
+    raise ValueError(f"Unknown idf_variant '{variant}', expected one of {BM25_IDF_VARIANTS}")
 
+
+# ----------------------------------------------------
+# Sharded counting (BM25Vectorizer.fit_transform(n_jobs > 1))
+# ----------------------------------------------------
+def _count_shard(texts, cv_params):
+    """Worker: raw counts of one shard over its own (alphabetical) vocabulary."""
+    cv = CountVectorizer(**cv_params)
+    try:
+        counts = cv.fit_transform(texts).tocsr()
+    except ValueError:  # only stop words / no tokens at all
+        return np.array([], dtype=object), csr_matrix((len(texts), 0), dtype=np.int64)
+    counts.sort_indices()
+    return cv.get_feature_names_out(), counts
+
+
+def count_sharded(documents, cv_params, n_jobs, shard_size=5000):
+    """
+    CountVectorizer(**cv_params).fit_transform(documents) computed in a
+    process pool: shards of shard_size texts are counted by the workers
+    (at most 2 * n_jobs shards in flight, so the input is still streamed),
+    then the shard vocabularies are merged into the sorted union and every
+    shard's columns are remapped onto it. The remap is monotonic, so the
+    indices stay sorted and the stacked matrix equals the single-process one.
+
+    Returns (counts CSR int64, terms) like fit_transform + get_feature_names_out.
+    """
+    shard_terms = []
+    shard_counts = []
+
+    def collect(future):
+        terms, counts = future.result()
+        shard_terms.append(terms)
+        shard_counts.append(counts)
+
+    it = iter(documents)
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        in_flight = deque()
+        while True:
+            shard = list(islice(it, shard_size))
+            if not shard:
+                break
+            in_flight.append(pool.submit(_count_shard, shard, cv_params))
+            if len(in_flight) >= 2 * n_jobs:
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+
+    terms = np.array(sorted(set().union(*shard_terms)), dtype=object)
+    if not len(terms):
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+    pieces = []
+    for local_terms, counts in zip(shard_terms, shard_counts):
+        cols = np.searchsorted(terms, local_terms).astype(counts.indices.dtype)
+        pieces.append(csr_matrix((counts.data, cols[counts.indices], counts.indptr), shape=(counts.shape[0], len(terms))))
+
+    counts = vstack(pieces, format="csr") if pieces else csr_matrix((0, len(terms)), dtype=np.int64)
+    counts.has_sorted_indices = True
+    return counts, terms
+
+
+class BM25Vectorizer:
+    """
+    Real BM25 over raw term counts.
+
+    CountVectorizer gives the raw TF, document length is the number of
+    (non stop-word) tokens in the chunk, and the IDF is the BM25 IDF
+    (okapi / lucene). The weighting is done in one pass over the CSR data.
+    """
+
+    def __init__(
+        self,
+        k1=1.5,
+        b=0.75,
+        idf_variant="okapi",
+        min_df=1,
+        max_df=1.0,
+        max_features=None,
+        stop_words=None,
+        lowercase=True,
+        token_pattern=r"(?u)\b\w+\b",
+        dtype=np.float64,
+    ):
+        if idf_variant not in BM25_IDF_VARIANTS:
+            raise ValueError(f"Unknown idf_variant '{idf_variant}', expected one of {BM25_IDF_VARIANTS}")
+
+        self.k1 = k1
+        self.b = b
+        self.idf_variant = idf_variant
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.stop_words = stop_words
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.dtype = dtype
+
+    def _count_vectorizer(self, vocabulary=None):
+        return CountVectorizer(
+            stop_words=list(self.stop_words) if self.stop_words else None,
+            lowercase=self.lowercase,
+            token_pattern=self.token_pattern,
+            ngram_range=(1, 1),
+            vocabulary=vocabulary,
+            dtype=np.int64,
+        )
+
+    def _limit_features(self, counts, df):
+        """Same min_df / max_df / max_features rules as sklearn's vectorizers."""
+        n_docs = counts.shape[0]
+        max_doc_count = self.max_df if isinstance(self.max_df, numbers.Integral) else self.max_df * n_docs
+        min_doc_count = self.min_df if isinstance(self.min_df, numbers.Integral) else self.min_df * n_docs
+
+        mask = (df >= min_doc_count) & (df <= max_doc_count)
+        if self.max_features is not None and mask.sum() > self.max_features:
+            term_totals = np.asarray(counts.sum(axis=0)).ravel()
+            kept = np.where(mask)[0]
+            top = kept[np.argsort(-term_totals[kept], kind="stable")[: self.max_features]]
+            mask = np.zeros_like(mask)
+            mask[top] = True
+
+        return np.where(mask)[0]
+
+    def fit_transform(self, documents, n_jobs=1, shard_size=5000, keep_counts=False):
+        """
+        documents: iterable of chunk texts (consumed once)
+        n_jobs: > 1 tokenizes + counts shards of shard_size chunks in worker
+                processes (see count_sharded); the result is identical
+        keep_counts: keep the raw counts over the fitted terms as .counts_
+                     (e.g. for the section sums of section_search.py)
+        Returns CSR BM25 matrix (n_docs x n_terms) with dtype self.dtype
+        """
+        if n_jobs > 1:
+            counts, terms = count_sharded(documents, self._count_vectorizer().get_params(), n_jobs, shard_size)
+        else:
+            cv = self._count_vectorizer()
+            counts = cv.fit_transform(documents).tocsr()
+            counts.sort_indices()
+            terms = cv.get_feature_names_out()
+
+        return self._fit_counts(counts, terms, keep_counts)
+
+    def _fit_counts(self, counts, terms, keep_counts=False):
+        """counts: raw CSR counts (sorted indices), columns = terms in alphabetical order."""
+        # document length = all kept tokens, measured before feature pruning
+        self.doc_lengths_ = np.asarray(counts.sum(axis=1)).ravel().astype(np.float64)
+        self.avg_doc_length_ = self.doc_lengths_.mean() if len(self.doc_lengths_) else 0.0
+
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        keep = self._limit_features(counts, df)
+
+        # vocabulary_ of CountVectorizer is alphabetically ordered -> keep order
+        terms = terms[keep]
+        self.vocabulary_ = {t: i for i, t in enumerate(terms)}
+        self.feature_names_ = terms
+        self.df_ = df[keep]
+        self.n_docs_ = counts.shape[0]
+        self.idf_ = bm25_idf(self.df_, self.n_docs_, self.idf_variant)
+
+        counts = counts[:, keep]
+        # own copy: _weight shares indices / indptr and eliminate_zeros compacts them
+        self.counts_ = counts.copy() if keep_counts else None
+        return self._weight(counts, self.doc_lengths_)
+
+    def transform(self, documents):
+        """Weights new documents with the fitted vocabulary, IDF and avg length."""
+        counts, doc_lengths = self.count(list(documents))
+        return self._weight(counts, doc_lengths)
+
+    def count(self, documents):
+        """
+        Raw counts of documents over the fitted terms + document lengths
+        (all kept tokens, like in fit_transform). documents is consumed once.
+        Returns (CSR int64 n_docs x n_terms, float64 lengths).
+        """
+        # count with an open vocabulary so the length includes every token,
+        # exactly like in fit_transform, then project onto the fitted terms
+        cv = self._count_vectorizer()
+        try:
+            counts = cv.fit_transform(documents).tocsr()
+        except ValueError:  # only stop words / no tokens at all
+            n_docs = len(documents) if hasattr(documents, "__len__") else 0
+            return csr_matrix((n_docs, len(self.vocabulary_)), dtype=np.int64), np.zeros(n_docs)
+
+        doc_lengths = np.asarray(counts.sum(axis=1)).ravel().astype(np.float64)
+
+        cols = np.array([self.vocabulary_.get(t, -1) for t in cv.get_feature_names_out()])
+        known = np.where(cols >= 0)[0]
+        projection = csr_matrix(
+            (np.ones(len(known), dtype=np.int64), (known, cols[known])),
+            shape=(counts.shape[1], len(self.vocabulary_)),
+        )
+        counts = (counts @ projection).tocsr()
+        counts.sort_indices()
+        return counts, doc_lengths
+
+    def _weight(self, counts, doc_lengths):
+        tf = csr_matrix(
+            (counts.data.astype(self.dtype), counts.indices, counts.indptr),
+            shape=counts.shape,
+        )
+        avg = self.avg_doc_length_ if self.avg_doc_length_ > 0 else 1.0
+        bm25_matrix = BM25Transformer(k1=self.k1, b=self.b).fit_transform(
+            tf, doc_lengths, avg, self.idf_, copy=False
+        )
+        # okapi IDF is clipped at 0 -> drop those entries from the sparse data
+        bm25_matrix.eliminate_zeros()
         return bm25_matrix
 
+    def get_feature_names_out(self):
+        return self.feature_names_
+
+    def get_params(self):
+        """Scoring + tokenization settings (saved next to the matrix for query time)."""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "idf_variant": self.idf_variant,
+            "lowercase": self.lowercase,
+            "token_pattern": self.token_pattern,
+            "avg_doc_length": float(self.avg_doc_length_),
+            "n_docs": int(self.n_docs_),
+        }
+
 
 # ----------------------------------------------------
 # NLTK stopwords helpers
@@ -89,9 +356,181 @@ def get_nltk_stopwords():
 # ----------------------------------------------------
 # Load CHUNK documents
 # ----------------------------------------------------
+def chunk_input_files(chunks_root_folder: str | Path) -> list[Path]:
+    """
+    The files load_chunk_documents reads for this folder: the three chunk
+    store files (+ the source files its span chunks point into), or every
+    chunk .txt of the folder layout (for build manifests).
+    """
+    root = Path(chunks_root_folder)
+    if store_exists(root):
+        with ChunkStore(root) as store:
+            sources = store.source_paths()
+        return [root / BLOB_NAME, root / INDEX_NAME, root / FILES_NAME, *sources]
+    return sorted(root.glob("*_chunks/*.txt"))
+
+
+class ChunkDocumentStream:
+    """
+    Re-iterable stream of chunk texts from a chunk folder – a packed chunk
+    store (read through mmap) or the <file>_chunks/*.txt layout – read
+    lazily, one chunk at a time.
+
+    The metadata of every yielded chunk is collected on the first pass into
+    compact columns (categoricals for country / orig_file / chunk_file,
+    int32 arrays), kept apart from the texts: see .metadata. A vectorizer can
+    consume the stream directly, so the corpus is never held as a list or a
+    DataFrame column.
+
+        stream = ChunkDocumentStream("chunks_output")
+        X = vectorizer.fit_transform(stream)
+        df_chunks = stream.metadata     # one row per yielded text
+    """
+
+    def __init__(self, chunks_root_folder: str | Path, progress: bool = True):
+        self.root = Path(chunks_root_folder)
+        if not self.root.exists():
+            raise FileNotFoundError(f"Chunks root folder not found: {self.root}")
+
+        self.is_store = store_exists(self.root)
+        self.progress = progress
+        self._metadata = None
+
+    def has_chunks(self) -> bool:
+        if self.is_store:
+            with ChunkStore(self.root) as store:
+                return len(store) > 0
+
+        if not any(d.is_dir() for d in self.root.iterdir()):
+            print("⚠️ No subdirectories found. Did you point to the correct chunks folder?")
+            print("   Expecting structure like: chunks_output/UK_XXXX.txt_chunks/")
+            return False
+        return True
+
+    @property
+    def metadata(self) -> pd.DataFrame:
+        """Metadata of the chunks yielded by the first complete pass."""
+        if self._metadata is None:
+            raise RuntimeError("Iterate over the stream once before reading its metadata")
+        return self._metadata
+
+    def __iter__(self):
+        collect = self._metadata is None
+        rows = []
+        yield from (self._iter_store(rows) if self.is_store else self._iter_folder(rows))
+        if not collect:
+            return
+
+        self._metadata = self._store_metadata(rows) if self.is_store else self._folder_metadata(rows)
+
+        if self.progress:
+            print(f"\n✅ Total chunks loaded: {len(self._metadata)}")
+            print("   • Country counts:")
+            print(self._metadata["country"].value_counts(dropna=False))
+
+    # ----------------------------------------------------
+    # Packed chunk store
+    # ----------------------------------------------------
+    def _iter_store(self, rows):
+        if self.progress:
+            print(f"\n📂 Loading CHUNK store (mmap) from: {self.root}")
+
+        with ChunkStore(self.root) as store:
+            self._files = store.files
+            self._index = store.index
+            it = range(len(store))
+            if self.progress:
+                it = tqdm(it, desc="Reading chunk store")
+
+            for i in it:
+                text = store.text(i)
+                if text.strip() == "":
+                    continue
+                rows.append(i)
+                yield text
+
+    def _store_metadata(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        index = self._index[rows]
+        file_ids = index["file_id"]
+        chunk_index = index["chunk_index"]
+
+        orig_files = [f["orig_file"] for f in self._files]
+        countries = pd.Categorical([f["country"] for f in self._files])
+        orig_file_col = pd.Categorical.from_codes(file_ids, categories=orig_files)
+
+        df = pd.DataFrame({
+            "country": pd.Categorical.from_codes(countries.codes[file_ids], categories=countries.categories),
+            "orig_file": orig_file_col,
+            "chunk_file": pd.Categorical([f"chunk_{i}" for i in chunk_index]),
+            "chunk_path": [f"{f}::chunk_{i}" for f, i in zip(orig_file_col, chunk_index)],
+            "chunk_index": chunk_index,
+            "sent_start": index["sent_start"],
+            "sent_end": index["sent_end"],
+        })
+        df["chunk_id"] = df.index  # unique id per chunk
+        return df
+
+    # ----------------------------------------------------
+    # <orig_file>_chunks/chunk_N.txt layout
+    # ----------------------------------------------------
+    def _iter_folder(self, rows):
+        if self.progress:
+            print(f"\n📂 Loading CHUNK documents from: {self.root}")
+
+        # Expect subfolders: <original_filename>_chunks
+        subdirs = [d for d in self.root.iterdir() if d.is_dir()]
+        if self.progress:
+            subdirs = tqdm(subdirs, desc="Traversing chunk folders")
+
+        for subdir in subdirs:
+            # Example: 'UK_1994-01-01.txt_chunks'
+            folder_name = subdir.name
+
+            # Try to deduce original filename (without '_chunks')
+            if folder_name.endswith("_chunks"):
+                orig_filename = folder_name[:-7]  # strip '_chunks'
+            else:
+                orig_filename = folder_name
+
+            # Iterate chunk files
+            for chunk_file in sorted(subdir.glob("*.txt")):
+                try:
+                    with open(chunk_file, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except Exception as e:
+                    print(f"⚠️ Error reading {chunk_file}: {e}")
+                    continue
+
+                if not text.strip():
+                    continue
+
+                rows.append((orig_filename, chunk_file.name, str(chunk_file.relative_to(self.root))))
+                yield text
+
+    def _folder_metadata(self, rows):
+        orig_files = [r[0] for r in rows]
+        df = pd.DataFrame({
+            "country": pd.Categorical([infer_country(f) for f in orig_files]),
+            "orig_file": pd.Categorical(orig_files),
+            "chunk_file": pd.Categorical([r[1] for r in rows]),
+            "chunk_path": [r[2] for r in rows],
+        })
+        df["chunk_id"] = df.index  # unique id per chunk
+        return df
+
+
 def load_chunk_documents(chunks_root_folder: str | Path) -> pd.DataFrame:
     """
-    Reads all chunk files from a folder like:
+    Reads all chunks of a folder into ONE DataFrame (text + metadata).
+    For building a matrix prefer ChunkDocumentStream, which never holds
+    all texts at once.
+
+    If the folder holds a packed chunk store (chunk_store.bin, written by the
+    chunkers by default) it is read through mmap – chunk_file / chunk_path
+    are then "<orig_file>::chunk_<n>", plus chunk_index, sent_start, sent_end.
+
+    Otherwise reads all chunk files from a folder like:
 
         chunks_root/
             UK_...txt_chunks/
@@ -108,72 +547,18 @@ def load_chunk_documents(chunks_root_folder: str | Path) -> pd.DataFrame:
         - chunk_path   : relative path to chunk file
         - chunk_id     : unique id (row index)
     """
-    root = Path(chunks_root_folder)
-    if not root.exists():
-        raise FileNotFoundError(f"Chunks root folder not found: {root}")
-
-    print(f"\n📂 Loading CHUNK documents from: {root}")
-
-    rows = []
-    # Expect subfolders: <original_filename>_chunks
-    subdirs = [d for d in root.iterdir() if d.is_dir()]
-
-    if not subdirs:
-        print("⚠️ No subdirectories found. Did you point to the correct chunks folder?")
-        print("   Expecting structure like: chunks_output/UK_XXXX.txt_chunks/")
+    stream = ChunkDocumentStream(chunks_root_folder)
+    if not stream.has_chunks():
         return pd.DataFrame()
 
-    for subdir in tqdm(subdirs, desc="Traversing chunk folders"):
-        # Example: 'UK_1994-01-01.txt_chunks'
-        folder_name = subdir.name
-
-        # Try to deduce original filename (without '_chunks')
-        if folder_name.endswith("_chunks"):
-            orig_filename = folder_name[:-7]  # strip '_chunks'
-        else:
-            orig_filename = folder_name
-
-        # Infer country from original filename prefix
-        if orig_filename.startswith("UK_"):
-            country = "UK"
-        elif orig_filename.startswith("US_"):
-            country = "US"
-        else:
-            country = "UNKNOWN"
-
-        # Iterate chunk files
-        for chunk_file in sorted(subdir.glob("*.txt")):
-            try:
-                with open(chunk_file, "r", encoding="utf-8") as f:
-                    text = f.read()
-            except Exception as e:
-                print(f"⚠️ Error reading {chunk_file}: {e}")
-                continue
-
-            if not text.strip():
-                continue
-
-            rows.append({
-                "text": text,
-                "country": country,
-                "orig_file": orig_filename,
-                "chunk_file": chunk_file.name,
-                "chunk_path": str(chunk_file.relative_to(root)),
-            })
-
-    df = pd.DataFrame(rows)
-    df = df.reset_index(drop=True)
-    df["chunk_id"] = df.index  # unique id per chunk
-
-    print(f"\n✅ Total chunks loaded: {len(df)}")
-    print("   • Country counts:")
-    print(df["country"].value_counts(dropna=False))
-
+    texts = list(stream)
+    df = stream.metadata.copy()
+    df.insert(0, "text", texts)
     return df
 
 
 # ----------------------------------------------------
-# Build TF-IDF + BM25 on all chunks
+# Build BM25 on all chunks
 # ----------------------------------------------------
 def build_bm25_matrix(
     documents,
@@ -182,71 +567,106 @@ def build_bm25_matrix(
     max_df=0.95,
     max_features=20000,
     matrix_name="BM25-CHUNKS",
+    k1=1.5,
+    b=0.75,
+    idf_variant="okapi",
+    dtype=np.float64,
+    n_jobs=1,
+    shard_size=5000,
+    keep_counts=False,
 ):
     """
     Build a BM25 matrix over all chunk texts.
 
-    documents: list of chunk texts
+    documents: iterable of chunk texts, consumed once (a list or a ChunkDocumentStream)
+    idf_variant: "okapi" / "lucene" (see bm25_idf)
+    dtype: np.float32 halves the memory of the matrix data
+    n_jobs: worker processes for tokenizing + counting (count_sharded);
+            the matrix is identical to n_jobs=1
+    keep_counts: the raw counts stay available as vectorizer.counts_
     """
     print(f"\n{'='*70}")
     print(f"🔨 Building {matrix_name}")
     print(f"{'='*70}")
 
-    vectorizer = TfidfVectorizer(
+    vectorizer = BM25Vectorizer(
+        k1=k1,
+        b=b,
+        idf_variant=idf_variant,
         min_df=min_df,
         max_df=max_df,
         max_features=max_features,
-        stop_words=list(stopwords_set),
+        stop_words=stopwords_set,
         lowercase=True,
         token_pattern=r"(?u)\b\w+\b",
-        ngram_range=(1, 1),
-        norm="l2",
-        use_idf=True,
-        smooth_idf=True,
+        dtype=dtype,
     )
 
-    print("\n🔄 Fitting TF-IDF vectorizer on ALL chunks...")
-    tfidf_matrix = vectorizer.fit_transform(tqdm(documents, desc="Vectorizing chunks"))
+    # raw TF -> token-length norm -> BM25 IDF, in one sparse pass
+    print("\n🔄 Counting terms + applying BM25 on ALL chunks..." + (f" ({n_jobs} processes)" if n_jobs > 1 else ""))
+    bm25_matrix = vectorizer.fit_transform(tqdm(documents, desc="Vectorizing chunks"), n_jobs, shard_size,
+                                           keep_counts)
     feature_names = vectorizer.get_feature_names_out()
-    print(f"\n✅ TF-IDF created: shape={tfidf_matrix.shape}")
 
-    # BM25
-    print("\n🔄 Applying BM25 transformation on chunks...")
-    doc_lengths = np.array(tfidf_matrix.sum(axis=1)).flatten()
-    avg_doc_length = doc_lengths.mean()
-    idf_vector = vectorizer.idf_
+    stats = bm25_matrix_stats(bm25_matrix, vectorizer, matrix_name)
+    return bm25_matrix, feature_names, vectorizer, stats
 
-    bm25_matrix = BM25Transformer().fit_transform(
-        tfidf_matrix, doc_lengths, avg_doc_length, idf_vector
-    )
 
+def bm25_matrix_stats(bm25_matrix, vectorizer: BM25Vectorizer, matrix_name="BM25-CHUNKS") -> dict:
+    """The bm25_stats.csv row of a fitted matrix (printed as well)."""
+    n_cells = bm25_matrix.shape[0] * bm25_matrix.shape[1]
     stats = {
         "matrix_name": matrix_name,
         "num_documents": bm25_matrix.shape[0],
         "num_features": bm25_matrix.shape[1],
-        "sparsity": (1 - bm25_matrix.nnz / (bm25_matrix.shape[0] * bm25_matrix.shape[1])) * 100,
+        "sparsity": (1 - bm25_matrix.nnz / n_cells) * 100 if n_cells else 100.0,
         "non_zero_elements": bm25_matrix.nnz,
+        "avg_doc_length": float(vectorizer.avg_doc_length_),
+        "idf_variant": vectorizer.idf_variant,
+        "dtype": np.dtype(vectorizer.dtype).name,
     }
 
     print("✅ BM25 matrix for chunks ready")
     print(f"   • Chunks:   {stats['num_documents']}")
     print(f"   • Features: {stats['num_features']}")
     print(f"   • Sparsity: {stats['sparsity']:.2f}%")
-
-    return bm25_matrix, feature_names, vectorizer, stats
+    print(f"   • Avg length (tokens): {stats['avg_doc_length']:.1f}")
+    return stats
 
 
 # ----------------------------------------------------
-# Helper: save BM25 outputs
+# Helper: save BM25 outputs (matrix, metadata, vocabulary, stats)
 # ----------------------------------------------------
-def save_bm25_outputs(output_folder: str | Path, X_bm25, feature_names, stats, df_chunks: pd.DataFrame):
+def save_bm25_outputs(
+    output_folder: str | Path,
+    X_bm25,
+    feature_names,
+    stats,
+    df_chunks: pd.DataFrame,
+    vectorizer: BM25Vectorizer | None = None,
+    texts=None,
+    batch_size: int = 10000,
+    metadata_format: str = "auto",
+    mmap_layout: bool = True,
+):
     """
     שומר:
       - X_bm25_chunks.npz
-      - chunks_metadata.csv
+      - mmap/              (if mmap_layout – uncompressed arrays for shared,
+                            memory-mapped loading, see bm25_mmap.py)
+      - chunks_metadata.arrow + chunks_metadata_text.arrow
+        (or chunks_metadata.csv – see metadata_store.py)
       - bm25_feature_names.txt
       - bm25_stats.csv
+      - bm25_params.json   (if vectorizer is given – used by BM25Searcher)
+
+    texts: if df_chunks has no "text" column, an iterable with the chunk texts
+           in row order (e.g. the ChunkDocumentStream again), written
+           batch_size rows at a time.
+    metadata_format: "auto" (Arrow if pyarrow is installed), "arrow" or "csv"
     """
+    from bm25_mmap import save_mmap_layout
+
     output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
 
@@ -254,9 +674,19 @@ def save_bm25_outputs(output_folder: str | Path, X_bm25, feature_names, stats, d
 
     # BM25 matrix
     save_npz(output_folder / "X_bm25_chunks.npz", X_bm25)
-
-    # metadata
-    df_chunks.to_csv(output_folder / "chunks_metadata.csv", index=False)
+    if mmap_layout:
+        save_mmap_layout(
+            output_folder,
+            X_bm25,
+            idf=vectorizer.idf_ if vectorizer is not None else None,
+            doc_lengths=vectorizer.doc_lengths_ if vectorizer is not None else None,
+        )
+
+    # metadata (country / orig_file / chunk_file dictionary-encoded) + texts
+    metadata_paths = write_table(
+        output_folder, "chunks_metadata", df_chunks, texts, batch_size, metadata_format,
+        categorical=[c for c in ("country", "orig_file") if c in df_chunks.columns],
+    )
 
     # vocabulary
     with open(output_folder / "bm25_feature_names.txt", "w", encoding="utf-8") as f:
@@ -265,8 +695,18 @@ def save_bm25_outputs(output_folder: str | Path, X_bm25, feature_names, stats, d
     # stats
     pd.DataFrame([stats]).to_csv(output_folder / "bm25_stats.csv", index=False)
 
+    # tokenization / scoring params
+    if vectorizer is not None:
+        with open(output_folder / "bm25_params.json", "w", encoding="utf-8") as f:
+            json.dump(vectorizer.get_params(), f, indent=2)
+
     print("✅ Saved:")
     print(f"   • X matrix: {output_folder / 'X_bm25_chunks.npz'}")
-    print(f"   • metadata: {output_folder / 'chunks_metadata.csv'}")
+    if mmap_layout:
+        print(f"   • mmap:     {output_folder / 'mmap'}")
+    for path in metadata_paths:
+        print(f"   • metadata: {path}")
     print(f"   • vocab:    {output_folder / 'bm25_feature_names.txt'}")
     print(f"   • stats:    {output_folder / 'bm25_stats.csv'}")
+    if vectorizer is not None:
+        print(f"   • params:   {output_folder / 'bm25_params.json'}")
@@ -0,0 +1,245 @@
+"""
+bm25_hashing.py
+===============
+
+בניית BM25 out-of-core עם feature hashing (HashingVectorizer):
+אין vocabulary בזיכרון ואין תקרת max_features.
+
+    pass 1  chunks are read in fixed-size batches (ChunkDocumentStream), hashed
+            into n_features buckets, and the raw term counts of every batch are
+            written as a CSR shard; document frequencies are accumulated in a
+            dense array and the document lengths in an int array
+    pass 2  BM25 IDF + average length from those totals, then every shard is
+            weighted on its own (BM25Transformer) and rewritten in place
+
+Only one batch / one shard is in memory at a time, plus the dense df array
+(n_features) and one length per chunk.
+
+Layout on disk (<output_folder>/hashed/):
+    shard_00000.npz ...  BM25 weights, rows = chunks in chunk_id order
+    df.npy               document frequency per hash bucket
+    idf.npy              BM25 IDF per hash bucket (0 for pruned buckets)
+    meta.json            params, n_docs, avg_doc_length, shard row offsets
+
+There are no feature names: a query is hashed with the same settings
+(HashedBM25Index.query_terms).
+"""
+
+import json
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix, load_npz, save_npz
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from bm25_core import BM25Transformer, bm25_idf
+from bm25_search import top_k_indices
+
+
+HASHED_SUBDIR = "hashed"
+SHARD_PATTERN = "shard_{:05d}.npz"
+
+
+def make_hashing_vectorizer(n_features, stop_words=None, lowercase=True, token_pattern=r"(?u)\b\w+\b"):
+    """Raw counts per hash bucket (no sign flipping, no normalization)."""
+    return HashingVectorizer(
+        n_features=n_features,
+        stop_words=sorted(stop_words) if stop_words else None,
+        lowercase=lowercase,
+        token_pattern=token_pattern,
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float64,
+    )
+
+
+def build_bm25_hashed(
+    documents,
+    output_folder: str | Path,
+    stopwords_set=None,
+    n_features=2 ** 20,
+    batch_size=20000,
+    min_df=1,
+    max_df=1.0,
+    k1=1.5,
+    b=0.75,
+    idf_variant="okapi",
+    dtype=np.float32,
+    matrix_name="BM25-CHUNKS-HASHED",
+):
+    """
+    documents: iterable of chunk texts, consumed once (e.g. a ChunkDocumentStream)
+    min_df / max_df: same meaning as in build_bm25_matrix, applied per hash bucket
+                     (a pruned bucket gets IDF 0); there is no max_features
+    Returns the stats dict; the matrix stays on disk as shards.
+    """
+    print(f"\n{'='*70}")
+    print(f"🔨 Building {matrix_name} (out-of-core, {n_features} hash buckets)")
+    print(f"{'='*70}")
+
+    folder = Path(output_folder) / HASHED_SUBDIR
+    folder.mkdir(parents=True, exist_ok=True)
+    for old in folder.glob("shard_*.npz"):
+        old.unlink()
+
+    hv = make_hashing_vectorizer(n_features, stopwords_set)
+    df = np.zeros(n_features, dtype=np.int64)
+    doc_lengths = []
+    shard_rows = []
+
+    # ---------------- pass 1: hash + raw counts per batch ----------------
+    t0 = time.perf_counter()
+    it = iter(documents)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            break
+
+        counts = hv.transform(batch).tocsr()
+        counts.sort_indices()
+        df += np.bincount(counts.indices, minlength=n_features)
+        doc_lengths.append(np.asarray(counts.sum(axis=1)).ravel().astype(np.int32))
+
+        save_npz(folder / SHARD_PATTERN.format(len(shard_rows)), counts, compressed=False)
+        shard_rows.append(counts.shape[0])
+        print(f"   • shard {len(shard_rows) - 1}: {counts.shape[0]} chunks, {counts.nnz} non-zeros")
+
+    t_count = time.perf_counter() - t0
+
+    doc_lengths = np.concatenate(doc_lengths) if doc_lengths else np.zeros(0, dtype=np.int32)
+    n_docs = len(doc_lengths)
+    avg_doc_length = float(doc_lengths.mean()) if n_docs else 0.0
+
+    # min_df / max_df on the hash buckets, like sklearn's vectorizers
+    max_doc_count = max_df if isinstance(max_df, (int, np.integer)) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, (int, np.integer)) else min_df * n_docs
+    kept = (df > 0) & (df >= min_doc_count) & (df <= max_doc_count)
+    idf = bm25_idf(df, n_docs, idf_variant) * kept
+
+    # ---------------- pass 2: BM25 weighting shard by shard ----------------
+    t0 = time.perf_counter()
+    transformer = BM25Transformer(k1=k1, b=b)
+    avg = avg_doc_length if avg_doc_length > 0 else 1.0
+    offsets = np.concatenate([[0], np.cumsum(shard_rows)]).astype(np.int64)
+    nnz = 0
+
+    for i in range(len(shard_rows)):
+        path = folder / SHARD_PATTERN.format(i)
+        counts = load_npz(path).tocsr()
+        tf = csr_matrix((counts.data.astype(dtype), counts.indices, counts.indptr), shape=counts.shape)
+        bm25 = transformer.fit_transform(tf, doc_lengths[offsets[i]:offsets[i + 1]], avg, idf, copy=False)
+        bm25.eliminate_zeros()
+        nnz += bm25.nnz
+
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        save_npz(tmp, bm25)
+        os.replace(tmp, path)
+
+    t_weight = time.perf_counter() - t0
+
+    np.save(folder / "df.npy", df)
+    np.save(folder / "idf.npy", idf)
+
+    meta = {
+        "n_features": n_features,
+        "n_docs": n_docs,
+        "avg_doc_length": avg_doc_length,
+        "shard_offsets": offsets.tolist(),
+        "k1": k1,
+        "b": b,
+        "idf_variant": idf_variant,
+        "min_df": min_df,
+        "max_df": max_df,
+        "stop_words": sorted(stopwords_set) if stopwords_set else None,
+        "lowercase": True,
+        "token_pattern": r"(?u)\b\w+\b",
+        "dtype": np.dtype(dtype).name,
+    }
+    with open(folder / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    stats = {
+        "matrix_name": matrix_name,
+        "num_documents": n_docs,
+        "num_features": int(kept.sum()),
+        "hash_buckets": n_features,
+        "non_zero_elements": nnz,
+        "avg_doc_length": avg_doc_length,
+        "idf_variant": idf_variant,
+        "dtype": np.dtype(dtype).name,
+        "shards": len(shard_rows),
+        "count_seconds": t_count,
+        "weight_seconds": t_weight,
+    }
+
+    print("✅ Hashed BM25 shards ready")
+    print(f"   • Chunks:   {n_docs} in {len(shard_rows)} shards")
+    print(f"   • Non-empty buckets: {stats['num_features']} / {n_features}")
+    print(f"   • Avg length (tokens): {avg_doc_length:.1f}")
+    print(f"   • Time: count {t_count:.1f}s, weight {t_weight:.1f}s")
+
+    return stats
+
+
+class HashedBM25Index:
+    """
+    Query side of build_bm25_hashed: scores one shard at a time.
+
+    cache_shards: how many shards stay in memory after they were read (the
+    first ones; 0 = every query reads every shard from disk). A query scans
+    the shards in order, so a least-recently-used cache would evict each
+    shard right before its next use – the kept shards are fixed instead, and
+    memory stays bounded by cache_shards shards however large the index is.
+    """
+
+    def __init__(self, output_folder: str | Path, cache_shards: int = 2):
+        self.folder = Path(output_folder) / HASHED_SUBDIR
+        with open(self.folder / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.offsets = np.asarray(self.meta["shard_offsets"], dtype=np.int64)
+        self.n_docs = self.meta["n_docs"]
+        self.hv = make_hashing_vectorizer(
+            self.meta["n_features"],
+            self.meta["stop_words"],
+            self.meta["lowercase"],
+            self.meta["token_pattern"],
+        )
+        self.cache_shards = cache_shards
+        self._shards = {}
+
+    def shard_csc(self, i):
+        shard = self._shards.get(i)
+        if shard is None:
+            shard = load_npz(self.folder / SHARD_PATTERN.format(i)).tocsc()
+            shard.sort_indices()
+            if len(self._shards) < self.cache_shards:
+                self._shards[i] = shard
+        return shard
+
+    def query_terms(self, query: str):
+        """(bucket_ids, query_tf) of the query."""
+        q = self.hv.transform([query]).tocsr()
+        return q.indices.astype(np.int64), q.data
+
+    def search(self, query: str, k: int = 10):
+        """Top-k [(row, score), ...]; row = chunk_id in chunks_metadata order."""
+        buckets, q_tf = self.query_terms(query)
+        candidates = []
+
+        for i in range(len(self.offsets) - 1):
+            shard = self.shard_csc(i)
+            scores = np.zeros(shard.shape[0], dtype=np.float64)
+            for t, w in zip(buckets, q_tf):
+                start, end = shard.indptr[t], shard.indptr[t + 1]
+                scores[shard.indices[start:end]] += w * shard.data[start:end]
+
+            top = top_k_indices(scores, k)
+            top = top[scores[top] > 0]
+            candidates.extend((float(scores[j]), int(self.offsets[i] + j)) for j in top)
+
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        return [(row, score) for score, row in candidates[:k]]
@@ -0,0 +1,381 @@
+"""
+bm25_inverted_index.py
+======================
+
+אינדקס הפוך (inverted index) שנשמר לדיסק, נבנה מתוך מטריצת ה-BM25 של
+build_bm25_matrix, עם dynamic pruning לשליפת top-k:
+
+    - "wand"       : WAND (Broder et al.) עם חסם עליון לכל מונח
+    - "maxscore"   : block-max MaxScore (חסם עליון לכל בלוק של postings),
+                     vectorized over windows of WINDOW_DOCS doc ids
+    - "exhaustive" : ניקוד כל ה-postings של מונחי השאילתה (בסיס להשוואה)
+
+Layout on disk (<index_folder>/inverted_index/):
+    term_ptr.npy    postings of term t are [term_ptr[t], term_ptr[t+1])
+    doc_ids.npy     chunk rows, sorted inside every posting list
+    weights.npy     BM25 weight of (chunk, term)
+    term_max.npy    max weight per term (upper bound for WAND / MaxScore)
+    block_ptr.npy   blocks of term t are [block_ptr[t], block_ptr[t+1])
+    block_max.npy   max weight inside each block
+    block_last.npy  last doc id of each block
+    meta.json       n_docs, n_terms, block_size
+"""
+
+import heapq
+import json
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+from bm25_search import top_k_indices
+
+
+INDEX_SUBDIR = "inverted_index"
+INDEX_ARRAYS = (
+    "term_ptr",
+    "doc_ids",
+    "weights",
+    "term_max",
+    "block_ptr",
+    "block_max",
+    "block_last",
+)
+_END = int(np.iinfo(np.int64).max)  # doc id of an exhausted cursor
+WINDOW_DOCS = 16384  # doc-id window of block-max MaxScore (unit of skipping)
+
+
+class _TopK:
+    """Min-heap of the current top-k (score, doc); threshold = k-th best score."""
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+
+    @property
+    def threshold(self):
+        return self.heap[0][0] if len(self.heap) >= self.k else 0.0
+
+    def push(self, doc, score):
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (score, -doc))
+        elif score > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (score, -doc))
+
+    def results(self):
+        return [(-neg_doc, score) for score, neg_doc in sorted(self.heap, key=lambda x: (-x[0], -x[1]))]
+
+
+class _Cursor:
+    """
+    Iterator over one posting list (doc ids sorted ascending).
+
+    The postings stay numpy slices of the (memory-mapped) index arrays; the
+    cursor only reads the entries it visits and jumps with np.searchsorted,
+    so skipped postings are never touched.
+    """
+
+    __slots__ = ("q_weight", "docs", "weights", "n", "pos", "doc", "ub")
+
+    def __init__(self, index, term, q_weight):
+        start, end = int(index.term_ptr[term]), int(index.term_ptr[term + 1])
+
+        self.q_weight = q_weight
+        self.docs = index.doc_ids[start:end]
+        self.weights = index.weights[start:end]
+        self.n = end - start
+        self.ub = q_weight * float(index.term_max[term])
+        self._move(0)
+
+    @property
+    def exhausted(self):
+        return self.pos >= self.n
+
+    def _move(self, pos):
+        self.pos = pos
+        self.doc = int(self.docs[pos]) if pos < self.n else _END
+
+    def score(self):
+        return self.q_weight * float(self.weights[self.pos])
+
+    def next(self):
+        self._move(self.pos + 1)
+
+    def advance(self, target):
+        """Move to the first posting with doc >= target (binary search)."""
+        if self.doc < target:
+            self._move(self.pos + int(np.searchsorted(self.docs[self.pos:], target)))
+
+
+class InvertedIndex:
+    """Term -> sorted postings with per-term and per-block max scores."""
+
+    def __init__(self, arrays: dict, n_docs: int, n_terms: int, block_size: int):
+        for name in INDEX_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_docs = n_docs
+        self.n_terms = n_terms
+        self.block_size = block_size
+
+    # ----------------------------------------------------
+    # Build / save / load
+    # ----------------------------------------------------
+    @classmethod
+    def from_bm25_matrix(cls, X_bm25, block_size: int = 64):
+        """X_bm25: (n_docs x n_terms) sparse matrix from build_bm25_matrix."""
+        X = csc_matrix(X_bm25)
+        X.sort_indices()  # postings sorted by chunk id
+        n_docs, n_terms = X.shape
+
+        term_ptr = X.indptr.astype(np.int64)
+        doc_ids = X.indices.astype(np.int32)
+        weights = X.data.astype(np.float32)
+
+        lengths = np.diff(term_ptr)
+        term_max = np.zeros(n_terms, dtype=np.float32)
+        nonempty = lengths > 0
+        term_max[nonempty] = np.maximum.reduceat(weights, term_ptr[:-1][nonempty])
+
+        # blocks: every posting list is cut into runs of block_size postings
+        n_blocks = (lengths + block_size - 1) // block_size
+        block_ptr = np.concatenate([[0], np.cumsum(n_blocks)]).astype(np.int64)
+        block_starts = np.concatenate(
+            [np.arange(term_ptr[t], term_ptr[t + 1], block_size) for t in np.where(nonempty)[0]]
+        ) if nonempty.any() else np.empty(0, dtype=np.int64)
+        block_ends = np.minimum(block_starts + block_size, np.repeat(term_ptr[1:], n_blocks))
+        block_max = (
+            np.maximum.reduceat(weights, block_starts) if len(block_starts) else np.empty(0, dtype=np.float32)
+        )
+        block_last = doc_ids[block_ends - 1] if len(block_starts) else np.empty(0, dtype=np.int32)
+
+        arrays = {
+            "term_ptr": term_ptr,
+            "doc_ids": doc_ids,
+            "weights": weights,
+            "term_max": term_max,
+            "block_ptr": block_ptr,
+            "block_max": block_max.astype(np.float32),
+            "block_last": block_last.astype(np.int32),
+        }
+        return cls(arrays, n_docs=n_docs, n_terms=n_terms, block_size=block_size)
+
+    def save(self, index_folder: str | Path):
+        out = Path(index_folder) / INDEX_SUBDIR
+        out.mkdir(parents=True, exist_ok=True)
+
+        for name in INDEX_ARRAYS:
+            np.save(out / f"{name}.npy", getattr(self, name))
+        with open(out / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"n_docs": self.n_docs, "n_terms": self.n_terms, "block_size": self.block_size}, f)
+
+        return out
+
+    @classmethod
+    def load(cls, index_folder: str | Path, mmap: bool = True):
+        folder = Path(index_folder) / INDEX_SUBDIR
+        if not folder.exists():
+            raise FileNotFoundError(f"Inverted index not found: {folder}")
+
+        with open(folder / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(folder / f"{name}.npy", mmap_mode=mmap_mode) for name in INDEX_ARRAYS}
+        return cls(arrays, **meta)
+
+    # ----------------------------------------------------
+    # Retrieval
+    # ----------------------------------------------------
+    def search(self, term_ids, q_weights, k: int = 10, method: str = "maxscore"):
+        """
+        term_ids / q_weights: query terms and their query weights (e.g. query TF)
+        Returns ([(doc, score), ...] best first, number of documents scored).
+        """
+        if method == "wand":
+            return self._search_wand(term_ids, q_weights, k)
+        if method == "maxscore":
+            return self._search_maxscore(term_ids, q_weights, k)
+        if method == "exhaustive":
+            return self._search_exhaustive(term_ids, q_weights, k)
+        raise ValueError(f"Unknown method '{method}', expected wand / maxscore / exhaustive")
+
+    def _cursors(self, term_ids, q_weights):
+        cursors = [_Cursor(self, int(t), float(w)) for t, w in zip(term_ids, q_weights)]
+        return [c for c in cursors if not c.exhausted]
+
+    def _search_exhaustive(self, term_ids, q_weights, k):
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        touched = np.zeros(self.n_docs, dtype=bool)
+        for t, w in zip(term_ids, q_weights):
+            start, end = self.term_ptr[t], self.term_ptr[t + 1]
+            docs = self.doc_ids[start:end]
+            scores[docs] += w * self.weights[start:end]
+            touched[docs] = True
+
+        docs = np.flatnonzero(touched)
+        best = top_k_indices(scores[docs], k)
+        return [(int(docs[i]), float(scores[docs[i]])) for i in best], len(docs)
+
+    def _search_wand(self, term_ids, q_weights, k):
+        cursors = self._cursors(term_ids, q_weights)
+        top = _TopK(k)
+        scored = 0
+
+        while cursors:
+            cursors.sort(key=lambda c: c.doc)
+            threshold = top.threshold
+
+            # pivot = first cursor where the accumulated upper bound can beat the threshold
+            acc, pivot = 0.0, None
+            for i, c in enumerate(cursors):
+                acc += c.ub
+                if acc > threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+
+            pivot_doc = cursors[pivot].doc
+            if cursors[0].doc == pivot_doc:
+                # all cursors up to the pivot sit on pivot_doc -> fully score it
+                score = 0.0
+                for c in cursors:
+                    if c.doc != pivot_doc:
+                        break
+                    score += c.score()
+                    c.next()
+                scored += 1
+                top.push(pivot_doc, score)
+            else:
+                # skip every cursor before the pivot straight to pivot_doc
+                for c in cursors[:pivot]:
+                    c.advance(pivot_doc)
+
+            cursors = [c for c in cursors if not c.exhausted]
+
+        return top.results(), scored
+
+    def _window_bounds(self, term, q_weight, n_windows):
+        """Upper bound of one term in every doc-id window, from its block maxima only."""
+        b_start, b_end = self.block_ptr[term], self.block_ptr[term + 1]
+        last = self.block_last[b_start:b_end].astype(np.int64)
+        first = np.empty_like(last)  # lower bound of the first doc of every block
+        first[0] = self.doc_ids[self.term_ptr[term]]
+        first[1:] = last[:-1] + 1
+
+        # a block of a rare term may cover several windows -> one entry per (block, window)
+        w_first = first // WINDOW_DOCS
+        span = last // WINDOW_DOCS - w_first + 1
+        blocks = np.repeat(np.arange(len(last)), span)
+        windows = np.repeat(w_first - np.cumsum(span) + span, span) + np.arange(len(blocks))
+
+        bounds = np.zeros(n_windows, dtype=np.float64)
+        np.maximum.at(bounds, windows, q_weight * self.block_max[b_start:b_end][blocks])
+        return bounds
+
+    def _search_maxscore(self, term_ids, q_weights, k):
+        """
+        Block-max MaxScore over windows of WINDOW_DOCS doc ids.
+
+        The upper bound of a window (sum over the terms of their block maxima
+        there) is computed from block_last / block_max alone. Windows are
+        visited best bound first and the search stops at the first window that
+        cannot beat the current k-th score, so the postings of the remaining
+        windows are never read. Inside a window, terms whose bounds together
+        stay under the threshold are non-essential: only docs of the essential
+        terms are candidates, and the non-essential terms are looked up for
+        the candidates that can still make it.
+
+        A corpus that fits in one window has nothing to skip and is scored
+        exhaustively.
+        """
+        if self.n_docs <= WINDOW_DOCS:
+            return self._search_exhaustive(term_ids, q_weights, k)
+
+        terms = [(int(t), np.float64(w)) for t, w in zip(term_ids, q_weights)
+                 if self.term_ptr[t + 1] > self.term_ptr[t]]
+        if not terms:
+            return [], 0
+
+        n_windows = (self.n_docs + WINDOW_DOCS - 1) // WINDOW_DOCS
+        edges = np.arange(n_windows + 1) * WINDOW_DOCS
+        postings = []
+        for t, w in terms:
+            # plain views of the (memory-mapped) arrays: no copy, cheaper slicing
+            term_docs = np.asarray(self.doc_ids[self.term_ptr[t]:self.term_ptr[t + 1]])
+            term_weights = np.asarray(self.weights[self.term_ptr[t]:self.term_ptr[t + 1]])
+            # postings of window i are [cuts[i], cuts[i + 1])
+            postings.append((term_docs, term_weights, w, np.searchsorted(term_docs, edges)))
+        bounds = np.array([self._window_bounds(t, w, n_windows) for t, w in terms])
+        window_ub = bounds.sum(axis=0)
+
+        top_docs = np.empty(0, dtype=np.int64)
+        top_scores = np.empty(0, dtype=np.float64)
+        threshold = 0.0
+        scored = 0
+
+        for window in np.argsort(-window_ub, kind="stable"):
+            if window_ub[window] <= threshold:
+                break
+
+            # terms by their bound in this window; prefix[j] = sum of the j+1 lowest bounds
+            order = np.argsort(bounds[:, window], kind="stable")
+            prefix = np.cumsum(bounds[order, window])
+            n_non_essential = int(np.searchsorted(prefix, threshold, side="right"))
+
+            docs, contrib = [], []
+            for i in order[n_non_essential:]:
+                term_docs, term_weights, w, cuts = postings[i]
+                start, end = cuts[window], cuts[window + 1]
+                docs.append(term_docs[start:end])
+                contrib.append(w * term_weights[start:end])
+            if len(docs) == 1:
+                candidates, scores = docs[0], contrib[0]
+            else:
+                candidates, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(contrib))
+            if not len(candidates):
+                continue
+            scored += len(candidates)
+
+            # non-essential terms, highest bound first; drop candidates that cannot make it
+            for j in range(n_non_essential - 1, -1, -1):
+                keep = scores + prefix[j] > threshold
+                candidates, scores = candidates[keep], scores[keep]
+                if not len(candidates):
+                    break
+                term_docs, term_weights, w, cuts = postings[order[j]]
+                start, end = cuts[window], cuts[window + 1]
+                if start == end:
+                    continue
+                pos = np.minimum(np.searchsorted(term_docs[start:end], candidates), end - start - 1) + start
+                hit = term_docs[pos] == candidates
+                scores = scores + np.where(hit, w * term_weights[pos], 0.0)
+
+            top_docs = np.concatenate([top_docs, candidates])
+            top_scores = np.concatenate([top_scores, scores])
+            best = top_k_indices(top_scores, k)
+            top_docs, top_scores = top_docs[best], top_scores[best]
+            if len(top_scores) >= k:
+                threshold = top_scores[-1]
+
+        return [(int(d), float(s)) for d, s in zip(top_docs, top_scores)], scored
+
+
+def build_and_save_inverted_index(index_folder: str | Path, block_size: int = 64):
+    """Builds the inverted index from <index_folder>/X_bm25_chunks.npz and saves it next to it."""
+    from scipy.sparse import load_npz
+
+    index_folder = Path(index_folder)
+    print(f"\n🔨 Building inverted index for: {index_folder}")
+    X = load_npz(index_folder / "X_bm25_chunks.npz")
+    index = InvertedIndex.from_bm25_matrix(X, block_size=block_size)
+    out = index.save(index_folder)
+    print(f"✅ Saved inverted index ({len(index.doc_ids)} postings, {len(index.block_max)} blocks) to: {out}")
+    return index
+
+
+if __name__ == "__main__":
+    for sub in ("fixed", "hierarchical"):
+        folder = Path("bm25_chunks_outputs") / sub
+        if (folder / "X_bm25_chunks.npz").exists():
+            build_and_save_inverted_index(folder)
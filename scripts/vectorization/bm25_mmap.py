@@ -0,0 +1,198 @@
+"""
+bm25_mmap.py
+============
+
+Uncompressed, memory-mappable layout of the BM25 artifacts for query
+serving with several worker processes.
+
+X_bm25_chunks.npz is a zip archive: every process that loads it decompresses
+the whole matrix into private memory. Here every array is a plain .npy file,
+opened with np.load(mmap_mode="r"), so N workers share one page-cached copy
+and a worker starts without reading the matrix at all.
+
+Layout (<index_folder>/mmap/ – a symlink to the current mmap.v<N>/, see save_mmap_layout):
+    csr_data.npy  csr_indices.npy  csr_indptr.npy   rows = chunks
+    csc_data.npy  csc_indices.npy  csc_indptr.npy   columns = posting lists (sorted)
+    idf.npy                                         BM25 IDF per term (optional)
+    doc_lengths.npy                                 tokens per chunk (optional)
+    meta.json                                       shape, dtypes, nnz
+
+Indices are int32 whenever they fit, so scipy takes the arrays as they are
+(copy=False) and the matrices stay backed by the mapped files.
+
+    python scripts/vectorization/bm25_mmap.py bm25_chunks_outputs/fixed   # npz -> mmap layout
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix, load_npz
+
+
+MMAP_SUBDIR = "mmap"
+MMAP_META = "meta.json"
+
+# files whose sizes go into the build manifest (build_bm25_for_chunks.py)
+MMAP_FILES = tuple(
+    f"{MMAP_SUBDIR}/{name}"
+    for name in (
+        "csr_data.npy", "csr_indices.npy", "csr_indptr.npy",
+        "csc_data.npy", "csc_indices.npy", "csc_indptr.npy",
+        MMAP_META,
+    )
+)
+
+
+def _index_dtype(X):
+    return np.int32 if max(X.nnz, max(X.shape)) < np.iinfo(np.int32).max else np.int64
+
+
+def _mmap_versions(index_folder: Path):
+    """[(n, path)] of the mmap.v<n>/ folders of an index, oldest first."""
+    found = []
+    for path in index_folder.glob(f"{MMAP_SUBDIR}.v*"):
+        n = path.name[len(MMAP_SUBDIR) + 2:]
+        if n.isdigit() and path.is_dir() and not path.is_symlink():
+            found.append((int(n), path))
+    return sorted(found)
+
+
+def _swap_in(link: Path, folder: Path):
+    """Points link at folder with one os.replace (readers see the old or the new layout)."""
+    aside = link.with_name(MMAP_SUBDIR + ".old")
+    if link.is_dir() and not link.is_symlink():
+        # a plain folder (older layout, or no symlinks): a link cannot replace it in one step
+        shutil.rmtree(aside, ignore_errors=True)
+        os.replace(link, aside)
+
+    tmp = link.with_name(MMAP_SUBDIR + ".link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.symlink(folder.name, tmp, target_is_directory=True)  # relative: the index can be moved
+    except OSError:  # no symlinks (e.g. Windows without developer mode)
+        os.replace(folder, link)
+    else:
+        os.replace(tmp, link)
+    shutil.rmtree(aside, ignore_errors=True)
+
+
+def save_mmap_layout(index_folder: str | Path, X, idf=None, doc_lengths=None):
+    """
+    Writes the CSR and CSC arrays of X (+ idf / doc_lengths) to a new folder
+    <index_folder>/mmap.v<N>/ and then swaps the <index_folder>/mmap symlink
+    over to it, so a worker never maps a half-written file and the layout is
+    never missing. The previous version is deleted after the swap (workers
+    that still map its files keep them until they close).
+    """
+    index_folder = Path(index_folder)
+    link = index_folder / MMAP_SUBDIR
+    versions = _mmap_versions(index_folder)
+    folder = index_folder / f"{MMAP_SUBDIR}.v{versions[-1][0] + 1 if versions else 1}"
+    folder.mkdir(parents=True)
+
+    index_dtype = _index_dtype(X)
+    meta = {
+        "shape": [int(n) for n in X.shape],
+        "nnz": int(X.nnz),
+        "dtype": np.dtype(X.dtype).name,
+        "index_dtype": np.dtype(index_dtype).name,
+    }
+
+    for fmt, M in (("csr", X.tocsr()), ("csc", X.tocsc())):
+        M.sum_duplicates()  # also sorts the indices
+        np.save(folder / f"{fmt}_data.npy", M.data)
+        np.save(folder / f"{fmt}_indices.npy", M.indices.astype(index_dtype, copy=False))
+        np.save(folder / f"{fmt}_indptr.npy", M.indptr.astype(index_dtype, copy=False))
+
+    if idf is not None:
+        np.save(folder / "idf.npy", np.asarray(idf))
+    if doc_lengths is not None:
+        np.save(folder / "doc_lengths.npy", np.asarray(doc_lengths))
+
+    with open(folder / MMAP_META, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    _swap_in(link, folder)
+    # the replaced version + leftovers of an interrupted save
+    for _, old in _mmap_versions(index_folder):
+        if old != folder:
+            shutil.rmtree(old, ignore_errors=True)
+    return link
+
+
+def has_mmap_layout(index_folder: str | Path) -> bool:
+    return (Path(index_folder) / MMAP_SUBDIR / MMAP_META).exists()
+
+
+def _mapped_matrix(folder, fmt, shape):
+    cls = csr_matrix if fmt == "csr" else csc_matrix
+    data = np.load(folder / f"{fmt}_data.npy", mmap_mode="r")
+    indices = np.load(folder / f"{fmt}_indices.npy", mmap_mode="r")
+    indptr = np.load(folder / f"{fmt}_indptr.npy", mmap_mode="r")
+
+    M = cls((data, indices, indptr), shape=shape, copy=False)
+    M.has_sorted_indices = True  # sorted on save; never sorted (written) again
+    return M
+
+
+def load_mmap_layout(index_folder: str | Path, formats=("csr", "csc")):
+    """
+    Returns {"csr": ..., "csc": ..., "idf": ..., "doc_lengths": ..., "meta": {...}};
+    the matrices are scipy.sparse matrices over read-only np.memmap arrays,
+    idf / doc_lengths are None when they were not saved.
+    """
+    # resolve the symlink once: every array comes from the same version
+    folder = (Path(index_folder) / MMAP_SUBDIR).resolve()
+    with open(folder / MMAP_META, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    shape = tuple(meta["shape"])
+    layout = {"meta": meta}
+    for fmt in formats:
+        layout[fmt] = _mapped_matrix(folder, fmt, shape)
+
+    for name in ("idf", "doc_lengths"):
+        path = folder / f"{name}.npy"
+        layout[name] = np.load(path, mmap_mode="r") if path.exists() else None
+
+    return layout
+
+
+def is_mapped(M) -> bool:
+    """True if the data / indices / indptr of a sparse matrix are views of mapped files."""
+    def mapped(a):
+        while a is not None:
+            if isinstance(a, np.memmap):
+                return True
+            a = a.base if isinstance(a, np.ndarray) else None
+        return False
+
+    return all(mapped(a) for a in (M.data, M.indices, M.indptr))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the memory-mappable layout of a saved BM25 index")
+    parser.add_argument("index_folder", help="e.g. bm25_chunks_outputs/fixed")
+    args = parser.parse_args()
+
+    index_folder = Path(args.index_folder)
+    X = load_npz(index_folder / "X_bm25_chunks.npz")
+    folder = save_mmap_layout(index_folder, X)
+
+    t0 = time.perf_counter()
+    layout = load_mmap_layout(index_folder)
+    t_load = time.perf_counter() - t0
+
+    size = sum(p.stat().st_size for p in folder.iterdir())
+    print(f"✅ {folder}: {size / 1e6:.1f} MB, shape {layout['meta']['shape']}, nnz {layout['meta']['nnz']}")
+    print(f"   • mapped load: {t_load * 1000:.1f} ms (csr mapped: {is_mapped(layout['csr'])}, "
+          f"csc mapped: {is_mapped(layout['csc'])})")
+
+
+if __name__ == "__main__":
+    main()
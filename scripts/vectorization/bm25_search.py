@@ -0,0 +1,206 @@
+"""
+bm25_search.py
+==============
+
+חיפוש BM25 בזמן שאילתה מעל הפלטים של save_bm25_outputs:
+
+    <index_folder>/
+        X_bm25_chunks.npz
+        bm25_feature_names.txt
+        chunks_metadata.arrow (או chunks_metadata.csv – metadata_store.py)
+        bm25_params.json      (אופציונלי – חוקי הטוקניזציה)
+        mmap/                 (אופציונלי – bm25_mmap.py: the matrices are
+                               memory-mapped and shared between processes)
+
+The matrix already holds the BM25 weight of every (chunk, term) pair, so the
+score of a chunk is the sum of its weights over the query terms (weighted by
+how many times the term appears in the query).
+
+Usage:
+    python scripts/vectorization/bm25_search.py bm25_chunks_outputs/fixed "energy prices" -k 5
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import load_npz, csr_matrix
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from metadata_store import read_table, table_exists
+from bm25_mmap import has_mmap_layout, load_mmap_layout
+
+
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w+\b"
+
+# written by an incremental update (build_bm25_for_chunks.py --incremental)
+# that changed the segments without writing the matrix back
+STALE_MARKER_NAME = "bm25_outputs_stale.json"
+
+
+def top_k_indices(scores, k):
+    """Indices of the k largest scores, best first (np.argpartition + small sort)."""
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class BM25Searcher:
+    """
+    Loads the BM25 artifacts once and answers queries.
+
+    A CSC copy of the matrix is kept, so column t is the posting list of
+    term t: a query only touches the columns of its own terms.
+
+    mmap=True (default) uses the mmap/ layout when the index has one: both
+    matrices are read-only views of the mapped files, shared by every
+    worker process that serves the same index.
+    """
+
+    def __init__(self, index_folder: str | Path, load_metadata: bool = True, mmap: bool = True):
+        self.index_folder = Path(index_folder)
+        if not self.index_folder.exists():
+            raise FileNotFoundError(f"BM25 index folder not found: {self.index_folder}")
+        if (self.index_folder / STALE_MARKER_NAME).exists():
+            raise RuntimeError(
+                f"BM25 outputs in {self.index_folder} are older than its segments – run "
+                f"build_bm25_for_chunks.py --incremental --write-back, or search the segments (bm25_segments.py search)"
+            )
+
+        self.mapped = mmap and has_mmap_layout(self.index_folder)
+        if self.mapped:
+            layout = load_mmap_layout(self.index_folder)
+            self.X_csr = layout["csr"]
+            self.X_csc = layout["csc"]
+        else:
+            X = load_npz(self.index_folder / "X_bm25_chunks.npz")
+            self.X_csr = X.tocsr()
+            self.X_csc = X.tocsc()
+            self.X_csc.sort_indices()
+        self.n_docs, self.n_terms = self.X_csr.shape
+
+        with open(self.index_folder / "bm25_feature_names.txt", "r", encoding="utf-8") as f:
+            self.feature_names = f.read().split("\n")
+        self.vocabulary = {t: i for i, t in enumerate(self.feature_names)}
+
+        self.params = {"lowercase": True, "token_pattern": DEFAULT_TOKEN_PATTERN}
+        params_path = self.index_folder / "bm25_params.json"
+        if params_path.exists():
+            with open(params_path, "r", encoding="utf-8") as f:
+                self.params.update(json.load(f))
+
+        self._token_re = re.compile(self.params["token_pattern"])
+        self._lowercase = self.params["lowercase"]
+
+        # row -> chunk_id (row order == order in chunks_metadata)
+        self.metadata = None
+        self.chunk_ids = np.arange(self.n_docs)
+        if load_metadata and table_exists(self.index_folder, "chunks_metadata"):
+            self.metadata = read_table(self.index_folder, "chunks_metadata")
+            if "chunk_id" in self.metadata.columns:
+                self.chunk_ids = self.metadata["chunk_id"].to_numpy()
+
+    # ----------------------------------------------------
+    # Query side
+    # ----------------------------------------------------
+    def tokenize(self, query: str):
+        """Same rules as the fitted vectorizer (lowercase + token_pattern)."""
+        if self._lowercase:
+            query = query.lower()
+        return self._token_re.findall(query)
+
+    def query_terms(self, query: str):
+        """(term_ids, query_tf) for the in-vocabulary terms of the query."""
+        ids = [self.vocabulary[t] for t in self.tokenize(query) if t in self.vocabulary]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        term_ids, counts = np.unique(ids, return_counts=True)
+        return term_ids, counts.astype(np.float64)
+
+    def query_matrix(self, queries):
+        """Sparse (n_queries x n_terms) matrix of query term frequencies."""
+        rows, cols, vals = [], [], []
+        for qi, query in enumerate(queries):
+            term_ids, tf = self.query_terms(query)
+            rows.append(np.full(len(term_ids), qi))
+            cols.append(term_ids)
+            vals.append(tf)
+
+        if not queries:
+            return csr_matrix((0, self.n_terms))
+
+        return csr_matrix(
+            (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(queries), self.n_terms),
+        )
+
+    # ----------------------------------------------------
+    # Scoring
+    # ----------------------------------------------------
+    def score(self, query: str):
+        """Dense score vector over all chunks (only posting columns are read)."""
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        indptr, indices, data = self.X_csc.indptr, self.X_csc.indices, self.X_csc.data
+
+        for t, q_tf in zip(*self.query_terms(query)):
+            start, end = indptr[t], indptr[t + 1]
+            scores[indices[start:end]] += q_tf * data[start:end]
+
+        return scores
+
+    def search(self, query: str, k: int = 10):
+        """Top-k [(chunk_id, score), ...] for one query; chunks with score 0 are dropped."""
+        scores = self.score(query)
+        top = top_k_indices(scores, k)
+        top = top[scores[top] > 0]
+        return [(int(self.chunk_ids[i]), float(scores[i])) for i in top]
+
+    def search_many(self, queries, k: int = 10):
+        """
+        Batched search: all queries are scored with one sparse product
+        (n_queries x n_terms) @ (n_terms x n_docs). Returns one result list per query.
+        """
+        queries = list(queries)
+        Q = self.query_matrix(queries)
+        S = (Q @ self.X_csr.T).tocsr()
+
+        results = []
+        for qi in range(S.shape[0]):
+            start, end = S.indptr[qi], S.indptr[qi + 1]
+            docs, scores = S.indices[start:end], S.data[start:end]
+            top = top_k_indices(scores, k)
+            top = top[scores[top] > 0]
+            results.append([(int(self.chunk_ids[docs[i]]), float(scores[i])) for i in top])
+
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 search over a saved chunk index")
+    parser.add_argument("index_folder", help="e.g. bm25_chunks_outputs/fixed")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    searcher = BM25Searcher(args.index_folder)
+    print(f"\n🔎 Query: {args.query}")
+    for rank, (chunk_id, score) in enumerate(searcher.search(args.query, k=args.k), start=1):
+        info = ""
+        if searcher.metadata is not None and "chunk_path" in searcher.metadata.columns:
+            info = searcher.metadata.loc[searcher.metadata["chunk_id"] == chunk_id, "chunk_path"].iloc[0]
+        print(f"{rank:3d}. chunk {chunk_id:6d}  score={score:.4f}  {info}")
+
+
+if __name__ == "__main__":
+    main()
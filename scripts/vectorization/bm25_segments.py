@@ -0,0 +1,688 @@
+"""
+bm25_segments.py
+================
+
+אינדקס BM25 שמתעדכן בלי fit מחדש.
+
+Every add writes a new, immutable segment with the RAW term counts of the
+new chunks only. The global statistics BM25 needs (document frequency per
+term, number of chunks, average length) are kept as running sums that each
+segment only adds its own deltas to, and the BM25 weights are computed at
+query time from those global statistics. Adding one debate file therefore
+costs the tokenization of that file plus one small write – independent of
+the size of the corpus.
+
+Small segments are merged in a background thread (the merge_factor adjacent
+segments with the fewest chunks), deleted chunks are dropped while merging.
+
+Layout on disk (<index_folder>/segments/):
+    index.json          params, segment list, n_terms, per-file hashes (the commit point)
+    vocab.txt           global term list, append-only (term id = line number)
+    seg_000001/
+        tf.npz          raw counts (chunks x terms known when the segment was written)
+        doc_lengths.npy tokens per chunk (same definition as BM25Vectorizer)
+        chunks.csv      chunk_id, orig_file, chunk_index, country
+        deleted.npy     tombstones (only if chunks of it were deleted)
+
+Usage:
+    python scripts/vectorization/bm25_segments.py sync bm25_chunks_outputs/fixed chunks_output
+    python scripts/vectorization/bm25_segments.py search bm25_chunks_outputs/fixed "energy prices" -k 5
+"""
+
+import argparse
+import hashlib
+import json
+import numbers
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz, save_npz, vstack
+from sklearn.feature_extraction.text import CountVectorizer
+
+from bm25_core import BM25Transformer, bm25_idf, load_chunk_documents
+from bm25_search import top_k_indices
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "chunking"))
+from chunk_store import ChunkStore, infer_country, store_exists
+
+
+SEGMENTS_SUBDIR = "segments"
+INDEX_FILE = "index.json"
+VOCAB_FILE = "vocab.txt"
+
+DEFAULT_PARAMS = {
+    "k1": 1.5,
+    "b": 0.75,
+    "idf_variant": "okapi",
+    "min_df": 1,
+    "max_df": 1.0,
+    "max_features": None,
+    "stop_words": None,
+    "lowercase": True,
+    "token_pattern": r"(?u)\b\w+\b",
+}
+
+
+def _term_stats(tf):
+    """(df, cf) of a raw count matrix: chunks containing the term / total occurrences."""
+    width = tf.shape[1]
+    df = np.bincount(tf.indices, minlength=width)
+    cf = np.bincount(tf.indices, weights=tf.data, minlength=width)
+    return df, cf
+
+
+def _with_width(tf, width):
+    """Same CSR with more (empty) columns – older segments know fewer terms."""
+    return csr_matrix((tf.data, tf.indices, tf.indptr), shape=(tf.shape[0], width))
+
+
+# ----------------------------------------------------
+# Segment (immutable raw counts + tombstones)
+# ----------------------------------------------------
+class Segment:
+    def __init__(self, name, tf, doc_lengths, chunks: pd.DataFrame, deleted=None):
+        self.name = name
+        self.tf = tf.tocsr()
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        self.chunks = chunks.reset_index(drop=True)
+        self.deleted = np.zeros(self.tf.shape[0], dtype=bool) if deleted is None else deleted
+        self._csc = None
+
+    @property
+    def n_docs(self):
+        return self.tf.shape[0]
+
+    @property
+    def n_live(self):
+        return int(self.n_docs - self.deleted.sum())
+
+    def csc(self):
+        """Column t = posting list of term t (built on first query)."""
+        if self._csc is None:
+            csc = self.tf.tocsc()
+            csc.sort_indices()
+            self._csc = csc
+        return self._csc
+
+    def write(self, folder: Path):
+        tmp = folder.with_name(folder.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        # leftover of a merge that never committed (same name is handed out again)
+        shutil.rmtree(folder, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        save_npz(tmp / "tf.npz", self.tf, compressed=False)
+        np.save(tmp / "doc_lengths.npy", self.doc_lengths)
+        self.chunks.to_csv(tmp / "chunks.csv", index=False)
+        if self.deleted.any():
+            np.save(tmp / "deleted.npy", self.deleted)
+
+        os.replace(tmp, folder)
+
+    def save_deleted(self, folder: Path):
+        tmp = folder / "deleted.tmp.npy"
+        np.save(tmp, self.deleted)
+        os.replace(tmp, folder / "deleted.npy")
+
+    @classmethod
+    def load(cls, folder: Path):
+        deleted_path = folder / "deleted.npy"
+        return cls(
+            folder.name,
+            load_npz(folder / "tf.npz"),
+            np.load(folder / "doc_lengths.npy"),
+            pd.read_csv(folder / "chunks.csv", keep_default_na=False),
+            np.load(deleted_path) if deleted_path.exists() else None,
+        )
+
+
+# ----------------------------------------------------
+# Segmented index
+# ----------------------------------------------------
+class SegmentedBM25Index:
+    """
+    Updatable BM25 index: add_file / delete_file / search.
+
+    The scoring is the one of BM25Vectorizer (same tokenization, document
+    length, IDF variant and min_df / max_df / max_features rules); the
+    feature pruning is evaluated on the current global statistics, so
+    to_bm25_matrix() gives the matrix build_bm25_matrix would build from
+    scratch over the same chunks.
+    """
+
+    def __init__(self, index_folder: str | Path, params: dict, merge_factor: int = 4, max_segments: int = 8):
+        self.folder = Path(index_folder) / SEGMENTS_SUBDIR
+        self.params = {**DEFAULT_PARAMS, **params}
+        if self.params["stop_words"] is not None:
+            self.params["stop_words"] = sorted(self.params["stop_words"])
+
+        self.merge_factor = merge_factor
+        self.max_segments = max_segments
+
+        self.terms = []
+        self.vocabulary = {}
+        self.segments = []
+        self.files = {}            # orig_file -> hash of its chunk texts
+        self._file_segments = {}   # orig_file -> {segment name}
+        self.next_segment = 1
+        self.next_chunk_id = 0
+
+        # running global statistics (arrays grow with the vocabulary)
+        self._df = np.zeros(0, dtype=np.int64)
+        self._cf = np.zeros(0, dtype=np.float64)
+        self.n_docs = 0
+        self.total_length = 0.0
+        self._kept = None
+        self.last_add_seconds = 0.0
+
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread = None
+
+        self._analyzer = CountVectorizer(
+            stop_words=self.params["stop_words"],
+            lowercase=self.params["lowercase"],
+            token_pattern=self.params["token_pattern"],
+        ).build_analyzer()
+
+    @classmethod
+    def create(cls, index_folder: str | Path, **params):
+        index = cls(index_folder, params)
+        if (index.folder / INDEX_FILE).exists():
+            raise FileExistsError(f"Segmented index already exists: {index.folder}")
+        index.folder.mkdir(parents=True, exist_ok=True)
+        (index.folder / VOCAB_FILE).touch()
+        index._commit()
+        return index
+
+    @classmethod
+    def open(cls, index_folder: str | Path, merge_factor: int = 4, max_segments: int = 8):
+        folder = Path(index_folder) / SEGMENTS_SUBDIR
+        with open(folder / INDEX_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+        index = cls(index_folder, state["params"], merge_factor, max_segments)
+        index.next_segment = state["next_segment"]
+        index.next_chunk_id = state["next_chunk_id"]
+        index.files = state["files"]
+
+        # vocab.txt may hold terms of an add that never committed
+        with open(folder / VOCAB_FILE, "r", encoding="utf-8") as f:
+            index.terms = f.read().split("\n")[: state["n_terms"]]
+        index.vocabulary = {t: i for i, t in enumerate(index.terms)}
+        index._grow(len(index.terms))
+
+        for name in state["segments"]:
+            seg = Segment.load(folder / name)
+            index.segments.append(seg)
+            index._apply_stats(seg, np.where(~seg.deleted)[0], +1)
+            for orig_file in seg.chunks["orig_file"].unique():
+                index._file_segments.setdefault(orig_file, set()).add(name)
+
+        return index
+
+    @classmethod
+    def open_or_create(cls, index_folder: str | Path, **params):
+        if (Path(index_folder) / SEGMENTS_SUBDIR / INDEX_FILE).exists():
+            index = cls.open(index_folder)
+            requested = cls(index_folder, params).params
+            if requested != index.params:
+                raise ValueError(
+                    f"Segmented index in {index.folder} was built with other params; "
+                    "delete it to rebuild"
+                )
+            return index
+        return cls.create(index_folder, **params)
+
+    # ----------------------------------------------------
+    # Global statistics
+    # ----------------------------------------------------
+    def _grow(self, n_terms):
+        if n_terms > len(self._df):
+            capacity = max(n_terms, 2 * len(self._df))
+            self._df = np.concatenate([self._df, np.zeros(capacity - len(self._df), dtype=np.int64)])
+            self._cf = np.concatenate([self._cf, np.zeros(capacity - len(self._cf), dtype=np.float64)])
+
+    def _apply_stats(self, seg, rows, sign):
+        """Adds (+1) / removes (-1) the rows of a segment from the global statistics."""
+        if len(rows) == 0:
+            return
+        df, cf = _term_stats(seg.tf[rows])
+        width = len(df)
+        self._df[:width] += sign * df
+        self._cf[:width] += sign * cf
+        self.n_docs += sign * len(rows)
+        self.total_length += sign * float(seg.doc_lengths[rows].sum())
+        self._kept = None
+
+    @property
+    def df(self):
+        return self._df[: len(self.terms)]
+
+    @property
+    def avg_doc_length(self):
+        return self.total_length / self.n_docs if self.n_docs else 0.0
+
+    def kept_terms(self):
+        """Mask of the terms BM25Vectorizer would keep (min_df / max_df / max_features)."""
+        if self._kept is not None and len(self._kept) == len(self.terms):
+            return self._kept
+
+        df, p = self.df, self.params
+        max_doc_count = p["max_df"] if isinstance(p["max_df"], numbers.Integral) else p["max_df"] * self.n_docs
+        min_doc_count = p["min_df"] if isinstance(p["min_df"], numbers.Integral) else p["min_df"] * self.n_docs
+
+        mask = (df > 0) & (df >= min_doc_count) & (df <= max_doc_count)
+        if p["max_features"] is not None and mask.sum() > p["max_features"]:
+            # ties are broken by alphabetical order, like in CountVectorizer
+            kept = np.where(mask)[0]
+            kept = kept[np.argsort(np.asarray(self.terms, dtype=object)[kept], kind="stable")]
+            top = kept[np.argsort(-self._cf[kept], kind="stable")[: p["max_features"]]]
+            mask = np.zeros_like(mask)
+            mask[top] = True
+
+        self._kept = mask
+        return mask
+
+    def idf(self):
+        """BM25 IDF over the current global statistics (0 for pruned terms)."""
+        return bm25_idf(self.df, self.n_docs, self.params["idf_variant"]) * self.kept_terms()
+
+    # ----------------------------------------------------
+    # Updates
+    # ----------------------------------------------------
+    def _count(self, texts):
+        """Raw count CSR + document lengths; unseen terms get new ids."""
+        indptr, indices, data = [0], [], []
+        new_terms = []
+        for text in texts:
+            counts = {}
+            for token in self._analyzer(text):
+                term_id = self.vocabulary.get(token)
+                if term_id is None:
+                    term_id = len(self.terms)
+                    self.vocabulary[token] = term_id
+                    self.terms.append(token)
+                    new_terms.append(token)
+                counts[term_id] = counts.get(term_id, 0) + 1
+            ids = sorted(counts)
+            indices.extend(ids)
+            data.extend(counts[i] for i in ids)
+            indptr.append(len(indices))
+
+        tf = csr_matrix(
+            (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.terms)),
+        )
+        doc_lengths = np.asarray(tf.sum(axis=1)).ravel().astype(np.float64)
+        return tf, doc_lengths, new_terms
+
+    def add_file(self, orig_file: str, texts, chunk_indices=None, file_hash: str | None = None):
+        """
+        Adds (or replaces) all chunks of one original file as a new segment.
+        Returns the chunk ids given to the chunks.
+        """
+        texts = list(texts)
+        if chunk_indices is None:
+            chunk_indices = range(1, len(texts) + 1)
+
+        with self._lock:
+            if orig_file in self.files:
+                self._delete_rows(orig_file)
+
+            t0 = time.perf_counter()
+            n_terms_before = len(self.terms)
+            try:
+                tf, doc_lengths, new_terms = self._count(texts)
+            except Exception:
+                # roll back terms of the failed add
+                for t in self.terms[n_terms_before:]:
+                    del self.vocabulary[t]
+                del self.terms[n_terms_before:]
+                raise
+
+            chunk_ids = np.arange(self.next_chunk_id, self.next_chunk_id + len(texts))
+            chunks = pd.DataFrame({
+                "chunk_id": chunk_ids,
+                "orig_file": orig_file,
+                "chunk_index": list(chunk_indices),
+                "country": infer_country(orig_file),
+            })
+
+            seg = Segment(f"seg_{self.next_segment:06d}", tf, doc_lengths, chunks)
+            seg.write(self.folder / seg.name)
+            if new_terms:
+                with open(self.folder / VOCAB_FILE, "a", encoding="utf-8") as f:
+                    f.write("".join(t + "\n" for t in new_terms))
+
+            self.segments.append(seg)
+            self._file_segments.setdefault(orig_file, set()).add(seg.name)
+            self.files[orig_file] = file_hash or hash_texts(texts)
+            self.next_segment += 1
+            self.next_chunk_id += len(texts)
+
+            self._grow(len(self.terms))
+            self._apply_stats(seg, np.arange(seg.n_docs), +1)
+            self._commit()
+
+            self.last_add_seconds = time.perf_counter() - t0
+
+        self.maybe_merge()
+        return chunk_ids.tolist()
+
+    def _delete_rows(self, orig_file: str):
+        for name in sorted(self._file_segments.pop(orig_file, ())):
+            seg = next(s for s in self.segments if s.name == name)
+            rows = np.where((seg.chunks["orig_file"].to_numpy() == orig_file) & ~seg.deleted)[0]
+            self._apply_stats(seg, rows, -1)
+            seg.deleted[rows] = True
+            seg.save_deleted(self.folder / seg.name)
+        self.files.pop(orig_file, None)
+
+    def delete_file(self, orig_file: str):
+        """Tombstones all chunks of one original file."""
+        with self._lock:
+            if orig_file not in self.files:
+                return False
+            self._delete_rows(orig_file)
+            self._commit()
+        return True
+
+    def _commit(self):
+        """index.json is the commit point: written last, atomically."""
+        state = {
+            "params": self.params,
+            "n_terms": len(self.terms),
+            "segments": [s.name for s in self.segments],
+            "next_segment": self.next_segment,
+            "next_chunk_id": self.next_chunk_id,
+            "files": self.files,
+        }
+        tmp = self.folder / (INDEX_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.folder / INDEX_FILE)
+
+    # ----------------------------------------------------
+    # Merging
+    # ----------------------------------------------------
+    def _pick_merge_window(self):
+        """The merge_factor adjacent segments with the fewest live chunks."""
+        n = min(self.merge_factor, len(self.segments))
+        sizes = [s.n_live for s in self.segments]
+        start = min(range(len(sizes) - n + 1), key=lambda i: sum(sizes[i:i + n]))
+        return self.segments[start:start + n]
+
+    def merge_once(self):
+        """Merges one window of adjacent segments into one (deleted chunks are dropped)."""
+        with self._merge_lock:
+            with self._lock:
+                if len(self.segments) < 2:
+                    return False
+                window = self._pick_merge_window()
+                deleted_before = [s.deleted.copy() for s in window]
+                width = len(self.terms)
+                name = f"seg_{self.next_segment:06d}"
+                self.next_segment += 1
+
+            # heavy part without the lock: adds and searches keep running
+            live = [np.where(~d)[0] for d in deleted_before]
+            tf = vstack([_with_width(s.tf[rows], width) for s, rows in zip(window, live)], format="csr")
+            doc_lengths = np.concatenate([s.doc_lengths[rows] for s, rows in zip(window, live)])
+            chunks = pd.concat([s.chunks.iloc[rows] for s, rows in zip(window, live)], ignore_index=True)
+            merged = Segment(name, tf, doc_lengths, chunks)
+            merged.write(self.folder / name)
+
+            with self._lock:
+                # chunks deleted while the merge was running
+                newly_deleted = np.concatenate([
+                    s.deleted[rows] for s, rows in zip(window, live)
+                ]) if len(chunks) else np.zeros(0, dtype=bool)
+                if newly_deleted.any():
+                    merged.deleted = newly_deleted
+                    merged.save_deleted(self.folder / name)
+
+                start = self.segments.index(window[0])
+                self.segments[start:start + len(window)] = [merged]
+
+                old_names = {s.name for s in window}
+                for orig_file, names in self._file_segments.items():
+                    if names & old_names:
+                        names -= old_names
+                        names.add(name)
+                self._commit()
+
+        for s in window:
+            shutil.rmtree(self.folder / s.name, ignore_errors=True)
+        return True
+
+    def _merge_loop(self):
+        while len(self.segments) > self.max_segments and self.merge_once():
+            pass
+
+    def maybe_merge(self, background: bool = True):
+        """Starts a merge when there are more than max_segments segments."""
+        if len(self.segments) <= self.max_segments:
+            return
+        if not background:
+            self._merge_loop()
+            return
+        if self._merge_thread is None or not self._merge_thread.is_alive():
+            self._merge_thread = threading.Thread(target=self._merge_loop, daemon=True)
+            self._merge_thread.start()
+
+    def wait_for_merges(self):
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+
+    def optimize(self):
+        """Merges everything into one segment."""
+        self.wait_for_merges()
+        while len(self.segments) > 1:
+            saved = self.merge_factor
+            self.merge_factor = len(self.segments)
+            try:
+                self.merge_once()
+            finally:
+                self.merge_factor = saved
+
+    # ----------------------------------------------------
+    # Search
+    # ----------------------------------------------------
+    def query_terms(self, query: str):
+        """(term_ids, query_tf) of the known query terms (same analyzer as the chunks)."""
+        ids = [self.vocabulary[t] for t in self._analyzer(query) if t in self.vocabulary]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        term_ids, counts = np.unique(ids, return_counts=True)
+        return term_ids, counts.astype(np.float64)
+
+    def search(self, query: str, k: int = 10):
+        """Top-k [(chunk_id, score), ...]; BM25 weights from the current global statistics."""
+        with self._lock:
+            segments = list(self.segments)
+            idf = self.idf()
+            avg = self.avg_doc_length if self.avg_doc_length > 0 else 1.0
+            term_ids, q_tf = self.query_terms(query)
+
+        k1, b = self.params["k1"], self.params["b"]
+        keep = idf[term_ids] > 0
+        term_ids, q_weight = term_ids[keep], q_tf[keep] * idf[term_ids[keep]]
+
+        candidates = []
+        for seg in segments:
+            csc = seg.csc()
+            norm = k1 * (1 - b + b * seg.doc_lengths / avg)
+            scores = np.zeros(seg.n_docs, dtype=np.float64)
+
+            for t, w in zip(term_ids, q_weight):
+                if t >= csc.shape[1]:
+                    continue
+                start, end = csc.indptr[t], csc.indptr[t + 1]
+                rows, tf = csc.indices[start:end], csc.data[start:end]
+                scores[rows] += w * tf * (k1 + 1) / (tf + norm[rows])
+
+            scores[seg.deleted] = 0.0
+            top = top_k_indices(scores, k)
+            top = top[scores[top] > 0]
+            chunk_ids = seg.chunks["chunk_id"].to_numpy()
+            candidates.extend((float(scores[i]), int(chunk_ids[i])) for i in top)
+
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        return [(chunk_id, score) for score, chunk_id in candidates[:k]]
+
+    # ----------------------------------------------------
+    # Export
+    # ----------------------------------------------------
+    def _live_rows(self):
+        """(tf, doc_lengths, chunks) of the live chunks in chunk_id order, plus the kept-term mask."""
+        with self._lock:
+            width = len(self.terms)
+            parts = [(s, np.where(~s.deleted)[0]) for s in self.segments]
+            kept = self.kept_terms().copy()
+            df, n_docs = self.df.copy(), self.n_docs
+
+        tf = vstack([_with_width(s.tf[rows], width) for s, rows in parts], format="csr")
+        doc_lengths = np.concatenate([s.doc_lengths[rows] for s, rows in parts])
+        chunks = pd.concat([s.chunks.iloc[rows] for s, rows in parts], ignore_index=True)
+        return tf, doc_lengths, chunks, kept, df, n_docs
+
+    def _alphabetical(self, term_ids):
+        return term_ids[np.argsort(np.asarray(self.terms, dtype=object)[term_ids], kind="stable")]
+
+    def to_bm25_matrix(self, dtype=np.float64):
+        """
+        (X_bm25, feature_names, chunks) over the live chunks in chunk_id order,
+        with the columns in the alphabetical order of build_bm25_matrix.
+        """
+        tf, doc_lengths, chunks, kept, df, n_docs = self._live_rows()
+
+        kept = self._alphabetical(np.where(kept)[0])
+        counts = tf[:, kept]
+        counts.sort_indices()
+
+        avg = doc_lengths.mean() if len(doc_lengths) else 0.0
+        idf = bm25_idf(df[kept], n_docs, self.params["idf_variant"])
+        tf_matrix = csr_matrix((counts.data.astype(dtype), counts.indices, counts.indptr), shape=counts.shape)
+        X = BM25Transformer(k1=self.params["k1"], b=self.params["b"]).fit_transform(
+            tf_matrix, doc_lengths, avg if avg > 0 else 1.0, idf, copy=False
+        )
+        X.eliminate_zeros()
+
+        feature_names = np.asarray(self.terms, dtype=object)[kept]
+        return X, feature_names, chunks
+
+    def raw_counts(self):
+        """
+        (counts, terms, chunks): raw counts of the live chunks in chunk_id order
+        over every term that occurs in them, columns in alphabetical order –
+        what CountVectorizer gives for the same chunks, so
+        BM25Vectorizer._fit_counts turns it into a fitted vectorizer.
+        """
+        tf, _, chunks, _, df, _ = self._live_rows()
+
+        present = self._alphabetical(np.where(df > 0)[0])
+        counts = tf[:, present].astype(np.int64)
+        counts.sort_indices()
+        return counts, np.asarray(self.terms, dtype=object)[present], chunks
+
+
+# ----------------------------------------------------
+# Sync with a chunk folder
+# ----------------------------------------------------
+def hash_texts(texts):
+    h = hashlib.sha256()
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def iter_file_chunks(chunks_root: str | Path):
+    """(orig_file, chunk_indices, texts) per original file, empty chunks skipped like the loaders."""
+    chunks_root = Path(chunks_root)
+
+    if store_exists(chunks_root):
+        with ChunkStore(chunks_root) as store:
+            for file_id, info in enumerate(store.files):
+                rows = np.where(store.index["file_id"] == file_id)[0]
+                pairs = [(int(store.index["chunk_index"][i]), store.text(i)) for i in rows]
+                pairs = [(i, t) for i, t in pairs if t.strip() != ""]
+                yield info["orig_file"], [i for i, _ in pairs], [t for _, t in pairs]
+        return
+
+    df = load_chunk_documents(chunks_root)
+    for orig_file, group in df.groupby("orig_file", sort=False, observed=True):
+        yield orig_file, list(range(1, len(group) + 1)), group["text"].tolist()
+
+
+def sync_from_chunks(index: SegmentedBM25Index, chunks_root: str | Path):
+    """Adds new / changed files of a chunk folder to the index and deletes removed ones."""
+    seen, added, updated = set(), 0, 0
+    add_seconds = []
+
+    for orig_file, chunk_indices, texts in iter_file_chunks(chunks_root):
+        seen.add(orig_file)
+        file_hash = hash_texts(texts)
+        if index.files.get(orig_file) == file_hash:
+            continue
+
+        updated += orig_file in index.files
+        added += orig_file not in index.files
+        index.add_file(orig_file, texts, chunk_indices, file_hash=file_hash)
+        add_seconds.append(index.last_add_seconds)
+
+    removed = [f for f in list(index.files) if f not in seen]
+    for orig_file in removed:
+        index.delete_file(orig_file)
+
+    print(f"✅ Synced {chunks_root}: {added} added, {updated} updated, {len(removed)} removed")
+    if add_seconds:
+        print(f"   • add latency per file: median {np.median(add_seconds) * 1000:.1f} ms, "
+              f"max {max(add_seconds) * 1000:.1f} ms")
+    print(f"   • {index.n_docs} chunks, {len(index.terms)} terms, {len(index.segments)} segments")
+    return added, updated, len(removed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental (segmented) BM25 index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_sync = sub.add_parser("sync", help="add new / changed files of a chunk folder to an existing index")
+    p_sync.add_argument("index_folder")
+    p_sync.add_argument("chunks_root")
+
+    p_search = sub.add_parser("search")
+    p_search.add_argument("index_folder")
+    p_search.add_argument("query")
+    p_search.add_argument("-k", type=int, default=10)
+
+    p_merge = sub.add_parser("optimize", help="merge all segments into one")
+    p_merge.add_argument("index_folder")
+
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        # new indexes are created by build_bm25_for_chunks.py --incremental (BM25 constants + stop words)
+        index = SegmentedBM25Index.open(args.index_folder)
+        sync_from_chunks(index, args.chunks_root)
+        index.wait_for_merges()
+    elif args.command == "search":
+        index = SegmentedBM25Index.open(args.index_folder)
+        print(f"\n🔎 Query: {args.query}")
+        for rank, (chunk_id, score) in enumerate(index.search(args.query, k=args.k), start=1):
+            print(f"{rank:3d}. chunk {chunk_id:6d}  score={score:.4f}")
+    else:
+        index = SegmentedBM25Index.open(args.index_folder)
+        index.optimize()
+        print(f"✅ {len(index.segments)} segment(s), {index.n_docs} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,75 +11,446 @@ build_bm25_for_chunks.py
     bm25_chunks_outputs/
         fixed/
             X_bm25_chunks.npz
-            chunks_metadata.csv
-            ...
+            mmap/                      (memory-mappable arrays, bm25_mmap.py)
+            chunks_metadata.arrow      (+ chunks_metadata_text.arrow,
+            ...                         or chunks_metadata.csv without pyarrow)
         hierarchical/
             X_bm25_chunks.npz
-            chunks_metadata.csv
+            chunks_metadata.arrow
             ...
 """
 
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
 
+import bm25_core
 from bm25_core import (
     get_nltk_stopwords,
-    load_chunk_documents,
+    BM25Vectorizer,
+    ChunkDocumentStream,
+    chunk_input_files,
     build_bm25_matrix,
+    bm25_matrix_stats,
     save_bm25_outputs,
 )
+from bm25_hashing import HASHED_SUBDIR, build_bm25_hashed
+from bm25_mmap import MMAP_FILES
+from bm25_search import STALE_MARKER_NAME
+from bm25_segments import SegmentedBM25Index, sync_from_chunks
+from section_search import SECTION_FILES, SECTIONS_SUBDIR, build_section_index, has_section_tree
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from build_manifest import BuildManifest
+from metadata_store import resolve_format, table_files, write_table
+
+
+BM25_MIN_DF = 5
+BM25_MAX_DF = 0.95
+BM25_MAX_FEATURES = 20000
+BM25_IDF_VARIANT = "okapi"
+BM25_DTYPE = np.float32
+BM25_METADATA_FORMAT = "auto"   # metadata_store.py: Arrow if pyarrow is installed, else CSV
+
+# + the chunks_metadata files (metadata_store.table_files)
+BM25_OUTPUT_FILES = (
+    "X_bm25_chunks.npz",
+    "bm25_feature_names.txt",
+    "bm25_stats.csv",
+    "bm25_params.json",
+) + MMAP_FILES
+
+BUILD_TIMES_NAME = "bm25_build_times.json"
 
+# subdir_name -> chunks root; every entry is an independent build
+DEFAULT_OUTPUT_ROOT = "bm25_chunks_outputs"
+CORPORA = {
+    "fixed": "chunks_output",                # מהchunk_fixed_overlap
+    "hierarchical": "hierarchical_chunks",   # מהhierarchical_chunk
+}
 
-def run_for_chunks(chunks_root: str | Path, out_parent: str | Path, subdir_name: str):
+
+def run_for_chunks(
+    chunks_root: str | Path,
+    out_parent: str | Path,
+    subdir_name: str,
+    force: bool = False,
+    fit_jobs: int = 1,
+):
     """
     מריץ BM25 עבור תיקיית צ'אנקים אחת ושומר בתיקיית־בן בתוך out_parent.
+
+    אם הצ'אנקים, הפרמטרים והקוד לא השתנו מאז הריצה הקודמת (build manifest
+    בתיקיית הפלט) – מדלג. force=True בונה מחדש בכל מקרה.
+
+    fit_jobs > 1 tokenizes + counts the chunks in that many processes
+    (bm25_core.count_sharded); the outputs are identical.
+
+    Returns the wall time of every phase in seconds ({} when skipped).
     """
+    t0 = time.perf_counter()
+    timings = {}
     chunks_root = Path(chunks_root)
     out_parent = Path(out_parent)
     output_folder = out_parent / subdir_name
+    metadata_format = resolve_format(BM25_METADATA_FORMAT)
 
     print("\n" + "=" * 80)
     print(f"🚀 Running BM25 for chunks in: {chunks_root}")
     print(f"   Output will be saved to: {output_folder}")
     print("=" * 80)
 
-    # 1. Load chunks
-    df_chunks = load_chunk_documents(chunks_root)
-    if df_chunks.empty:
-        print(f"❌ No chunks loaded from {chunks_root}. Skipping.")
-        return
-
-    df_chunks = df_chunks.reset_index(drop=True)
-    df_chunks["row_index"] = df_chunks.index  # mapping row -> chunk
-
-    # 2. Build BM25
-    documents = df_chunks["text"].tolist()
+    manifest = BuildManifest(
+        output_folder,
+        "bm25_chunks",
+        params={
+            "min_df": BM25_MIN_DF,
+            "max_df": BM25_MAX_DF,
+            "max_features": BM25_MAX_FEATURES,
+            "idf_variant": BM25_IDF_VARIANT,
+            "dtype": np.dtype(BM25_DTYPE).name,
+            "metadata_format": metadata_format,
+        },
+        code_files=[__file__, bm25_core.__file__],
+    )
+    inputs = chunk_input_files(chunks_root) if chunks_root.exists() else []
+    outputs = [output_folder / name for name in BM25_OUTPUT_FILES]
+    outputs += table_files(output_folder, "chunks_metadata", metadata_format)
+    with_sections = chunks_root.exists() and has_section_tree(chunks_root)
+    if with_sections:
+        outputs += [output_folder / name for name in SECTION_FILES]
+        outputs += table_files(output_folder / SECTIONS_SUBDIR, "sections_metadata", metadata_format, with_texts=False)
+    stale = (output_folder / STALE_MARKER_NAME).exists()  # an incremental sync changed the corpus since
+    if not force and not stale and inputs and manifest.is_fresh(subdir_name, inputs, outputs):
+        print(f"⏭️  Chunks unchanged since the last build – skipping {subdir_name}")
+        return timings
 
-    BM25_MIN_DF = 5
-    BM25_MAX_DF = 0.95
-    BM25_MAX_FEATURES = 20000
+    # 1. Stream chunks (texts are read lazily, metadata is collected on the way)
+    stream = ChunkDocumentStream(chunks_root)
+    if not stream.has_chunks():
+        print(f"❌ No chunks loaded from {chunks_root}. Skipping.")
+        return timings
+    timings["check"] = time.perf_counter() - t0
 
+    # 2. Build BM25 straight from the stream (reading the chunks happens here)
+    t0 = time.perf_counter()
     nltk_stopwords = get_nltk_stopwords()
 
     X_bm25, feature_names, vectorizer, stats = build_bm25_matrix(
-        documents=documents,
+        documents=stream,
         stopwords_set=nltk_stopwords,
         min_df=BM25_MIN_DF,
         max_df=BM25_MAX_DF,
         max_features=BM25_MAX_FEATURES,
         matrix_name=f"BM25-CHUNKS-{subdir_name.upper()}",
+        idf_variant=BM25_IDF_VARIANT,
+        dtype=BM25_DTYPE,
+        n_jobs=fit_jobs,
+        keep_counts=with_sections,
     )
 
-    # 3. Save outputs
+    df_chunks = stream.metadata
+    df_chunks["row_index"] = df_chunks.index  # mapping row -> chunk
+    timings["load+vectorize"] = time.perf_counter() - t0
+
+    # 3. Save outputs (texts for chunks_metadata are streamed a second time)
     save_bm25_outputs(
         output_folder=output_folder,
         X_bm25=X_bm25,
         feature_names=feature_names,
         stats=stats,
         df_chunks=df_chunks,
+        vectorizer=vectorizer,
+        texts=stream,
+        metadata_format=metadata_format,
     )
+    timings["save"] = time.perf_counter() - t0 - timings["load+vectorize"]
+
+    # 4. Section-level BM25 (section_search.py) when the chunker wrote a section tree
+    if with_sections:
+        t0 = time.perf_counter()
+        build_section_index(output_folder, chunks_root, vectorizer, df_chunks, metadata_format)
+        timings["sections"] = time.perf_counter() - t0
+
+    (output_folder / STALE_MARKER_NAME).unlink(missing_ok=True)
+
+    manifest.record(subdir_name, inputs, outputs)
+    manifest.save()
+
+    # read by bench_retrieval.py (build time of the index)
+    with open(output_folder / BUILD_TIMES_NAME, "w", encoding="utf-8") as f:
+        json.dump({**timings, "fit_jobs": fit_jobs}, f, indent=2)
+
+    return timings
+
+
+def run_incremental_for_chunks(chunks_root: str | Path, out_parent: str | Path, subdir_name: str,
+                               write_back: bool = False):
+    """
+    כמו run_for_chunks, אבל מעדכן אינדקס מחולק ל-segments (bm25_segments.py):
+    רק קבצים חדשים / ששונו עוברים טוקניזציה, בלי fit מחדש של כל הקורפוס.
+
+    The segments answer queries right away (bm25_segments.py search). The
+    regular outputs (X_bm25_chunks.npz, mmap/, chunks_metadata, sections/)
+    hold the whole corpus, so rewriting them costs a full pass – they are only
+    written back with write_back=True (--write-back). Until then a sync that
+    changed something leaves STALE_MARKER_NAME next to them and BM25Searcher
+    (and so bench_retrieval.py / SectionSearcher) refuses the old matrix.
+    """
+    t0 = time.perf_counter()
+    output_folder = Path(out_parent) / subdir_name
+
+    print("\n" + "=" * 80)
+    print(f"🚀 Incremental BM25 update for chunks in: {chunks_root}")
+    print(f"   Segments: {output_folder}")
+    print("=" * 80)
+
+    index = SegmentedBM25Index.open_or_create(
+        output_folder,
+        min_df=BM25_MIN_DF,
+        max_df=BM25_MAX_DF,
+        max_features=BM25_MAX_FEATURES,
+        idf_variant=BM25_IDF_VARIANT,
+        stop_words=get_nltk_stopwords(),
+    )
+    changes = sync_from_chunks(index, chunks_root)
+    timings = {"sync": time.perf_counter() - t0}
+    index.wait_for_merges()
+    timings["merge"] = time.perf_counter() - t0 - timings["sync"]
+
+    stale_path = output_folder / STALE_MARKER_NAME
+    if any(changes):
+        with open(stale_path, "w", encoding="utf-8") as f:
+            json.dump(dict(zip(("added", "updated", "removed"), changes)), f, indent=2)
+
+    if not stale_path.exists():
+        print(f"⏭️  Segments unchanged – the outputs of {subdir_name} are up to date")
+    elif write_back:
+        t0 = time.perf_counter()
+        write_segments_back(index, chunks_root, output_folder, subdir_name)
+        timings["write_back"] = time.perf_counter() - t0
+    else:
+        print(f"⚠️  Outputs of {subdir_name} are stale until --write-back (or a full build)")
+    return timings
+
+
+def write_segments_back(index: SegmentedBM25Index, chunks_root: str | Path, output_folder: Path, subdir_name: str):
+    """
+    Writes the matrix of a synced segmented index to the outputs of
+    run_for_chunks. The rows follow ChunkDocumentStream order (like a full
+    build), so the texts of chunks_metadata are streamed from chunks_root.
+    """
+    stream = ChunkDocumentStream(chunks_root, progress=False)
+    for _ in stream:  # first pass: the metadata in row order
+        pass
+    df_chunks = stream.metadata
+    if df_chunks.empty:
+        print(f"❌ No chunks loaded from {chunks_root}. Nothing to write back.")
+        return
+
+    counts, terms, chunks = index.raw_counts()
+
+    # the same chunk on both sides: (orig_file, position among the file's non-empty chunks)
+    def keys(df):
+        orig_files = df["orig_file"].astype(str)
+        return pd.MultiIndex.from_arrays([orig_files, orig_files.groupby(orig_files).cumcount()])
+
+    rows = keys(chunks).get_indexer(keys(df_chunks))
+    if len(chunks) != len(df_chunks) or (rows < 0).any():
+        raise RuntimeError(f"Segmented index in {output_folder} is out of sync with {chunks_root}")
+
+    p = index.params
+    vectorizer = BM25Vectorizer(
+        k1=p["k1"],
+        b=p["b"],
+        idf_variant=p["idf_variant"],
+        min_df=p["min_df"],
+        max_df=p["max_df"],
+        max_features=p["max_features"],
+        stop_words=p["stop_words"],
+        lowercase=p["lowercase"],
+        token_pattern=p["token_pattern"],
+        dtype=BM25_DTYPE,
+    )
+    with_sections = has_section_tree(chunks_root)
+    X_bm25 = vectorizer._fit_counts(counts[rows], terms, keep_counts=with_sections)
+    stats = bm25_matrix_stats(X_bm25, vectorizer, f"BM25-CHUNKS-{subdir_name.upper()}")
+
+    metadata_format = resolve_format(BM25_METADATA_FORMAT)
+    df_chunks["row_index"] = df_chunks.index
+    save_bm25_outputs(
+        output_folder=output_folder,
+        X_bm25=X_bm25,
+        feature_names=vectorizer.get_feature_names_out(),
+        stats=stats,
+        df_chunks=df_chunks,
+        vectorizer=vectorizer,
+        texts=stream,
+        metadata_format=metadata_format,
+    )
+    if with_sections:
+        build_section_index(output_folder, chunks_root, vectorizer, df_chunks, metadata_format)
+    (output_folder / STALE_MARKER_NAME).unlink(missing_ok=True)
+
+
+def run_hashed_for_chunks(chunks_root: str | Path, out_parent: str | Path, subdir_name: str):
+    """
+    בנייה out-of-core עם feature hashing (bm25_hashing.py): הצ'אנקים עוברים
+    ב-batches, המטריצה נכתבת כ-shards לדיסק, ואין תקרת max_features.
+    """
+    timings = {}
+    output_folder = Path(out_parent) / subdir_name
+
+    print("\n" + "=" * 80)
+    print(f"🚀 Out-of-core (hashed) BM25 for chunks in: {chunks_root}")
+    print(f"   Output will be saved to: {output_folder / HASHED_SUBDIR}")
+    print("=" * 80)
+
+    stream = ChunkDocumentStream(chunks_root)
+    if not stream.has_chunks():
+        print(f"❌ No chunks loaded from {chunks_root}. Skipping.")
+        return timings
+
+    stats = build_bm25_hashed(
+        stream,
+        output_folder,
+        stopwords_set=get_nltk_stopwords(),
+        min_df=BM25_MIN_DF,
+        max_df=BM25_MAX_DF,
+        idf_variant=BM25_IDF_VARIANT,
+        dtype=BM25_DTYPE,
+        matrix_name=f"BM25-CHUNKS-{subdir_name.upper()}-HASHED",
+    )
+
+    timings["load+count"] = stats["count_seconds"]
+    timings["weight"] = stats["weight_seconds"]
+
+    t0 = time.perf_counter()
+    df_chunks = stream.metadata
+    df_chunks["row_index"] = df_chunks.index  # mapping row -> chunk
+    write_table(
+        output_folder / HASHED_SUBDIR, "chunks_metadata", df_chunks, stream,
+        metadata_format=BM25_METADATA_FORMAT, categorical=["country", "orig_file"],
+    )
+    pd.DataFrame([stats]).to_csv(output_folder / HASHED_SUBDIR / "bm25_stats.csv", index=False)
+    timings["save"] = time.perf_counter() - t0
+
+    return timings
+
+
+# ----------------------------------------------------
+# Scheduler: independent corpora in a process pool
+# ----------------------------------------------------
+def _run_corpus(run, chunks_root, out_parent, subdir_name):
+    t0 = time.perf_counter()
+    timings = run(chunks_root=chunks_root, out_parent=out_parent, subdir_name=subdir_name) or {}
+    return subdir_name, timings, time.perf_counter() - t0
+
+
+def _corpus_size(chunks_root):
+    root = Path(chunks_root)
+    if not root.exists():
+        return 0
+    return sum(Path(p).stat().st_size for p in chunk_input_files(root))
+
+
+def run_corpora(corpora: dict, out_parent: str | Path, run=run_for_chunks, jobs: int | None = None):
+    """
+    corpora: {subdir_name: chunks_root}; the builds share nothing, so with
+    jobs > 1 they run in separate processes and one corpus is read from disk
+    while another is being vectorized. The largest corpus is submitted first.
+
+    Returns {subdir_name: {phase: seconds, ..., "total": seconds}} and prints
+    the per-phase wall times. A corpus that fails is reported and left out;
+    the other builds still run.
+    """
+    out_parent = Path(out_parent)
+    out_parent.mkdir(parents=True, exist_ok=True)
+    jobs = min(jobs or os.cpu_count() or 1, len(corpora)) or 1
+
+    # largest first: it bounds the wall time, so it should start right away
+    order = sorted(corpora, key=lambda name: -_corpus_size(corpora[name]))
+
+    t0 = time.perf_counter()
+    results = {}
+    failed = {}
+    if jobs == 1:
+        for name in order:
+            try:
+                _, timings, total = _run_corpus(run, corpora[name], out_parent, name)
+                results[name] = {**timings, "total": total}
+            except Exception as e:
+                failed[name] = e
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(_run_corpus, run, corpora[name], out_parent, name): name for name in order}
+            for future in as_completed(futures):
+                try:
+                    _, timings, total = future.result()
+                    results[futures[future]] = {**timings, "total": total}
+                except Exception as e:
+                    failed[futures[future]] = e
+    wall = time.perf_counter() - t0
+
+    print(f"\n⏱️  Build times ({jobs} parallel jobs)")
+    for name in order:
+        if name in failed:
+            print(f"   • {name:14s} ❌ failed: {failed[name]}")
+            continue
+        phases = ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in results[name].items() if phase != "total")
+        print(f"   • {name:14s} total {results[name]['total']:6.1f}s  ({phases or 'skipped'})")
+    print(f"   • wall time: {wall:.1f}s (sum of builds: {sum(r['total'] for r in results.values()):.1f}s)")
+
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description="BM25 for chunks (fixed + hierarchical)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="update the segmented index (bm25_segments.py) instead of a full rebuild",
+    )
+    mode.add_argument(
+        "--hashing",
+        action="store_true",
+        help="out-of-core build with feature hashing (bm25_hashing.py), no max_features cap",
+    )
+    parser.add_argument(
+        "--write-back",
+        action="store_true",
+        help="with --incremental: also rewrite X_bm25_chunks.npz, mmap/ and sections/ from the segments",
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_ROOT)
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        default=[],
+        metavar="NAME=CHUNKS_ROOT",
+        help="extra (or replaced) chunking variant to index, e.g. sentences=sentence_chunks",
+    )
+    parser.add_argument("--jobs", type=int, default=None, help="corpora built at the same time (default: all cores)")
+    parser.add_argument("--fit-jobs", type=int, default=1,
+                        help="processes that tokenize + count the chunks of ONE corpus (full build only)")
+    args = parser.parse_args()
+    if args.write_back and not args.incremental:
+        parser.error("--write-back only applies to --incremental")
+    if args.incremental:
+        run = partial(run_incremental_for_chunks, write_back=args.write_back)
+    elif args.hashing:
+        run = run_hashed_for_chunks
+    else:
+        run = partial(run_for_chunks, fit_jobs=args.fit_jobs)
+
     print("""
 ╔══════════════════════════════════════════════════════════════╗
 ║   BM25 for CHUNKS (fixed + hierarchical)                     ║
@@ -87,30 +458,14 @@ def main():
 ╚══════════════════════════════════════════════════════════════╝
     """)
 
-    # תיקיית־על לכל הפלטים של BM25 לצ'אנקים
-    DEFAULT_OUTPUT_ROOT = "bm25_chunks_outputs"
-
-    # תיקיות הצ'אנקים:
-    FIXED_CHUNKS_ROOT = "chunks_output"         # מהchunk_fixed_overlap
-    HIER_CHUNKS_ROOT = "hierarchical_chunks"    # מהhierarchical_chunk
-
-    # אפשר לשנות אם צריך, או להפוך לקלט מהמשתמש
-    output_root = Path(DEFAULT_OUTPUT_ROOT)
-    output_root.mkdir(parents=True, exist_ok=True)
+    corpora = dict(CORPORA)
+    for spec in args.corpus:
+        name, _, root = spec.partition("=")
+        if not name or not root:
+            parser.error(f"--corpus expects NAME=CHUNKS_ROOT, got {spec!r}")
+        corpora[name] = root
 
-    # 1. חלוקה קבועה (fixed / overlap)
-    run_for_chunks(
-        chunks_root=FIXED_CHUNKS_ROOT,
-        out_parent=output_root,
-        subdir_name="fixed",
-    )
-
-    # 2. חלוקה היררכית
-    run_for_chunks(
-        chunks_root=HIER_CHUNKS_ROOT,
-        out_parent=output_root,
-        subdir_name="hierarchical",
-    )
+    run_corpora(corpora, args.output, run, args.jobs)
 
     print("\n🎉 All BM25 chunk runs completed!")
 
@@ -0,0 +1,406 @@
+"""
+dense_index.py
+==============
+
+שלב ה-Embeddings לצ'אנקים: קידוד ב-batches על CPU, cache על הדיסק כ-float16
+memmap, ואינדקס ANN (HNSW או IVF) לחיפוש מהיר.
+
+Layout (<index_folder>/embeddings/, next to the BM25 artifacts of the same
+chunks, so row i is chunk row i of X_bm25_chunks.npz):
+
+    vectors.f16          raw float16 matrix (n_chunks x dim), L2-normalized;
+                         written batch by batch, read back with np.memmap
+    meta.json            model, dim, n_chunks
+    ivf/                 IVF index: centroids.npy, list_offsets.npy, list_ids.npy
+    hnsw.bin             HNSW graph (only with hnswlib installed)
+
+At most one ANN index exists: re-encoding (new vectors.f16) and building an
+index of either kind remove the old ones.
+
+Optional dependencies (imported only when used):
+    sentence-transformers   the encoder (pip install sentence-transformers)
+    hnswlib                 HNSW; without it the pure-numpy IVF index is used
+
+    python scripts/vectorization/dense_index.py build --chunks chunks_output --index bm25_chunks_outputs/fixed
+    python scripts/vectorization/dense_index.py search --index bm25_chunks_outputs/fixed "energy prices"
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bm25_core import ChunkDocumentStream, chunk_input_files
+from bm25_search import top_k_indices
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from build_manifest import BuildManifest
+
+
+EMB_SUBDIR = "embeddings"
+VECTORS_NAME = "vectors.f16"
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ANN_KINDS = ("auto", "hnsw", "ivf", "exact")
+
+
+# ----------------------------------------------------
+# Encoder
+# ----------------------------------------------------
+def have_hnswlib() -> bool:
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SentenceEncoder:
+    """sentence-transformers model on CPU; encode() returns L2-normalized float32 rows."""
+
+    def __init__(self, model_name=DEFAULT_MODEL, device="cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The embedding stage needs sentence-transformers (pip install sentence-transformers)") from e
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+
+def _normalize(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1.0)
+
+
+# ----------------------------------------------------
+# Embedding cache (float16 memmap)
+# ----------------------------------------------------
+def encode_chunks(chunks_root, index_folder, encoder, batch_size=64, force=False):
+    """
+    Encodes every chunk of chunks_root (ChunkDocumentStream order == BM25 row
+    order) in batches and appends the float16 rows to vectors.f16. Nothing is
+    encoded when the chunks, the model and the code did not change.
+    Returns the (read-only) memmap.
+    """
+    folder = Path(index_folder) / EMB_SUBDIR
+    folder.mkdir(parents=True, exist_ok=True)
+    model_name = getattr(encoder, "model_name", type(encoder).__name__)
+
+    manifest = BuildManifest(folder, "embeddings", params={"model": model_name}, code_files=[__file__])
+    inputs = chunk_input_files(chunks_root)
+    outputs = [folder / VECTORS_NAME, folder / "meta.json"]
+    if not force and manifest.is_fresh("vectors", inputs, outputs):
+        print(f"⏭️  Embeddings unchanged – {folder / VECTORS_NAME}")
+        return open_embeddings(index_folder)
+
+    print(f"\n🧠 Encoding chunks of {chunks_root} with {model_name} (batch_size={batch_size})")
+    t0 = time.perf_counter()
+    tmp_path = folder / (VECTORS_NAME + ".tmp")
+    n, dim = 0, None
+
+    with open(tmp_path, "wb") as f:
+        batch = []
+        for text in ChunkDocumentStream(chunks_root, progress=False):
+            batch.append(text)
+            if len(batch) == batch_size:
+                dim = _write_batch(f, encoder, batch, batch_size)
+                n += len(batch)
+                batch = []
+        if batch:
+            dim = _write_batch(f, encoder, batch, batch_size)
+            n += len(batch)
+
+    # an ANN index of the old vectors would return wrong rows for the new ones
+    remove_ann_indexes(index_folder)
+    os.replace(tmp_path, folder / VECTORS_NAME)
+    meta = {"model": model_name, "dim": dim or 0, "n_chunks": n, "dtype": "float16", "normalized": True}
+    with open(folder / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    manifest.record("vectors", inputs, outputs)
+    manifest.save()
+
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {n} chunks encoded in {elapsed:.1f}s ({n / max(elapsed, 1e-9):.1f} chunks/s), dim {dim}")
+    return open_embeddings(index_folder)
+
+
+def _write_batch(f, encoder, batch, batch_size):
+    vectors = _normalize(encoder.encode(batch, batch_size=batch_size))
+    f.write(vectors.astype(np.float16).tobytes())
+    return vectors.shape[1]
+
+
+def open_embeddings(index_folder):
+    """(n_chunks x dim) float16 np.memmap, read-only, plus nothing else in memory."""
+    folder = Path(index_folder) / EMB_SUBDIR
+    with open(folder / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["n_chunks"] == 0:
+        return np.zeros((0, meta["dim"]), dtype=np.float16)
+    return np.memmap(folder / VECTORS_NAME, dtype=np.float16, mode="r", shape=(meta["n_chunks"], meta["dim"]))
+
+
+def embeddings_meta(index_folder):
+    with open(Path(index_folder) / EMB_SUBDIR / "meta.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _scores(vectors, rows, q):
+    """Inner products of q with the given rows (float16 -> float32 per block)."""
+    return np.asarray(vectors[rows], dtype=np.float32) @ q
+
+
+def search_exact(vectors, q, k=10, block_rows=65536):
+    """Brute force top-k [(row, score)] over all rows (used as ground truth)."""
+    q = _normalize(q)
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        scores[start:start + block_rows] = np.asarray(vectors[start:start + block_rows], dtype=np.float32) @ q
+    top = top_k_indices(scores, k)
+    return [(int(i), float(scores[i])) for i in top]
+
+
+# ----------------------------------------------------
+# IVF (pure numpy)
+# ----------------------------------------------------
+class IVFIndex:
+    """
+    Inverted file index: spherical k-means centroids, every row stored in the
+    list of its closest centroid. A query scores the centroids, then only the
+    rows of the n_probe best lists (read from the float16 memmap).
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_iter=10, sample_size=100000, block_rows=65536, seed=0):
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over 0 vectors")
+        n_lists = min(n_lists or max(1, int(4 * np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        sample_rows = np.sort(rng.choice(n, size=min(n, max(sample_size, n_lists)), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():  # re-seed empty lists with random sample rows
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(centroids.astype(np.float32), offsets, order)
+
+    def search(self, vectors, q, k=10, n_probe=8):
+        q = _normalize(q)
+        lists = top_k_indices(self.centroids @ q, n_probe)
+        rows = np.sort(np.concatenate([self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists]))
+        if not len(rows):
+            return []
+        scores = _scores(vectors, rows, q)
+        top = top_k_indices(scores, k)
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def save(self, folder):
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        np.save(folder / "centroids.npy", self.centroids)
+        np.save(folder / "list_offsets.npy", self.list_offsets)
+        np.save(folder / "list_ids.npy", self.list_ids)
+
+    @classmethod
+    def load(cls, folder):
+        folder = Path(folder)
+        return cls(
+            np.load(folder / "centroids.npy"),
+            np.load(folder / "list_offsets.npy"),
+            np.load(folder / "list_ids.npy", mmap_mode="r"),
+        )
+
+
+# ----------------------------------------------------
+# HNSW (hnswlib, optional)
+# ----------------------------------------------------
+class HNSWIndex:
+    """hnswlib graph over the normalized vectors (inner product = cosine)."""
+
+    def __init__(self, index):
+        self.index = index
+
+    @classmethod
+    def build(cls, vectors, M=16, ef_construction=200, block_rows=65536, n_threads=-1):
+        import hnswlib
+
+        n, dim = vectors.shape
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=max(n, 1), ef_construction=ef_construction, M=M)
+        for start in range(0, n, block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            index.add_items(block, np.arange(start, start + len(block)), num_threads=n_threads)
+        return cls(index)
+
+    def search(self, vectors, q, k=10, ef=64):
+        self.index.set_ef(max(ef, k))
+        k = min(k, self.index.get_current_count())
+        if k == 0:
+            return []
+        labels, distances = self.index.knn_query(_normalize(q)[None, :], k=k)
+        return [(int(row), float(1.0 - d)) for row, d in zip(labels[0], distances[0])]
+
+    def save(self, path):
+        self.index.save_index(str(path))
+
+    @classmethod
+    def load(cls, path, dim):
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(str(path))
+        return cls(index)
+
+
+def resolve_ann(kind="auto"):
+    if kind not in ANN_KINDS:
+        raise ValueError(f"Unknown ANN index '{kind}', expected one of {ANN_KINDS}")
+    if kind == "auto":
+        return "hnsw" if have_hnswlib() else "ivf"
+    return kind
+
+
+def remove_ann_indexes(index_folder):
+    """Deletes hnsw.bin and ivf/ – DenseSearcher(ann="auto") must never pick a stale one."""
+    folder = Path(index_folder) / EMB_SUBDIR
+    if (folder / "hnsw.bin").exists():
+        (folder / "hnsw.bin").unlink()
+    if (folder / "ivf").exists():
+        shutil.rmtree(folder / "ivf")
+
+
+def build_ann_index(index_folder, kind="auto", **params):
+    """
+    Builds and saves the ANN index over the cached vectors; returns the index.
+    The index of the other kind (built from older vectors, maybe) is removed.
+    """
+    kind = resolve_ann(kind)
+    folder = Path(index_folder) / EMB_SUBDIR
+    vectors = open_embeddings(index_folder)
+    remove_ann_indexes(index_folder)
+
+    t0 = time.perf_counter()
+    if kind == "hnsw":
+        index = HNSWIndex.build(vectors, **params)
+        index.save(folder / "hnsw.bin")
+    elif kind == "ivf":
+        index = IVFIndex.build(vectors, **params)
+        index.save(folder / "ivf")
+    else:
+        index = None
+    print(f"✅ ANN index ({kind}) over {len(vectors)} vectors in {time.perf_counter() - t0:.1f}s")
+    return index
+
+
+class DenseSearcher:
+    """
+    Query side: encodes the query and searches the ANN index of an index
+    folder (HNSW if present, else IVF, else exact search over the memmap).
+    """
+
+    def __init__(self, index_folder, encoder=None, ann="auto", n_probe=8, ef=64):
+        self.index_folder = Path(index_folder)
+        folder = self.index_folder / EMB_SUBDIR
+        self.meta = embeddings_meta(index_folder)
+        self.vectors = open_embeddings(index_folder)
+        self.encoder = encoder or SentenceEncoder(self.meta["model"])
+        self.n_probe = n_probe
+        self.ef = ef
+
+        if ann == "auto":
+            ann = "hnsw" if (folder / "hnsw.bin").exists() and have_hnswlib() else (
+                "ivf" if (folder / "ivf").exists() else "exact")
+        self.ann = ann
+        if ann == "hnsw":
+            self.index = HNSWIndex.load(folder / "hnsw.bin", self.meta["dim"])
+        elif ann == "ivf":
+            self.index = IVFIndex.load(folder / "ivf")
+        else:
+            self.index = None
+
+    def encode_query(self, query: str):
+        return _normalize(self.encoder.encode([query], batch_size=1))[0]
+
+    def search_vector(self, q, k=10):
+        """Top-k [(row, cosine)] for an already encoded query."""
+        if self.ann == "hnsw":
+            return self.index.search(self.vectors, q, k, ef=self.ef)
+        if self.ann == "ivf":
+            return self.index.search(self.vectors, q, k, n_probe=self.n_probe)
+        return search_exact(self.vectors, q, k)
+
+    def search(self, query: str, k=10):
+        return self.search_vector(self.encode_query(query), k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk embeddings (float16 memmap) + ANN index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="encode the chunks and build the ANN index")
+    p_build.add_argument("--chunks", default="chunks_output")
+    p_build.add_argument("--index", default="bm25_chunks_outputs/fixed", help="BM25 index folder of the same chunks")
+    p_build.add_argument("--model", default=DEFAULT_MODEL)
+    p_build.add_argument("--batch-size", type=int, default=64)
+    p_build.add_argument("--ann", choices=ANN_KINDS, default="auto")
+    p_build.add_argument("--force", action="store_true")
+
+    p_search = sub.add_parser("search", help="dense search only (see hybrid_search.py for BM25 + dense)")
+    p_search.add_argument("--index", default="bm25_chunks_outputs/fixed")
+    p_search.add_argument("query")
+    p_search.add_argument("-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        encoder = SentenceEncoder(args.model)
+        encode_chunks(args.chunks, args.index, encoder, args.batch_size, args.force)
+        build_ann_index(args.index, args.ann)
+    else:
+        searcher = DenseSearcher(args.index)
+        print(f"\n🔎 Query: {args.query} ({searcher.ann})")
+        for rank, (row, score) in enumerate(searcher.search(args.query, args.k), start=1):
+            print(f"{rank:3d}. row {row:6d}  cosine={score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
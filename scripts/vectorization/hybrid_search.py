@@ -0,0 +1,94 @@
+"""
+hybrid_search.py
+================
+
+חיפוש היברידי: BM25 (bm25_search.py) + embeddings (dense_index.py), ממוזגים
+עם Reciprocal Rank Fusion:
+
+    score(chunk) = sum over rankers of  weight / (rrf_k + rank)
+
+Only ranks are fused, so the BM25 and cosine scales never have to be
+calibrated against each other. Every ranker contributes its top `candidates`
+chunks; a chunk missing from one list just gets nothing from that ranker.
+
+    python scripts/vectorization/hybrid_search.py bm25_chunks_outputs/fixed "energy prices" -k 5
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from bm25_search import BM25Searcher
+from dense_index import DenseSearcher
+
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k=RRF_K, weights=None, k=None):
+    """
+    ranked_lists: [[(id, score), ...], ...] best first
+    Returns [(id, fused_score), ...] best first (ties broken by id).
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    fused = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (rrf_k + rank)
+
+    results = sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+    return results[:k] if k is not None else results
+
+
+class HybridSearcher:
+    """
+    BM25 and dense retrieval over the same index folder (the embeddings are
+    in <index_folder>/embeddings, rows in BM25 row order), fused with RRF.
+    Results are [(chunk_id, fused_score), ...] like BM25Searcher.search.
+    """
+
+    def __init__(self, index_folder: str | Path, encoder=None, candidates=100, rrf_k=RRF_K,
+                 weights=(1.0, 1.0), ann="auto"):
+        self.bm25 = BM25Searcher(index_folder)
+        self.dense = DenseSearcher(index_folder, encoder=encoder, ann=ann)
+        if len(self.dense.vectors) != self.bm25.n_docs:
+            raise ValueError(
+                f"Embeddings ({len(self.dense.vectors)} rows) and BM25 ({self.bm25.n_docs} rows) "
+                "are not from the same chunks – rebuild one of them"
+            )
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.weights = list(weights)
+        self.last_timings = {}
+
+    def search(self, query: str, k: int = 10):
+        t0 = time.perf_counter()
+        sparse = self.bm25.search(query, k=self.candidates)
+        t1 = time.perf_counter()
+        dense = [(int(self.bm25.chunk_ids[row]), score) for row, score in self.dense.search(query, k=self.candidates)]
+        t2 = time.perf_counter()
+        fused = reciprocal_rank_fusion([sparse, dense], self.rrf_k, self.weights, k)
+
+        self.last_timings = {"bm25": t1 - t0, "dense": t2 - t1, "fusion": time.perf_counter() - t2}
+        return fused
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid BM25 + dense search (reciprocal rank fusion)")
+    parser.add_argument("index_folder", help="e.g. bm25_chunks_outputs/fixed (with embeddings/)")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=100, help="top-N of each ranker that is fused")
+    args = parser.parse_args()
+
+    searcher = HybridSearcher(args.index_folder, candidates=args.candidates)
+    results = searcher.search(args.query, k=args.k)
+
+    print(f"\n🔎 Query: {args.query}")
+    for rank, (chunk_id, score) in enumerate(results, start=1):
+        print(f"{rank:3d}. chunk {chunk_id:6d}  rrf={score:.5f}")
+    print("⏱️  " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in searcher.last_timings.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+section_search.py
+=================
+
+חיפוש היררכי: document → section → paragraph chunk.
+
+hierarchical_chunking.py stores a section tree per file in the chunk store
+(ALL-CAPS heading → its paragraph chunks). At build time
+(build_bm25_for_chunks.py) the chunk term counts are summed per section into
+a second BM25 matrix over the same vocabulary:
+
+    tf(section, t)   = sum of tf(chunk, t) over the section's chunks
+    len(section)     = sum of the chunk lengths
+    idf / avg length = over sections (N = number of sections); the idf is
+                       always the "lucene" variant – with the clipped okapi
+                       idf a term found in most sections scores 0 and those
+                       sections would never be routed to
+
+    <index_folder>/sections/
+        X_bm25_sections.npz
+        sections_metadata.arrow (or .csv)   orig_file, title, row_start, row_end
+        section_params.json
+
+Search is coarse-to-fine: all sections are scored first (a few thousand rows
+instead of every chunk), then only the chunks of the top sections are
+scored. A chunk's final score is its own BM25 score plus parent_weight times
+its section's score (0 = pure chunk ranking inside the kept sections).
+
+    python scripts/vectorization/section_search.py bm25_chunks_outputs/hierarchical "energy prices" -k 5
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz, save_npz
+
+from bm25_core import BM25Transformer, bm25_idf
+from bm25_search import BM25Searcher, top_k_indices
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "chunking"))
+from metadata_store import read_table, write_table
+from chunk_store import ChunkStore, store_exists
+
+
+SECTIONS_SUBDIR = "sections"
+SECTION_IDF_VARIANT = "lucene"   # > 0 for every term, see the module docstring
+SECTION_FILES = (f"{SECTIONS_SUBDIR}/X_bm25_sections.npz", f"{SECTIONS_SUBDIR}/section_params.json")
+
+
+def has_section_tree(chunks_root: str | Path) -> bool:
+    """True if the chunk store of chunks_root has section trees (hierarchical chunker)."""
+    if not store_exists(chunks_root):
+        return False
+    with ChunkStore(chunks_root) as store:
+        return any("sections" in f for f in store.files)
+
+
+def has_section_index(index_folder: str | Path) -> bool:
+    return (Path(index_folder) / SECTION_FILES[0]).exists()
+
+
+# ----------------------------------------------------
+# Build
+# ----------------------------------------------------
+def section_rows(chunks_root: str | Path, df_chunks: pd.DataFrame):
+    """
+    Maps the rows of a chunk matrix onto sections.
+    df_chunks: chunk metadata in row order (orig_file, chunk_index)
+
+    Returns (sections DataFrame [orig_file, title, row_start, row_end],
+    row_section array). The rows of a file are contiguous and so are the
+    rows of a section; a file without a section tree is one section.
+    """
+    with ChunkStore(chunks_root) as store:
+        trees = {f["orig_file"]: f.get("sections") for f in store.files}
+
+    orig_files = df_chunks["orig_file"].astype(str).to_numpy()
+    chunk_index = df_chunks["chunk_index"].to_numpy()
+    row_section = np.full(len(df_chunks), -1, dtype=np.int64)
+    records = []
+
+    def add(orig_file, title, lo, hi):
+        if hi > lo:
+            row_section[lo:hi] = len(records)
+            records.append({"orig_file": orig_file, "title": title, "row_start": lo, "row_end": hi})
+
+    starts = np.flatnonzero(np.r_[True, orig_files[1:] != orig_files[:-1]]) if len(orig_files) else []
+    for start, end in zip(starts, np.r_[starts[1:], len(orig_files)]):
+        orig_file = orig_files[start]
+        tree = trees.get(orig_file)
+        if not tree:
+            add(orig_file, "", start, end)
+            continue
+        indices = chunk_index[start:end]
+        for title, _, _, first_chunk, end_chunk in tree:
+            add(orig_file, title, start + np.searchsorted(indices, first_chunk), start + np.searchsorted(indices, end_chunk))
+
+    sections = pd.DataFrame(records, columns=["orig_file", "title", "row_start", "row_end"])
+    return sections, row_section
+
+
+def build_section_index(index_folder: str | Path, chunks_root: str | Path, vectorizer,
+                        df_chunks: pd.DataFrame, metadata_format: str = "auto"):
+    """
+    vectorizer: the fitted BM25Vectorizer of the chunk matrix, fitted with
+                keep_counts=True – the section sums reuse its raw counts
+                (.counts_) and token lengths (.doc_lengths_), nothing is
+                tokenized again
+    Returns the written paths.
+    """
+    folder = Path(index_folder) / SECTIONS_SUBDIR
+    folder.mkdir(parents=True, exist_ok=True)
+
+    sections, row_section = section_rows(chunks_root, df_chunks)
+    if getattr(vectorizer, "counts_", None) is None:
+        raise ValueError("build_section_index needs the raw counts: fit the vectorizer with keep_counts=True")
+    counts, lengths = vectorizer.counts_, vectorizer.doc_lengths_
+
+    # sections x rows membership; rows outside every section are dropped
+    rows = np.flatnonzero(row_section >= 0)
+    membership = csr_matrix(
+        (np.ones(len(rows)), (row_section[rows], rows)),
+        shape=(len(sections), counts.shape[0]),
+    )
+    section_counts = (membership @ counts).tocsr()
+    section_counts.sort_indices()
+    section_lengths = membership @ lengths
+
+    df = np.bincount(section_counts.indices, minlength=section_counts.shape[1])
+    idf = bm25_idf(df, len(sections), SECTION_IDF_VARIANT)
+    avg_length = section_lengths.mean() if len(section_lengths) else 0.0
+
+    X_sections = BM25Transformer(k1=vectorizer.k1, b=vectorizer.b).fit_transform(
+        section_counts.astype(vectorizer.dtype), section_lengths, avg_length if avg_length > 0 else 1.0, idf,
+        copy=False,
+    )
+    X_sections.eliminate_zeros()
+
+    save_npz(folder / "X_bm25_sections.npz", X_sections)
+    paths = write_table(folder, "sections_metadata", sections, metadata_format=metadata_format,
+                        categorical=["orig_file"])
+    with open(folder / "section_params.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "n_sections": len(sections),
+            "avg_section_length": float(avg_length),
+            "idf_variant": SECTION_IDF_VARIANT,
+        }, f, indent=2)
+
+    print(f"   • sections: {len(sections)} sections over {counts.shape[0]} chunks → {folder}")
+    return [folder / "X_bm25_sections.npz", folder / "section_params.json", *paths]
+
+
+# ----------------------------------------------------
+# Search
+# ----------------------------------------------------
+class SectionSearcher:
+    """
+    Coarse-to-fine search over a hierarchical index: top_sections sections
+    by section BM25, then the chunks inside them by chunk BM25.
+    Results are [(chunk_id, score), ...] like BM25Searcher.search;
+    last_stats tells how many sections / chunks were actually scored.
+    """
+
+    def __init__(self, index_folder: str | Path, top_sections: int = 20, parent_weight: float = 0.0):
+        self.bm25 = BM25Searcher(index_folder)
+        folder = Path(index_folder) / SECTIONS_SUBDIR
+        if not has_section_index(index_folder):
+            raise FileNotFoundError(f"No section index in {folder} – build it from a hierarchical chunk store")
+
+        self.X_sections = load_npz(folder / "X_bm25_sections.npz").tocsc()
+        self.X_sections.sort_indices()
+        self.sections = read_table(folder, "sections_metadata")
+        self.row_start = self.sections["row_start"].to_numpy()
+        self.row_end = self.sections["row_end"].to_numpy()
+
+        self.top_sections = top_sections
+        self.parent_weight = parent_weight
+        self.last_stats = {}
+
+    def score_sections(self, term_ids, q_tf):
+        scores = np.zeros(self.X_sections.shape[0], dtype=np.float64)
+        indptr, indices, data = self.X_sections.indptr, self.X_sections.indices, self.X_sections.data
+        for t, tf in zip(term_ids, q_tf):
+            start, end = indptr[t], indptr[t + 1]
+            scores[indices[start:end]] += tf * data[start:end]
+        return scores
+
+    def search(self, query: str, k: int = 10):
+        t0 = time.perf_counter()
+        term_ids, q_tf = self.bm25.query_terms(query)
+
+        section_scores = self.score_sections(term_ids, q_tf)
+        top = top_k_indices(section_scores, self.top_sections)
+        # row order (sections are contiguous row ranges) -> ties break like BM25Searcher
+        top = np.sort(top[section_scores[top] > 0])
+        t1 = time.perf_counter()
+
+        rows = (
+            np.concatenate([np.arange(self.row_start[s], self.row_end[s]) for s in top])
+            if len(top) else np.empty(0, dtype=np.int64)
+        )
+        parents = np.repeat(section_scores[top], self.row_end[top] - self.row_start[top])
+
+        # only the candidate rows x query columns of the chunk matrix
+        chunk_scores = np.asarray(self.bm25.X_csr[rows][:, term_ids] @ q_tf).ravel() if len(rows) else np.zeros(0)
+        scores = chunk_scores + self.parent_weight * parents
+
+        best = top_k_indices(scores, k)
+        best = best[chunk_scores[best] > 0]
+        results = [(int(self.bm25.chunk_ids[rows[i]]), float(scores[i])) for i in best]
+
+        self.last_stats = {
+            "sections_scored": len(section_scores),
+            "sections_kept": len(top),
+            "chunks_scored": len(rows),
+            "chunks_total": self.bm25.n_docs,
+            "sections_ms": (t1 - t0) * 1000,
+            "chunks_ms": (time.perf_counter() - t1) * 1000,
+        }
+        return results
+
+    def section_of(self, chunk_row: int):
+        """(orig_file, title) of the section that holds a chunk row."""
+        s = int(np.searchsorted(self.row_start, chunk_row, side="right") - 1)
+        return self.sections["orig_file"].iloc[s], self.sections["title"].iloc[s]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Section-first (coarse-to-fine) BM25 search")
+    parser.add_argument("index_folder", help="e.g. bm25_chunks_outputs/hierarchical (with sections/)")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--top-sections", type=int, default=20, help="sections whose chunks are scored")
+    parser.add_argument("--parent-weight", type=float, default=0.0, help="weight of the section score")
+    args = parser.parse_args()
+
+    searcher = SectionSearcher(args.index_folder, args.top_sections, args.parent_weight)
+    results = searcher.search(args.query, k=args.k)
+
+    print(f"\n🔎 Query: {args.query}")
+    row_of = {int(c): r for r, c in enumerate(searcher.bm25.chunk_ids)}
+    for rank, (chunk_id, score) in enumerate(results, start=1):
+        orig_file, title = searcher.section_of(row_of[chunk_id])
+        print(f"{rank:3d}. chunk {chunk_id:6d}  score={score:.4f}  {orig_file} › {title[:60]}")
+
+    stats = searcher.last_stats
+    print(f"⏱️  {stats['sections_kept']}/{stats['sections_scored']} sections kept, "
+          f"{stats['chunks_scored']}/{stats['chunks_total']} chunks scored "
+          f"({stats['sections_ms']:.1f} + {stats['chunks_ms']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()